@@ -502,6 +502,30 @@ class AbsorbAPIClient:
                   f"may indicate a bucket exceeded the cap without being detected")
         return all_users
 
+    def get_users_by_departments(self, department_ids: List[str]) -> Optional[Dict[str, List[Dict[str, Any]]]]:
+        """Get the users of several departments with one filtered /users call.
+
+        Returns {department_id: [users]} using the caller's ID spelling, with
+        an empty list for departments that have no users. Returns None when
+        the combined result doesn't fit in a single page (or the response
+        has no totalItems), so callers fall back to get_users_by_department
+        per department, which knows how to split oversized departments.
+        """
+        if not department_ids:
+            return {}
+        filter_expr = ' or '.join(f"departmentId eq guid'{d}'" for d in department_ids)
+        users, total_items = self._fetch_users_page(filter_expr, limit=1000)
+        if total_items is None or len(users) < total_items:
+            return None
+
+        by_dept = {d.lower(): [] for d in department_ids}
+        for user in users:
+            dept_id = str(user.get('departmentId') or user.get('DepartmentId') or '').lower()
+            if dept_id in by_dept:
+                by_dept[dept_id].append(user)
+        print(f"[API] get_users_by_departments: {len(users)} users across {len(department_ids)} departments in one call")
+        return {d: by_dept[d.lower()] for d in department_ids}
+
     def _fetch_users_page(self, filter_expr: str, limit: int = 1000):
         """Execute a single /users query. Returns (users_list, total_items).
 
@@ -637,6 +661,44 @@ class AbsorbAPIClient:
                 print(f"[API] get_department {variant}/{department_id} exception: {e}")
         return {'id': department_id, 'name': 'Department', 'Name': 'Department'}
 
+    def get_departments_by_ids(self, department_ids: List[str]) -> Dict[str, str]:
+        """Look up several departments in one filtered /departments query.
+
+        Returns {lowercased department id: name} for the departments found.
+        Returns an empty dict on any failure (including tenants that don't
+        support filtering departments) so callers fall back to
+        get_department() per ID.
+        """
+        if not department_ids:
+            return {}
+        url = f"{self.base_url}/departments"
+        filter_expr = ' or '.join(f"id eq guid'{d}'" for d in department_ids)
+        params = {"_filter": filter_expr, "_limit": len(department_ids)}
+        try:
+            response = self._session.get(url, params=params, headers=self._get_headers(), timeout=30)
+            if response.status_code != 200:
+                print(f"[API] get_departments_by_ids returned {response.status_code}: {response.text[:200]}")
+                return {}
+            data = response.json()
+        except Exception as e:
+            print(f"[API] get_departments_by_ids exception: {e}")
+            return {}
+
+        if isinstance(data, dict):
+            depts = data.get('departments') or data.get('Departments') or []
+        elif isinstance(data, list):
+            depts = data
+        else:
+            depts = []
+
+        names = {}
+        for dept in depts:
+            dept_id = dept.get('id') or dept.get('Id')
+            name = dept.get('name') or dept.get('Name')
+            if dept_id and name:
+                names[str(dept_id).lower()] = name
+        return names
+
     def get_user_enrollments(self, user_id: str) -> List[Dict[str, Any]]:
         """Get all course enrollments for a user."""
         # Use exact endpoint pattern from working Apps Script with _limit parameter
@@ -1141,6 +1203,37 @@ class AbsorbAPIClient:
     def get_students_with_progress(self, department_id: str) -> List[Dict[str, Any]]:
         """Get all students in a department with their course progress."""
         users = self.get_users_by_department(department_id)
+        return self._process_users(users)
+
+    def get_students_with_progress_multi(self, department_ids: List[str]) -> Optional[Dict[str, List[Dict[str, Any]]]]:
+        """Get students with progress for several departments at once.
+
+        The user lists come from one get_users_by_departments call instead
+        of one /users call per department; enrollments are then processed
+        in a single pool. Returns {department_id: students}, or None when
+        the batched user query can't be used (see get_users_by_departments).
+        """
+        users_by_dept = self.get_users_by_departments(department_ids)
+        if users_by_dept is None:
+            return None
+        dept_by_user = {}
+        all_users = []
+        for dept_id, users in users_by_dept.items():
+            for user in users:
+                dept_by_user[id(user)] = dept_id
+                all_users.append(user)
+
+        students_by_dept = {dept_id: [] for dept_id in users_by_dept}
+        for user, result in self._process_users(all_users, with_users=True):
+            students_by_dept[dept_by_user[id(user)]].append(result)
+        return students_by_dept
+
+    def _process_users(self, users: List[Dict[str, Any]], with_users: bool = False) -> list:
+        """Run _process_single_user over users in parallel.
+
+        Returns the processed students, or (user, student) pairs when
+        with_users=True. Users that fail or have no data are skipped.
+        """
         total = len(users)
 
         print(f"[API] Processing {total} students for enrollment data (parallel)...")
@@ -1170,7 +1263,7 @@ class AbsorbAPIClient:
                     print(f"[API] Unexpected error on a user fetch: {e}")
                     result = None
                 if result:
-                    students_data.append(result)
+                    students_data.append((future_to_user[future], result) if with_users else result)
 
                 # Progress update every 10 students
                 if completed % 10 == 0 or completed == total:
@@ -21,6 +21,29 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from config import get_config, Config
 from routes import auth_bp, dashboard_bp, students_bp, exam_bp
+from utils.json_response import install_json_provider
+
+
+def _configure_session_store(app):
+    """Pick the Flask-Session backend.
+
+    SESSION_TYPE=redis with REDIS_URL set stores sessions in Redis (shared
+    by all gunicorn workers and instances, one GET per request). Anything
+    else, or a missing redis client, uses the filesystem store.
+    """
+    if Config.SESSION_TYPE == 'redis' and Config.REDIS_URL:
+        try:
+            import redis
+            app.config['SESSION_TYPE'] = 'redis'
+            app.config['SESSION_REDIS'] = redis.Redis.from_url(Config.REDIS_URL)
+            app.config['SESSION_USE_SIGNER'] = True
+            print("[SESSION] Using Redis session store")
+            return
+        except ImportError:
+            print("[SESSION] redis package not installed, falling back to filesystem sessions")
+
+    app.config['SESSION_TYPE'] = 'filesystem'
+    app.config['SESSION_FILE_DIR'] = os.path.join(os.path.dirname(__file__), 'flask_session')
 
 
 def create_app():
@@ -33,8 +56,7 @@ def create_app():
     app.config.from_object(config)
 
     # Additional session configuration
-    app.config['SESSION_TYPE'] = 'filesystem'
-    app.config['SESSION_FILE_DIR'] = os.path.join(os.path.dirname(__file__), 'flask_session')
+    _configure_session_store(app)
     app.config['SESSION_PERMANENT'] = True
     app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=4)
 
@@ -44,6 +66,9 @@ def create_app():
     # Enable gzip compression for responses
     Compress(app)
 
+    # orjson-backed jsonify() for the routes that don't use ojsonify
+    install_json_provider(app)
+
     # Configure CORS (allow all for tunnel/deployment)
     CORS(app,
          origins=['*'],
@@ -113,8 +138,9 @@ def create_app():
         }), 405
 
     # Start background sync scheduler (runs independently of admin login)
-    from sync_scheduler import start_sync_scheduler
+    from sync_scheduler import start_sync_scheduler, start_cache_warmer
     start_sync_scheduler()
+    start_cache_warmer()
 
     return app
 
@@ -15,8 +15,9 @@ class Config:
     SECRET_KEY = os.getenv('FLASK_SECRET_KEY', 'dev-secret-key-change-in-production')
     DEBUG = os.getenv('FLASK_DEBUG', 'False').lower() == 'true'
 
-    # Session
+    # Session ('filesystem' or 'redis'; redis needs REDIS_URL)
     SESSION_TYPE = os.getenv('SESSION_TYPE', 'filesystem')
+    REDIS_URL = os.getenv('REDIS_URL', '')
     SESSION_COOKIE_SECURE = os.getenv('SESSION_COOKIE_SECURE', 'False').lower() == 'true'
     SESSION_COOKIE_HTTPONLY = os.getenv('SESSION_COOKIE_HTTPONLY', 'True').lower() == 'true'
     SESSION_COOKIE_SAMESITE = os.getenv('SESSION_COOKIE_SAMESITE', 'Lax')
@@ -29,9 +30,17 @@ class Config:
     ABSORB_PRIVATE_KEY = os.getenv('ABSORB_PRIVATE_KEY')
     ABSORB_CLIENT_ID = os.getenv('ABSORB_CLIENT_ID')
     ABSORB_CLIENT_SECRET = os.getenv('ABSORB_CLIENT_SECRET')
+    DEPT_FETCH_WORKERS = int(os.getenv('DEPT_FETCH_WORKERS', '16'))  # Shared multi-dept fetch pool size
 
     GOOGLE_SHEET_ID = os.getenv('GOOGLE_SHEET_ID', '1Hc7IUA8bZceLFlLdOPuGckDuV0MtqRcb5DPLeMhncbo')
     GOOGLE_SHEETS_CREDENTIALS_JSON = os.getenv('GOOGLE_SHEETS_CREDENTIALS_JSON', '')
+    SHEETS_WRITES_PER_MIN = int(os.getenv('SHEETS_WRITES_PER_MIN', '60'))  # Google's per-user write quota
+    # Leave past exams that already have a pass/fail out of the cross-dept
+    # Absorb lookup (those rows then show as 'Not in Absorb'; off by default)
+    EXAM_LOOKUP_SKIP_RESOLVED = os.getenv('EXAM_LOOKUP_SKIP_RESOLVED', 'False').lower() == 'true'
+
+    # GoHighLevel: dump raw request params / response previews to the log
+    GHL_DEBUG = os.getenv('GHL_DEBUG', 'False').lower() == 'true'
 
     # SQLite snapshot database
     SNAPSHOT_DB_PATH = os.getenv('SNAPSHOT_DB_PATH', os.path.join(os.path.dirname(__file__), 'data', 'snapshots.db'))
@@ -43,6 +52,10 @@ class Config:
     SYNC_ABSORB_USERNAME = os.getenv('SYNC_ABSORB_USERNAME', '')
     SYNC_ABSORB_PASSWORD = os.getenv('SYNC_ABSORB_PASSWORD', '')
     SYNC_INTERVAL_HOURS = float(os.getenv('SYNC_INTERVAL_HOURS', '6'))
+    # Keep the student cache warm for departments in saved dept prefs
+    # (uses the sync account above; off by default)
+    CACHE_WARMUP_ENABLED = os.getenv('CACHE_WARMUP_ENABLED', 'False').lower() == 'true'
+    CACHE_WARMUP_MAX_DEPTS = int(os.getenv('CACHE_WARMUP_MAX_DEPTS', '20'))
 
     # Rate Limiting
     RATE_LIMIT_PER_MINUTE = int(os.getenv('RATE_LIMIT_PER_MINUTE', '10'))
@@ -1,18 +1,56 @@
 """GoHighLevel (GHL) Calendar API client for exam scheduling data."""
 
+import functools
 import requests
+from requests.adapters import HTTPAdapter
 from datetime import datetime, timedelta
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+from config import Config
+from utils.cache_utils import set_bounded
+from utils.validators import normalize_email
+
 GHL_BASE_URL = 'https://services.leadconnectorhq.com'
 GHL_API_VERSION = '2021-07-28'
 
+# Verbose request/response dumps (params, response preview, first event)
+GHL_DEBUG = Config.GHL_DEBUG
+
 # Per-user cache: {user_email: {'data': [...], 'timestamp': datetime}}
 _ghl_cache = {}
 GHL_CACHE_TTL = 300  # 5 minutes
+GHL_CACHE_MAX_USERS = 1024
 
 # Reverse lookup: {contact_email: {contact_id, appointment_id, calendar_id}}
 _ghl_id_map = {}
+GHL_ID_MAP_MAX = 50000
+
+# Secondary index for email changes: {contact_id: contact_email}
+_ghl_contact_emails = {}
+
+# Shared worker pool for concurrent GHL calls (event windows, contact lookups)
+_GHL_EXEC = ThreadPoolExecutor(max_workers=10, thread_name_prefix='ghl')
+
+# Background stale-while-revalidate refreshes. Kept separate from _GHL_EXEC
+# because a refresh itself fans contact lookups out onto _GHL_EXEC and waits
+# on them; running it there could starve the pool.
+_GHL_REFRESH_EXEC = ThreadPoolExecutor(max_workers=2, thread_name_prefix='ghl-refresh')
+
+# Number of ~30-day windows the events range is split into when GHL truncates
+GHL_EVENT_WINDOWS = 9
+
+# Global session for connection pooling
+_session = None
+
+
+def get_session():
+    """Get or create a requests session with connection pooling for GHL."""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=10)
+        _session.mount("https://", adapter)
+    return _session
 
 
 def _ghl_headers(token):
@@ -31,7 +69,7 @@ def fetch_ghl_calendars(token, location_id):
     """
     url = f'{GHL_BASE_URL}/calendars/'
     params = {'locationId': location_id}
-    resp = requests.get(url, headers=_ghl_headers(token), params=params, timeout=15)
+    resp = get_session().get(url, headers=_ghl_headers(token), params=params, timeout=15)
     resp.raise_for_status()
     data = resp.json()
     calendars = data.get('calendars', [])
@@ -42,14 +80,14 @@ def _fetch_contact(token, contact_id, location_id):
     """Fetch a single contact's details from GHL."""
     url = f'{GHL_BASE_URL}/contacts/{contact_id}'
     try:
-        resp = requests.get(url, headers=_ghl_headers(token), params={'locationId': location_id}, timeout=10)
+        resp = get_session().get(url, headers=_ghl_headers(token), params={'locationId': location_id}, timeout=10)
         if resp.status_code == 401:
             print(f"[GHL] Contact 401 body: {resp.text[:300]}")
         resp.raise_for_status()
         contact = resp.json().get('contact', {})
         return {
             'id': contact_id,
-            'email': (contact.get('email') or '').lower().strip(),
+            'email': normalize_email(contact.get('email')),
             'name': f"{contact.get('firstName', '')} {contact.get('lastName', '')}".strip(),
             'phone': contact.get('phone') or '',
         }
@@ -58,23 +96,111 @@ def _fetch_contact(token, contact_id, location_id):
         return {'id': contact_id, 'email': '', 'name': '', 'phone': ''}
 
 
+_MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+
+@functools.lru_cache(maxsize=2048)
+def _format_start_time(start_str):
+    """Turn an appointment start ISO string into (M/D/YYYY, 'Mon DD, YYYY', 'H:MM AM').
+
+    Cached on the raw string since many events share start times. Built
+    with f-strings rather than strftime ('%b' is locale-dependent and slow).
+    """
+    if not start_str:
+        return '', 'TBD', ''
+    try:
+        dt = datetime.fromisoformat(start_str.replace('Z', '+00:00'))
+    except Exception:
+        return '', 'TBD', ''
+    hour = dt.hour % 12 or 12
+    am_pm = 'AM' if dt.hour < 12 else 'PM'
+    return (
+        f"{dt.month}/{dt.day}/{dt.year}",
+        f"{_MONTHS[dt.month - 1]} {dt.day:02d}, {dt.year}",
+        f"{hour}:{dt.minute:02d} {am_pm}",
+    )
+
+
+def _extract_events(data):
+    """Pull the event list out of a /calendars/events response."""
+    return data.get('events', data.get('data', data.get('appointments', [])))
+
+
+def _is_truncated(data, events):
+    """True if a /calendars/events response says more events exist than were returned."""
+    meta = data.get('meta') or {}
+    if meta.get('nextPageUrl') or meta.get('nextPage') or meta.get('startAfterId'):
+        return True
+    total = meta.get('total') or data.get('total')
+    return isinstance(total, int) and total > len(events)
+
+
+def _fetch_events_window(token, params, start_time, end_time):
+    """Fetch events for one [start_time, end_time) window (epoch ms)."""
+    url = f'{GHL_BASE_URL}/calendars/events'
+    window = dict(params, startTime=start_time, endTime=end_time)
+    resp = get_session().get(url, headers=_ghl_headers(token), params=window, timeout=30)
+    resp.raise_for_status()
+    return _extract_events(resp.json())
+
+
+def _fetch_events_windowed(token, params, start_time, end_time):
+    """Split the range into GHL_EVENT_WINDOWS slices and fetch them concurrently.
+
+    Events spanning a window boundary can come back twice, so merge by event ID.
+    """
+    step = (end_time - start_time) // GHL_EVENT_WINDOWS + 1
+    bounds = [(t, min(t + step, end_time)) for t in range(start_time, end_time, step)]
+    futures = [_GHL_EXEC.submit(_fetch_events_window, token, params, lo, hi) for lo, hi in bounds]
+
+    merged = {}
+    for future in futures:
+        for ev in future.result():
+            merged[ev.get('id') or id(ev)] = ev
+    return list(merged.values())
+
+
 def fetch_ghl_appointments(token, location_id, calendar_id, user_email):
     """Fetch GHL calendar appointments and return in same format as fetch_exam_sheet().
 
     Looks 3 months back and 6 months forward from today.
     Deduplicates by contact email (last occurrence wins).
-    Caches per user_email with 5-minute TTL.
+    Caches per user_email with 5-minute TTL. Data up to 2x the TTL old is
+    served immediately (stale-while-revalidate) while a background refresh
+    runs; only older or missing data blocks on a fetch.
     """
     # Check cache
     now = datetime.utcnow()
-    cache_key = user_email.lower().strip()
-    if cache_key in _ghl_cache:
-        entry = _ghl_cache[cache_key]
+    cache_key = normalize_email(user_email)
+    entry = _ghl_cache.get(cache_key)
+    if entry:
         age = (now - entry['timestamp']).total_seconds()
         if age < GHL_CACHE_TTL:
             print(f"[GHL] Using cached data for {cache_key} (age: {int(age)}s)")
             return entry['data']
+        if age < 2 * GHL_CACHE_TTL:
+            if not entry.get('refreshing'):
+                entry['refreshing'] = True
+                print(f"[GHL] Serving stale data for {cache_key} (age: {int(age)}s), refreshing in background")
+                _GHL_REFRESH_EXEC.submit(_refresh_ghl_appointments, entry, token, location_id, calendar_id, cache_key)
+            return entry['data']
+
+    return _fetch_ghl_appointments_fresh(token, location_id, calendar_id, cache_key)
+
+
+def _refresh_ghl_appointments(entry, token, location_id, calendar_id, cache_key):
+    """Background refresh for a stale cache entry; clears the in-flight flag on failure."""
+    try:
+        _fetch_ghl_appointments_fresh(token, location_id, calendar_id, cache_key)
+    except Exception as e:
+        print(f"[GHL] Background refresh failed for {cache_key}: {e}")
+    finally:
+        entry['refreshing'] = False
 
+
+def _fetch_ghl_appointments_fresh(token, location_id, calendar_id, cache_key):
+    """Fetch appointments from GHL, transform them and store them in the cache."""
+    now = datetime.utcnow()
     print(f"[GHL] Fetching appointments for calendar {calendar_id}...")
 
     # Date range: 3 months back, 6 months forward (epoch milliseconds for GHL API)
@@ -94,22 +220,27 @@ def fetch_ghl_appointments(token, location_id, calendar_id, user_email):
         'endTime': end_time,
     }
 
-    print(f"[GHL] Request URL: {url}")
-    print(f"[GHL] Request params: {params}")
-    resp = requests.get(url, headers=_ghl_headers(token), params=params, timeout=30)
+    if GHL_DEBUG:
+        print(f"[GHL] Request URL: {url}")
+        print(f"[GHL] Request params: {params}")
+    resp = get_session().get(url, headers=_ghl_headers(token), params=params, timeout=30)
     resp.raise_for_status()
     data = resp.json()
-    print(f"[GHL] Response keys: {list(data.keys())}")
-    print(f"[GHL] Response preview: {str(data)[:500]}")
-    # Log full first appointment to see all available fields
-    if data.get('events') and len(data['events']) > 0:
-        print(f"[GHL] First appointment FULL: {data['events'][0]}")
-    events = data.get('events', data.get('data', data.get('appointments', [])))
+    if GHL_DEBUG:
+        print(f"[GHL] Response keys: {list(data.keys())}")
+        print(f"[GHL] Response preview: {str(data)[:500]}")
+        # Log full first appointment to see all available fields
+        if data.get('events'):
+            print(f"[GHL] First appointment FULL: {data['events'][0]}")
+    events = _extract_events(data)
+    if _is_truncated(data, events):
+        print(f"[GHL] Events response truncated at {len(events)}, fetching {GHL_EVENT_WINDOWS} windows in parallel...")
+        events = _fetch_events_windowed(token, params, start_time, end_time)
     all_appointments.extend(events)
     print(f"[GHL] Fetched {len(all_appointments)} appointments")
 
     if not all_appointments:
-        _ghl_cache[cache_key] = {'data': [], 'timestamp': now}
+        set_bounded(_ghl_cache, cache_key, {'data': [], 'timestamp': now}, GHL_CACHE_MAX_USERS)
         return []
 
     # Collect unique contact IDs
@@ -124,20 +255,19 @@ def fetch_ghl_appointments(token, location_id, calendar_id, user_email):
     # Parallel contact lookups
     contact_map = {}
     if contact_ids:
-        max_workers = min(10, len(contact_ids))
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = {executor.submit(_fetch_contact, token, cid, location_id): cid for cid in contact_ids}
-            for future in as_completed(futures):
-                result = future.result()
-                if result and result.get('email'):
-                    contact_map[result['id']] = result
+        futures = [_GHL_EXEC.submit(_fetch_contact, token, cid, location_id) for cid in contact_ids]
+        for future in as_completed(futures):
+            result = future.result()
+            if result and result.get('email'):
+                contact_map[result['id']] = result
 
     if contact_ids and not contact_map:
         print("[GHL] WARNING: All contact lookups failed! Token likely missing 'contacts.readonly' scope."
               " Go to GHL > Settings > Integrations > Private Integrations > edit your app > enable Contacts scope.")
 
-    # Transform appointments into sheet-format dicts
-    students = []
+    # Transform appointments into sheet-format dicts, deduped by email
+    # (last occurrence wins), and build the reverse lookup for write-backs
+    seen = {}
     for appt in all_appointments:
         cid = appt.get('contactId')
         contact = contact_map.get(cid, {})
@@ -148,22 +278,9 @@ def fetch_ghl_appointments(token, location_id, calendar_id, user_email):
 
         # Parse appointment start time
         start_str = appt.get('startTime') or appt.get('start') or ''
-        exam_date = ''
-        exam_date_formatted = 'TBD'
-        exam_time = ''
-
-        if start_str:
-            try:
-                dt = datetime.fromisoformat(start_str.replace('Z', '+00:00'))
-                exam_date = f"{dt.month}/{dt.day}/{dt.year}"
-                exam_date_formatted = dt.strftime('%b %d, %Y')
-                hour = dt.hour % 12 or 12
-                am_pm = 'AM' if dt.hour < 12 else 'PM'
-                exam_time = f"{hour}:{dt.minute:02d} {am_pm}"
-            except Exception:
-                pass
-
-        students.append({
+        exam_date, exam_date_formatted, exam_time = _format_start_time(start_str)
+
+        seen[email] = {
             'name': contact.get('name', ''),
             'email': email,
             'phone': contact.get('phone', ''),
@@ -184,30 +301,22 @@ def fetch_ghl_appointments(token, location_id, calendar_id, user_email):
             'studyConsistency': '',
             't0Sent': '',
             'weeklyTracking': [],
-        })
+        }
 
-    # Dedup by email (last occurrence wins) and build ID map for write-backs
-    seen = {}
-    for s in students:
-        seen[s['email']] = s
-    students = list(seen.values())
+        # Reverse lookup for write-backs (email → GHL IDs)
+        set_bounded(_ghl_id_map, email, {
+            'contact_id': cid,
+            'appointment_id': appt.get('id', ''),
+            'calendar_id': appt.get('calendarId', calendar_id),
+            'assigned_user_id': appt.get('assignedUserId', ''),
+        }, GHL_ID_MAP_MAX)
+        set_bounded(_ghl_contact_emails, cid, email, GHL_ID_MAP_MAX)
 
-    # Build reverse lookup for write-backs (email → GHL IDs)
-    for appt in all_appointments:
-        cid = appt.get('contactId')
-        contact = contact_map.get(cid, {})
-        cemail = contact.get('email', '')
-        if cemail:
-            _ghl_id_map[cemail] = {
-                'contact_id': cid,
-                'appointment_id': appt.get('id', ''),
-                'calendar_id': appt.get('calendarId', calendar_id),
-                'assigned_user_id': appt.get('assignedUserId', ''),
-            }
+    students = list(seen.values())
 
     print(f"[GHL] Processed {len(students)} unique students from GHL")
 
-    _ghl_cache[cache_key] = {'data': students, 'timestamp': now}
+    set_bounded(_ghl_cache, cache_key, {'data': students, 'timestamp': now}, GHL_CACHE_MAX_USERS)
     return students
 
 
@@ -216,7 +325,7 @@ def get_ghl_ids(email):
 
     Returns dict with contact_id, appointment_id, calendar_id or None.
     """
-    return _ghl_id_map.get(email.lower().strip())
+    return _ghl_id_map.get(normalize_email(email))
 
 
 def update_ghl_contact(token, contact_id, location_id, name='', email='', phone=''):
@@ -241,17 +350,19 @@ def update_ghl_contact(token, contact_id, location_id, name='', email='', phone=
     try:
         headers = _ghl_headers(token)
         headers['Content-Type'] = 'application/json'
-        resp = requests.put(url, headers=headers, json=body,
+        resp = get_session().put(url, headers=headers, json=body,
                             params={'locationId': location_id}, timeout=10)
         resp.raise_for_status()
         print(f"[GHL] Updated contact {contact_id}: {body}")
 
         # Update ID map if email changed
         if email:
-            old_entries = {k: v for k, v in _ghl_id_map.items() if v.get('contact_id') == contact_id}
-            for old_email in old_entries:
-                entry = _ghl_id_map.pop(old_email)
-                _ghl_id_map[email.lower().strip()] = entry
+            new_email = normalize_email(email)
+            old_email = _ghl_contact_emails.get(contact_id)
+            entry = _ghl_id_map.pop(old_email, None) if old_email else None
+            if entry:
+                set_bounded(_ghl_id_map, new_email, entry, GHL_ID_MAP_MAX)
+                set_bounded(_ghl_contact_emails, contact_id, new_email, GHL_ID_MAP_MAX)
 
         return True
     except Exception as e:
@@ -288,7 +399,7 @@ def update_ghl_appointment(token, appointment_id, calendar_id, location_id,
         headers = _ghl_headers(token)
         headers['Content-Type'] = 'application/json'
         print(f"[GHL] Updating appointment {appointment_id}, body: {body}")
-        resp = requests.put(url, headers=headers, json=body, timeout=10)
+        resp = get_session().put(url, headers=headers, json=body, timeout=10)
         if resp.status_code != 200:
             print(f"[GHL] Appointment update {resp.status_code} body: {resp.text[:500]}")
         resp.raise_for_status()
@@ -301,7 +412,7 @@ def update_ghl_appointment(token, appointment_id, calendar_id, location_id,
 
 def invalidate_ghl_cache(user_email):
     """Clear GHL cache for a specific user."""
-    cache_key = user_email.lower().strip()
+    cache_key = normalize_email(user_email)
     if cache_key in _ghl_cache:
         del _ghl_cache[cache_key]
         print(f"[GHL] Cache invalidated for {cache_key}")
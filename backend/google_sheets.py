@@ -1,22 +1,58 @@
 """Google Sheets integration for exam scheduling data."""
 
 import csv
+import functools
 import io
 import re
+import threading
+import time
 import requests
+from collections import deque
 from datetime import datetime
 
+from utils.validators import normalize_email
+
 
 SHEET_CSV_URL = "https://docs.google.com/spreadsheets/d/1Hc7IUA8bZceLFlLdOPuGckDuV0MtqRcb5DPLeMhncbo/export?format=csv"
 
 # Cache for admin sheet data (global)
-_sheet_cache = {'data': None, 'timestamp': None}
+_sheet_cache = {'data': None, 'timestamp': None, 'etag': None, 'last_modified': None}
 SHEET_CACHE_TTL = 300  # 5 minutes
 
 # Cache for per-user sheet data
 _user_sheet_cache = {}  # {user_email: {'data': [...], 'timestamp': datetime}}
 USER_SHEET_CACHE_TTL = 300  # 5 minutes
 
+# Weekly tracking column names (T-5 through T-1), built once instead of per row
+_WEEK_KEYS = tuple(
+    (w, f'{w} Status', f'{w} Hours', f'{w} Practice %', f'{w} Notes')
+    for w in ('T-5', 'T-4', 'T-3', 'T-2', 'T-1')
+)
+
+# Cache for sheet header rows used by write-back (per sheet ID)
+_header_cache = {}  # {sheet_id: {'cols': {header_lower: col_index}, 'timestamp': datetime}}
+HEADER_CACHE_TTL = 600  # 10 minutes
+
+# Cache of email -> sheet row numbers used by write-back (per sheet ID)
+_row_index_cache = {}  # {sheet_id: {'rows': {email: [row, ...]}, 'timestamp': datetime}}
+ROW_INDEX_CACHE_TTL = 300  # 5 minutes
+ROW_INDEX_NEGATIVE_TTL = 30  # trust a fresh index's "not found" for this long
+
+# Shared gspread client and worksheet handles for write-back
+_gspread_client = None
+_gspread_lock = threading.Lock()
+_worksheet_cache = {}  # {(sheet_id, tab title or None): {'sheet': Worksheet, 'timestamp': datetime}}
+WORKSHEET_CACHE_TTL = 600  # 10 minutes
+
+# Sheets write quota: self-throttle and chunk large writes
+SHEETS_MAX_CELLS_PER_WRITE = 5000
+SHEETS_WRITE_RETRIES = 4
+# Total time a write made inside a request may spend waiting on the quota
+# and 429 backoff; well under gunicorn's 120s worker timeout
+SHEETS_REQUEST_WRITE_BUDGET = 20
+_write_times = deque()  # monotonic timestamps of writes in the last minute
+_write_lock = threading.Lock()
+
 
 def parse_sheet_id(url_or_id):
     """Extract Google Sheet ID from a URL or raw ID string.
@@ -40,32 +76,48 @@ def parse_sheet_id(url_or_id):
     return None
 
 
+# Fast path for the CSV export's usual M/D/YYYY dates (skips strptime)
+_MDY_RE = re.compile(r'^(\d{1,2})/(\d{1,2})/(\d{4})$')
+_DATE_FORMATS = ('%m/%d/%Y', '%m/%d/%y', '%B %d, %Y', '%b %d, %Y')
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_exam_date(date_str):
+    """Parse a stripped exam date string to datetime, or None if unrecognised.
+
+    Cached on the raw string: many rows share the same exam date.
+    """
+    m = _MDY_RE.match(date_str)
+    if m:
+        try:
+            return datetime(int(m.group(3)), int(m.group(1)), int(m.group(2)))
+        except ValueError:
+            pass
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(date_str, fmt)
+        except ValueError:
+            continue
+    return None
+
+
 def format_exam_date(date_str):
     """Parse and format exam date for display."""
     if not date_str:
         return 'TBD'
     date_str = date_str.strip()
-    # Try M/D/YYYY (CSV export format)
-    for fmt in ('%m/%d/%Y', '%m/%d/%y', '%B %d, %Y', '%b %d, %Y'):
-        try:
-            dt = datetime.strptime(date_str, fmt)
-            return dt.strftime('%b %d, %Y')
-        except ValueError:
-            continue
-    return date_str
+    dt = _parse_exam_date(date_str)
+    if dt is None:
+        return date_str
+    return dt.strftime('%b %d, %Y')
 
 
 def parse_exam_date_for_sort(date_str):
     """Parse exam date string to datetime for sorting."""
     if not date_str:
         return datetime.min
-    date_str = date_str.strip()
-    for fmt in ('%m/%d/%Y', '%m/%d/%y', '%B %d, %Y', '%b %d, %Y'):
-        try:
-            return datetime.strptime(date_str, fmt)
-        except ValueError:
-            continue
-    return datetime.min
+    dt = _parse_exam_date(date_str.strip())
+    return dt if dt is not None else datetime.min
 
 
 def fetch_exam_sheet():
@@ -81,20 +133,44 @@ def fetch_exam_sheet():
 
     print("[SHEET] Fetching fresh data from Google Sheets...")
 
+    # Conditional GET: if the export is unchanged Google answers 304 with no
+    # body. Snapshot what the validators came from, since
+    # invalidate_sheet_cache() may clear the cache while the request runs.
+    cached = _sheet_cache['data']
+    headers = {}
+    if cached is not None:
+        if _sheet_cache['etag']:
+            headers['If-None-Match'] = _sheet_cache['etag']
+        if _sheet_cache['last_modified']:
+            headers['If-Modified-Since'] = _sheet_cache['last_modified']
+
     try:
-        response = requests.get(SHEET_CSV_URL, timeout=30)
+        response = requests.get(SHEET_CSV_URL, headers=headers, timeout=30, stream=True)
+        if response.status_code == 304:
+            response.close()
+            if cached is not None:
+                print("[SHEET] Not modified since last fetch, keeping cached data")
+                if _sheet_cache['data'] is cached:
+                    _sheet_cache['timestamp'] = now
+                return cached
+            # Nothing to fall back on; fetch the full export instead
+            response = requests.get(SHEET_CSV_URL, timeout=30, stream=True)
         response.raise_for_status()
-    except requests.RequestException as e:
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        students = _parse_sheet_response(response)
+    except Exception as e:
         print(f"[SHEET] Failed to fetch: {e}")
         if _sheet_cache['data'] is not None:
             return _sheet_cache['data']
         return []
 
-    students = _parse_sheet_csv(response.text)
     print(f"[SHEET] Parsed {len(students)} unique exam students")
 
     _sheet_cache['data'] = students
     _sheet_cache['timestamp'] = now
+    _sheet_cache['etag'] = etag
+    _sheet_cache['last_modified'] = last_modified
 
     return students
 
@@ -103,49 +179,91 @@ def invalidate_sheet_cache():
     """Clear the sheet cache."""
     _sheet_cache['data'] = None
     _sheet_cache['timestamp'] = None
+    _sheet_cache['etag'] = None
+    _sheet_cache['last_modified'] = None
     print("[SHEET] Cache invalidated")
 
 
-def _parse_sheet_csv(text):
-    """Parse CSV text into the standard exam student format. Shared by admin + user sheet.
+def _parse_sheet_response(response):
+    """Parse a streamed (stream=True) CSV response without buffering the whole body."""
+    try:
+        response.raw.decode_content = True
+        stream = io.TextIOWrapper(response.raw, encoding=response.encoding or 'utf-8', newline='')
+        return _parse_sheet_csv(stream)
+    finally:
+        response.close()
+
+
+def _parse_sheet_csv(source):
+    """Parse CSV text or a text stream into the standard exam student format.
+    Shared by admin + user sheet.
 
     Column matching is case-insensitive and tolerates extra whitespace.
+    Candidate header names are resolved to column positions once per parse,
+    so the per-row work is plain list indexing on csv.reader rows.
     """
-    reader = csv.DictReader(io.StringIO(text))
-    if not reader.fieldnames:
+    if isinstance(source, str):
+        source = io.StringIO(source)
+    reader = csv.reader(source)
+    header = next(reader, None)
+    if not header:
         return []
 
-    # Build case-insensitive column lookup: lowered+stripped header → original header
-    col_map = {}
-    for h in reader.fieldnames:
-        col_map[h.strip().lower()] = h
-
-    def col(row, *candidates):
-        """Get value from row using first matching column name (case-insensitive)."""
-        for c in candidates:
-            orig = col_map.get(c.lower())
-            if orig:
-                val = (row.get(orig) or '').strip()
+    # Case-insensitive column lookup: lowered+stripped header -> column index
+    col_idx = {h.strip().lower(): i for i, h in enumerate(header)}
+
+    def cols(*candidates):
+        """Resolve candidate column names (case-insensitive) to indexes present in this sheet."""
+        return tuple(col_idx[c.lower()] for c in candidates if c.lower() in col_idx)
+
+    def col(row, idxs):
+        """Get the first non-empty value from the resolved columns."""
+        for i in idxs:
+            if i < len(row):
+                val = row[i].strip()
                 if val:
                     return val
         return ''
 
-    students = []
+    c_email = cols('email', 'e-mail', 'email address')
+    c_date = cols('exam date', 'examdate', 'date')
+    c_name = cols('student name', 'name', 'full name', 'student')
+    c_phone = cols('phone', 'phone number', 'tel')
+    c_time = cols('exam time', 'time')
+    c_state = cols('state', 'exam state')
+    c_course = cols('course', 'exam course', 'course type')
+    c_owner = cols('agency owner', 'agent', 'owner', 'agency')
+    c_passfail = cols('pass/fail', 'pass fail', 'result', 'passfail')
+    c_outcome = cols('final outcome', 'outcome')
+    c_alert = cols('alert date')
+    c_study_hours = cols('study hours at exam')
+    c_final_practice = cols('final practice %', 'final practice')
+    c_chapters = cols('chapters complete')
+    c_videos = cols('videos watched')
+    c_state_laws = cols('state laws done')
+    c_consistency = cols('study consistency')
+    c_t0_sent = cols('T-0 Sent', 't-0 sent')
+    week_cols = [(w, cols(ks), cols(kh), cols(kp), cols(kn)) for w, ks, kh, kp, kn in _WEEK_KEYS]
+
+    # Deduplicate by email in the same pass: keep last occurrence,
+    # but preserve pass/fail from any row
+    seen = {}
+    passfail_by_email = {}
 
     for row in reader:
-        email = col(row, 'email', 'e-mail', 'email address').lower()
+        email = normalize_email(col(row, c_email))
         if not email:
             continue
 
-        raw_date = col(row, 'exam date', 'examdate', 'date')
+        raw_date = col(row, c_date)
 
         # Weekly tracking data (T-5 through T-0)
         weekly = []
-        for week in ['T-5', 'T-4', 'T-3', 'T-2', 'T-1']:
-            status = col(row, f'{week} Status')
-            hours = col(row, f'{week} Hours')
-            practice = col(row, f'{week} Practice %')
-            notes = col(row, f'{week} Notes')
+        for week, ks, kh, kp, kn in week_cols:
+            status = col(row, ks)
+            hours = col(row, kh)
+            practice = col(row, kp)
+            notes = col(row, kn)
             if status or hours or practice or notes:
                 weekly.append({
                     'week': week,
@@ -155,38 +273,34 @@ def _parse_sheet_csv(text):
                     'notes': notes
                 })
 
-        students.append({
-            'name': col(row, 'student name', 'name', 'full name', 'student'),
+        passfail = col(row, c_passfail)
+        if passfail:
+            passfail_by_email[email] = passfail
+
+        seen[email] = {
+            'name': col(row, c_name),
             'email': email,
-            'phone': col(row, 'phone', 'phone number', 'tel'),
+            'phone': col(row, c_phone),
             'examDate': raw_date,
             'examDateFormatted': format_exam_date(raw_date),
-            'examTime': col(row, 'exam time', 'time'),
-            'state': col(row, 'state', 'exam state'),
-            'course': col(row, 'course', 'exam course', 'course type'),
-            'agencyOwner': col(row, 'agency owner', 'agent', 'owner', 'agency'),
-            'passFail': col(row, 'pass/fail', 'pass fail', 'result', 'passfail'),
-            'finalOutcome': col(row, 'final outcome', 'outcome'),
+            'examTime': col(row, c_time),
+            'state': col(row, c_state),
+            'course': col(row, c_course),
+            'agencyOwner': col(row, c_owner),
+            'passFail': passfail,
+            'finalOutcome': col(row, c_outcome),
             # Extended tracking data
-            'alertDate': col(row, 'alert date'),
-            'studyHoursAtExam': col(row, 'study hours at exam'),
-            'finalPractice': col(row, 'final practice %', 'final practice'),
-            'chaptersComplete': col(row, 'chapters complete'),
-            'videosWatched': col(row, 'videos watched'),
-            'stateLawsDone': col(row, 'state laws done'),
-            'studyConsistency': col(row, 'study consistency'),
-            't0Sent': col(row, 'T-0 Sent', 't-0 sent'),
+            'alertDate': col(row, c_alert),
+            'studyHoursAtExam': col(row, c_study_hours),
+            'finalPractice': col(row, c_final_practice),
+            'chaptersComplete': col(row, c_chapters),
+            'videosWatched': col(row, c_videos),
+            'stateLawsDone': col(row, c_state_laws),
+            'studyConsistency': col(row, c_consistency),
+            't0Sent': col(row, c_t0_sent),
             'weeklyTracking': weekly,
-        })
+        }
 
-    # Deduplicate by email: keep last occurrence, but preserve pass/fail from any row
-    seen = {}
-    passfail_by_email = {}
-    for s in students:
-        e = s['email']
-        if s['passFail']:
-            passfail_by_email[e] = s['passFail']
-        seen[e] = s
     for e, s in seen.items():
         if not s['passFail'] and e in passfail_by_email:
             s['passFail'] = passfail_by_email[e]
@@ -195,7 +309,7 @@ def _parse_sheet_csv(text):
 
 def fetch_user_exam_sheet(sheet_id, user_email):
     """Fetch and parse a user's Google Sheet exam data (per-user cache)."""
-    user_email = user_email.lower().strip()
+    user_email = normalize_email(user_email)
     now = datetime.utcnow()
 
     # Check per-user cache
@@ -210,7 +324,7 @@ def fetch_user_exam_sheet(sheet_id, user_email):
     print(f"[USER SHEET] Fetching fresh data for {user_email}...")
 
     try:
-        response = requests.get(csv_url, timeout=30)
+        response = requests.get(csv_url, timeout=30, stream=True)
         response.raise_for_status()
     except requests.RequestException as e:
         print(f"[USER SHEET] Failed to fetch for {user_email}: {e}")
@@ -225,7 +339,13 @@ def fetch_user_exam_sheet(sheet_id, user_email):
         print(f"[USER SHEET] Content-Type: {content_type}, first 200 chars: {response.text[:200]}")
         return []
 
-    students = _parse_sheet_csv(response.text)
+    try:
+        students = _parse_sheet_response(response)
+    except Exception as e:
+        print(f"[USER SHEET] Failed to read sheet for {user_email}: {e}")
+        if user_email in _user_sheet_cache:
+            return _user_sheet_cache[user_email]['data']
+        return []
     print(f"[USER SHEET] Parsed {len(students)} unique exam students for {user_email}")
 
     _user_sheet_cache[user_email] = {'data': students, 'timestamp': now}
@@ -267,27 +387,289 @@ def validate_user_sheet(sheet_id):
 
 def invalidate_user_sheet_cache(user_email):
     """Clear cached data for a specific user's sheet."""
-    user_email = user_email.lower().strip()
+    user_email = normalize_email(user_email)
     if user_email in _user_sheet_cache:
         del _user_sheet_cache[user_email]
         print(f"[USER SHEET] Cache invalidated for {user_email}")
 
 
-def _get_gspread_client():
-    """Get authenticated gspread client using service account credentials."""
-    import json
-    import gspread
-    from google.oauth2.service_account import Credentials
+def get_gspread_client():
+    """Get authenticated gspread client using service account credentials.
+
+    The client (and its authorized HTTP session) is built once per process
+    and reused; gspread refreshes the access token itself when it expires.
+    """
+    global _gspread_client
+    if _gspread_client is not None:
+        return _gspread_client
+
+    with _gspread_lock:
+        if _gspread_client is not None:
+            return _gspread_client
+
+        import json
+        import gspread
+        from google.oauth2.service_account import Credentials
 
+        from config import Config
+        creds_json = Config.GOOGLE_SHEETS_CREDENTIALS_JSON
+        if not creds_json:
+            return None
+
+        creds_data = json.loads(creds_json)
+        scopes = ['https://www.googleapis.com/auth/spreadsheets']
+        credentials = Credentials.from_service_account_info(creds_data, scopes=scopes)
+        _gspread_client = gspread.authorize(credentials)
+        return _gspread_client
+
+
+def open_worksheet(gc, sheet_id, title=None):
+    """Return a worksheet (first tab, or the named tab), cached per sheet ID.
+
+    open_by_key() is a metadata round-trip of its own, so the Worksheet
+    handle is reused for WORKSHEET_CACHE_TTL. A missing named tab raises
+    gspread's WorksheetNotFound, same as spreadsheet.worksheet().
+    """
+    now = datetime.utcnow()
+    key = (sheet_id, title)
+    cached = _worksheet_cache.get(key)
+    if cached and (now - cached['timestamp']).total_seconds() < WORKSHEET_CACHE_TTL:
+        return cached['sheet']
+
+    spreadsheet = gc.open_by_key(sheet_id)
+    sheet = spreadsheet.worksheet(title) if title else spreadsheet.sheet1
+    _worksheet_cache[key] = {'sheet': sheet, 'timestamp': now}
+    return sheet
+
+
+def invalidate_worksheet_cache():
+    """Forget cached worksheet handles (e.g. after a tab was added or renamed)."""
+    _worksheet_cache.clear()
+
+
+def _throttle_sheet_write(deadline=None):
+    """Block until another write fits in the per-minute Sheets write quota.
+
+    Raises TimeoutError instead of waiting past deadline (monotonic time).
+    """
     from config import Config
-    creds_json = Config.GOOGLE_SHEETS_CREDENTIALS_JSON
-    if not creds_json:
-        return None
+    limit = Config.SHEETS_WRITES_PER_MIN
+    while True:
+        with _write_lock:
+            now = time.monotonic()
+            while _write_times and now - _write_times[0] >= 60:
+                _write_times.popleft()
+            if len(_write_times) < limit:
+                _write_times.append(now)
+                return
+            wait = 60 - (now - _write_times[0])
+        if deadline is not None and now + wait > deadline:
+            raise TimeoutError('Sheets write quota exhausted, giving up')
+        time.sleep(max(wait, 0.05))
+
+
+def sheets_write_with_backoff(fn, *args, deadline=None, **kwargs):
+    """Call a gspread write method, self-throttled and retried on HTTP 429.
+
+    Honors Retry-After when Google sends it, otherwise backs off
+    exponentially (capped at 60s). Other errors propagate immediately.
+    With a deadline (time.monotonic()), a retry that would sleep past it
+    re-raises the 429 instead, so request threads give up in time.
+    """
+    for attempt in range(SHEETS_WRITE_RETRIES + 1):
+        _throttle_sheet_write(deadline)
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            response = getattr(e, 'response', None)
+            if getattr(response, 'status_code', None) != 429 or attempt == SHEETS_WRITE_RETRIES:
+                raise
+            retry_after = response.headers.get('Retry-After')
+            try:
+                delay = float(retry_after) if retry_after else 15 * (2 ** attempt)
+            except ValueError:
+                delay = 15 * (2 ** attempt)
+            delay = min(60, delay)
+            if deadline is not None and time.monotonic() + delay > deadline:
+                print("[SHEET WRITE] Rate limited (429), out of retry budget")
+                raise
+            print(f"[SHEET WRITE] Rate limited (429), retrying in {delay:.0f}s (attempt {attempt + 1})")
+            time.sleep(delay)
+
+
+@functools.lru_cache(maxsize=1024)
+def col_letter(col):
+    """Column letters for a 1-based column index (1 -> 'A', 27 -> 'AA')."""
+    letters = ''
+    while col > 0:
+        col, rem = divmod(col - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def _coalesce_cells(cells):
+    """Group (row, col, value) cells into rectangles of adjacent cells.
+
+    Contiguous columns within a row become one horizontal run; runs that
+    span the same columns on consecutive rows are stacked into one block.
+    Returns a list of (first_row, first_col, last_row, last_col, values_2d).
+    """
+    by_pos = {(r, c): v for r, c, v in cells}
+
+    # Horizontal runs: (row, first_col, last_col, [values])
+    runs = []
+    for r, c in sorted(by_pos):
+        if runs and runs[-1][0] == r and runs[-1][2] == c - 1:
+            run = runs[-1]
+            runs[-1] = (r, run[1], c, run[3] + [by_pos[(r, c)]])
+        else:
+            runs.append((r, c, c, [by_pos[(r, c)]]))
+
+    # Stack runs with the same column span on consecutive rows
+    blocks = []
+    for r, c0, c1, vals in sorted(runs, key=lambda run: (run[1], run[2], run[0])):
+        if blocks and blocks[-1][1] == c0 and blocks[-1][3] == c1 and blocks[-1][2] == r - 1:
+            r0, _, _, _, rows = blocks[-1]
+            blocks[-1] = (r0, c0, r, c1, rows + [vals])
+        else:
+            blocks.append((r, c0, r, c1, [vals]))
+    return blocks
+
+
+def _batch_write_cells(sheet, cells):
+    """Write several (row, col, value) cells in a single values batch update.
+
+    One POST replaces a sequence of update_cell round-trips, and adjacent
+    cells are sent as one rectangular range. Values are written
+    USER_ENTERED, same as update_cell. Called from request handlers, so
+    all chunks share SHEETS_REQUEST_WRITE_BUDGET of quota/backoff waiting.
+    """
+    deadline = time.monotonic() + SHEETS_REQUEST_WRITE_BUDGET
+    # Split into requests of at most SHEETS_MAX_CELLS_PER_WRITE cells
+    batches = [[]]
+    batch_cells = 0
+    for r0, c0, r1, c1, values in _coalesce_cells(cells):
+        a1 = f"{col_letter(c0)}{r0}"
+        if (r0, c0) != (r1, c1):
+            a1 = f"{a1}:{col_letter(c1)}{r1}"
+        n = (r1 - r0 + 1) * (c1 - c0 + 1)
+        if batches[-1] and batch_cells + n > SHEETS_MAX_CELLS_PER_WRITE:
+            batches.append([])
+            batch_cells = 0
+        batches[-1].append({'range': a1, 'values': values})
+        batch_cells += n
+    for data in batches:
+        if data:
+            sheets_write_with_backoff(sheet.batch_update, data, value_input_option='USER_ENTERED',
+                                      deadline=deadline)
+
+
+def _load_sheet_layout(sheet, sheet_id):
+    """Read the whole sheet once and refresh both write-back caches from it.
+
+    A single get_all_values() call yields the header row (column lookup)
+    and the Email column (email -> rows index), instead of a row_values(1)
+    plus a col_values() round-trip. Returns (cols, rows).
+    """
+    now = datetime.utcnow()
+    values = sheet.get_all_values()
+    header = values[0] if values else []
+    cols = {h.strip().lower(): i for i, h in enumerate(header, 1)}
 
-    creds_data = json.loads(creds_json)
-    scopes = ['https://www.googleapis.com/auth/spreadsheets']
-    credentials = Credentials.from_service_account_info(creds_data, scopes=scopes)
-    return gspread.authorize(credentials)
+    rows = {}
+    email_col = cols.get('email')
+    if email_col:
+        idx = email_col - 1
+        for i, row in enumerate(values, 1):
+            if idx < len(row):
+                rows.setdefault(normalize_email(row[idx]), []).append(i)
+
+    _header_cache[sheet_id] = {'cols': cols, 'timestamp': now}
+    _row_index_cache[sheet_id] = {'rows': rows, 'timestamp': now}
+    return cols, rows
+
+
+def _get_header_cols(sheet, sheet_id, refresh=False):
+    """Return {lowered header: 1-based column index} for a sheet's header row.
+
+    Headers rarely change, so the row is cached per sheet ID for
+    HEADER_CACHE_TTL and writers skip the header round-trip.
+    Pass refresh=True to force a re-read (e.g. a column was not found).
+    """
+    now = datetime.utcnow()
+    cached = _header_cache.get(sheet_id)
+    if not refresh and cached and (now - cached['timestamp']).total_seconds() < HEADER_CACHE_TTL:
+        return cached['cols']
+    return _load_sheet_layout(sheet, sheet_id)[0]
+
+
+def _find_columns(sheet, sheet_id, *names):
+    """Look up column indexes by header name, re-reading the header once on a miss."""
+    cols = _get_header_cols(sheet, sheet_id)
+    if not all(n in cols for n in names):
+        cols = _get_header_cols(sheet, sheet_id, refresh=True)
+    return cols
+
+
+def _rows_hold_email(sheet, email_col, row_nums, email):
+    """Check (one batch read) that each row's Email cell is still this email."""
+    letter = col_letter(email_col)
+    try:
+        ranges = sheet.batch_get([f"{letter}{row_num}" for row_num in row_nums])
+    except Exception as e:
+        print(f"[SHEET WRITE] Could not verify cached rows: {e}")
+        return False
+    if len(ranges) != len(row_nums):
+        return False
+    for value_range in ranges:
+        cell = value_range[0][0] if value_range and value_range[0] else ''
+        if normalize_email(cell) != email:
+            return False
+    return True
+
+
+def _get_email_rows(sheet, sheet_id, email, email_col):
+    """Return the sheet row numbers holding this email (may be several).
+
+    The Email column is indexed once per ROW_INDEX_CACHE_TTL (alongside the
+    header, see _load_sheet_layout), so repeated writes skip the full read
+    and the linear scan. The index is only a hint: people sort and edit
+    this sheet by hand, so the Email cells at the cached rows are read
+    back first and any mismatch rebuilds the index before writing. An
+    email missing from a cached index triggers one re-read, which picks up
+    students added since the index was built, unless the index is younger
+    than ROW_INDEX_NEGATIVE_TTL.
+    """
+    email = normalize_email(email)
+    now = datetime.utcnow()
+    cached = _row_index_cache.get(sheet_id)
+    if cached:
+        age = (now - cached['timestamp']).total_seconds()
+        if age < ROW_INDEX_CACHE_TTL and email in cached['rows']:
+            row_nums = cached['rows'][email]
+            if _rows_hold_email(sheet, email_col, row_nums, email):
+                return row_nums
+            print(f"[SHEET WRITE] Cached rows for {email} moved, re-reading sheet")
+        elif age < ROW_INDEX_NEGATIVE_TTL:
+            # Negative fast path: the index was just rebuilt and the email
+            # isn't in it, so another full read would only say "not found"
+            return []
+
+    cols, rows = _load_sheet_layout(sheet, sheet_id)
+    if cols.get('email') != email_col:
+        # Columns moved too, so the caller's column numbers are stale;
+        # skip this write rather than fill the wrong cells
+        print("[SHEET WRITE] Sheet columns changed since the header was cached, skipping write")
+        return []
+    return rows.get(email, [])
+
+
+def invalidate_sheet_write_index(sheet_id=None):
+    """Drop the cached email -> row index for one sheet, or all sheets."""
+    if sheet_id is None:
+        _row_index_cache.clear()
+    else:
+        _row_index_cache.pop(sheet_id, None)
 
 
 def update_sheet_passfail(email, result, sheet_id=None):
@@ -298,43 +680,33 @@ def update_sheet_passfail(email, result, sheet_id=None):
     Non-fatal: logs errors but doesn't raise.
     """
     try:
-        gc = _get_gspread_client()
+        gc = get_gspread_client()
         if not gc:
             print("[SHEET WRITE] No Google Sheets credentials configured, skipping write-back")
             return False
 
         from config import Config
         target_id = sheet_id or Config.GOOGLE_SHEET_ID
-        sheet = gc.open_by_key(target_id).sheet1
+        sheet = open_worksheet(gc, target_id)
 
         # Find the email column and pass/fail column
-        headers = sheet.row_values(1)
-        email_col = None
-        pf_col = None
-        for i, h in enumerate(headers, 1):
-            if h.strip().lower() == 'email':
-                email_col = i
-            if h.strip().lower() == 'pass/fail':
-                pf_col = i
+        cols = _find_columns(sheet, target_id, 'email', 'pass/fail')
+        email_col = cols.get('email')
+        pf_col = cols.get('pass/fail')
 
         if not email_col or not pf_col:
             print(f"[SHEET WRITE] Could not find Email (col {email_col}) or Pass/Fail (col {pf_col}) columns")
             return False
 
         # Find ALL rows with this email (students can have multiple exam entries)
-        email_cells = sheet.col_values(email_col)
-        row_nums = []
-        for i, cell_val in enumerate(email_cells, 1):
-            if cell_val.strip().lower() == email.lower().strip():
-                row_nums.append(i)
+        row_nums = _get_email_rows(sheet, target_id, email, email_col)
 
         if not row_nums:
             print(f"[SHEET WRITE] Email {email} not found in sheet")
             return False
 
-        # Update the pass/fail cell in ALL matching rows
-        for row_num in row_nums:
-            sheet.update_cell(row_num, pf_col, result)
+        # Update the pass/fail cell in ALL matching rows (one batch request)
+        _batch_write_cells(sheet, [(row_num, pf_col, result) for row_num in row_nums])
         print(f"[SHEET WRITE] Updated {len(row_nums)} row(s) for {email} -> {result}")
 
         # Invalidate cache so next read picks up the change
@@ -355,39 +727,27 @@ def update_sheet_exam_date(email, exam_date, exam_time='', sheet_id=None):
     Non-fatal: logs errors but doesn't raise.
     """
     try:
-        gc = _get_gspread_client()
+        gc = get_gspread_client()
         if not gc:
             print("[SHEET WRITE] No Google Sheets credentials configured, skipping date write-back")
             return False
 
         from config import Config
         target_id = sheet_id or Config.GOOGLE_SHEET_ID
-        sheet = gc.open_by_key(target_id).sheet1
-
-        headers = sheet.row_values(1)
-        email_col = None
-        date_col = None
-        time_col = None
-        for i, h in enumerate(headers, 1):
-            hl = h.strip().lower()
-            if hl == 'email':
-                email_col = i
-            if hl == 'exam date':
-                date_col = i
-            if hl == 'exam time':
-                time_col = i
+        sheet = open_worksheet(gc, target_id)
+
+        cols = _find_columns(sheet, target_id, 'email', 'exam date')
+        email_col = cols.get('email')
+        date_col = cols.get('exam date')
+        time_col = cols.get('exam time')
 
         if not email_col or not date_col:
             print(f"[SHEET WRITE] Could not find Email (col {email_col}) or Exam Date (col {date_col}) columns")
             return False
 
-        # Find the row with this email
-        email_cells = sheet.col_values(email_col)
-        row_num = None
-        for i, cell_val in enumerate(email_cells, 1):
-            if cell_val.strip().lower() == email.lower().strip():
-                row_num = i
-                break
+        # Find the first row with this email
+        row_nums = _get_email_rows(sheet, target_id, email, email_col)
+        row_num = row_nums[0] if row_nums else None
 
         if not row_num:
             print(f"[SHEET WRITE] Email {email} not found in sheet for date update")
@@ -401,9 +761,10 @@ def update_sheet_exam_date(email, exam_date, exam_time='', sheet_id=None):
         except ValueError:
             pass
 
-        sheet.update_cell(row_num, date_col, sheet_date)
+        cells = [(row_num, date_col, sheet_date)]
         if time_col and exam_time:
-            sheet.update_cell(row_num, time_col, exam_time)
+            cells.append((row_num, time_col, exam_time))
+        _batch_write_cells(sheet, cells)
 
         print(f"[SHEET WRITE] Updated row {row_num}: {email} -> date={sheet_date} time={exam_time}")
 
@@ -423,51 +784,44 @@ def update_sheet_contact(email, name='', new_email='', phone='', sheet_id=None):
     Non-fatal: logs errors but doesn't raise.
     """
     try:
-        gc = _get_gspread_client()
+        gc = get_gspread_client()
         if not gc:
             print("[SHEET WRITE] No Google Sheets credentials configured, skipping contact write-back")
             return False
 
         from config import Config
         target_id = sheet_id or Config.GOOGLE_SHEET_ID
-        sheet = gc.open_by_key(target_id).sheet1
-
-        headers = sheet.row_values(1)
-        email_col = None
-        name_col = None
-        phone_col = None
-        for i, h in enumerate(headers, 1):
-            hl = h.strip().lower()
-            if hl == 'email':
-                email_col = i
-            if hl == 'student name':
-                name_col = i
-            if hl == 'phone':
-                phone_col = i
+        sheet = open_worksheet(gc, target_id)
+
+        cols = _find_columns(sheet, target_id, 'email')
+        email_col = cols.get('email')
+        name_col = cols.get('student name')
+        phone_col = cols.get('phone')
 
         if not email_col:
             print("[SHEET WRITE] Could not find Email column")
             return False
 
-        # Find the row with this email
-        email_cells = sheet.col_values(email_col)
-        row_num = None
-        for i, cell_val in enumerate(email_cells, 1):
-            if cell_val.strip().lower() == email.lower().strip():
-                row_num = i
-                break
+        # Find the first row with this email
+        row_nums = _get_email_rows(sheet, target_id, email, email_col)
+        row_num = row_nums[0] if row_nums else None
 
         if not row_num:
             print(f"[SHEET WRITE] Email {email} not found in sheet for contact update")
             return False
 
-        # Update fields that were provided
+        # Update fields that were provided (one batch request)
+        cells = []
         if name and name_col:
-            sheet.update_cell(row_num, name_col, name)
+            cells.append((row_num, name_col, name))
         if new_email:
-            sheet.update_cell(row_num, email_col, new_email)
+            cells.append((row_num, email_col, new_email))
         if phone and phone_col:
-            sheet.update_cell(row_num, phone_col, phone)
+            cells.append((row_num, phone_col, phone))
+        _batch_write_cells(sheet, cells)
+        if new_email:
+            # The row now belongs to the new address
+            invalidate_sheet_write_index(target_id)
 
         updated = []
         if name:
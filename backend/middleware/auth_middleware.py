@@ -1,8 +1,27 @@
 """Authentication middleware for protected routes."""
 
+import sys
+import time
 from functools import wraps
-from flask import session, jsonify, request, g
-from datetime import datetime
+from flask import session, request, g
+from datetime import datetime, timezone
+from config import Config
+from utils.json_response import ojsonify
+
+# Auth failures are routine (expired tabs, polling after logout); only log them in debug
+_LOG_AUTH_FAILURES = Config.DEBUG
+
+
+def _parse_expiry_epoch(expires_at):
+    """Convert a naive-UTC ISO string/datetime expiry to epoch seconds, or None."""
+    if not expires_at:
+        return None
+    try:
+        if isinstance(expires_at, str):
+            expires_at = datetime.fromisoformat(expires_at)
+        return expires_at.replace(tzinfo=timezone.utc).timestamp()
+    except (ValueError, TypeError, AttributeError):
+        return None
 
 
 def login_required(f):
@@ -13,12 +32,11 @@ def login_required(f):
     """
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        import sys
-
         # Check if user is logged in
         if 'user' not in session:
-            print(f"[AUTH FAIL] No user in session. Path: {request.path}", file=sys.stderr, flush=True)
-            return jsonify({
+            if _LOG_AUTH_FAILURES:
+                print(f"[AUTH FAIL] No user in session. Path: {request.path}", file=sys.stderr)
+            return ojsonify({
                 'success': False,
                 'error': 'Authentication required',
                 'code': 'AUTH_REQUIRED'
@@ -27,32 +45,27 @@ def login_required(f):
         # Check if session has required data
         user_data = session.get('user', {})
         if not user_data.get('token') or not user_data.get('departmentId'):
-            print(f"[AUTH FAIL] Missing token/dept. Path: {request.path}", file=sys.stderr, flush=True)
-            return jsonify({
+            if _LOG_AUTH_FAILURES:
+                print(f"[AUTH FAIL] Missing token/dept. Path: {request.path}", file=sys.stderr)
+            return ojsonify({
                 'success': False,
                 'error': 'Invalid session',
                 'code': 'INVALID_SESSION'
             }), 401
 
-        # Check token expiration
-        expires_at = user_data.get('tokenExpiresAt')
-        if expires_at:
-            try:
-                if isinstance(expires_at, str):
-                    expiry = datetime.fromisoformat(expires_at)
-                else:
-                    expiry = expires_at
-
-                if datetime.utcnow() > expiry:
-                    # Clear expired session
-                    session.clear()
-                    return jsonify({
-                        'success': False,
-                        'error': 'Session expired. Please log in again.',
-                        'code': 'SESSION_EXPIRED'
-                    }), 401
-            except (ValueError, TypeError):
-                pass
+        # Check token expiration (epoch float set at login; older sessions
+        # only carry the ISO string)
+        expires_epoch = user_data.get('tokenExpiresAtEpoch')
+        if expires_epoch is None:
+            expires_epoch = _parse_expiry_epoch(user_data.get('tokenExpiresAt'))
+        if expires_epoch is not None and time.time() > expires_epoch:
+            # Clear expired session
+            session.clear()
+            return ojsonify({
+                'success': False,
+                'error': 'Session expired. Please log in again.',
+                'code': 'SESSION_EXPIRED'
+            }), 401
 
         # Store user data in g for access in route
         g.user = user_data
@@ -66,31 +79,40 @@ def login_required(f):
 
 def get_current_user():
     """
-    Get the current authenticated user from the session.
+    Get the current authenticated user.
+
+    Inside a login_required handler this is the dict already stashed on g;
+    otherwise it falls back to the session.
 
     Returns:
         User dictionary or None if not authenticated
     """
-    return session.get('user')
+    return getattr(g, 'user', None) or session.get('user')
 
 
 def get_current_department_id():
     """
-    Get the current department ID from the session.
+    Get the current department ID (from g when set by login_required).
 
     Returns:
         Department ID string or None
     """
+    department_id = getattr(g, 'department_id', None)
+    if department_id:
+        return department_id
     user = get_current_user()
     return user.get('departmentId') if user else None
 
 
 def get_absorb_token():
     """
-    Get the Absorb API token from the session.
+    Get the Absorb API token (from g when set by login_required).
 
     Returns:
         Token string or None
     """
+    token = getattr(g, 'absorb_token', None)
+    if token:
+        return token
     user = get_current_user()
     return user.get('token') if user else None
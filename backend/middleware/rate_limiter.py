@@ -2,20 +2,40 @@
 
 import time
 from functools import wraps
-from flask import request, jsonify
-from collections import defaultdict
+from flask import request
+from collections import deque
 from threading import Lock
 from config import Config
+from utils.json_response import ojsonify
 
 
 class RateLimiter:
     """Simple in-memory rate limiter."""
 
+    LOCK_STRIPES = 64  # must be a power of two
+    SWEEP_EVERY = 1024  # checks between sweeps of idle clients (power of two)
+
     def __init__(self, requests_per_minute: int = 10):
         self.requests_per_minute = requests_per_minute
         self.window_size = 60  # 1 minute window
-        self.requests = defaultdict(list)
-        self.lock = Lock()
+        # Per-client ring buffer of request timestamps, oldest first. Only
+        # accepted requests are recorded, so it never needs more than
+        # requests_per_minute slots.
+        self.requests = {}
+        # Striped locks: clients only contend with others hashing to the same stripe
+        self._stripes = [Lock() for _ in range(self.LOCK_STRIPES)]
+        self._ops = 0
+
+    def _lock_for(self, client_id: str) -> Lock:
+        """Get the lock stripe guarding a client's timestamps."""
+        return self._stripes[hash(client_id) & (self.LOCK_STRIPES - 1)]
+
+    def _timestamps(self, client_id: str) -> deque:
+        """Get (creating if needed) a client's timestamp deque. Call under its stripe lock."""
+        timestamps = self.requests.get(client_id)
+        if timestamps is None:
+            timestamps = self.requests.setdefault(client_id, deque(maxlen=self.requests_per_minute))
+        return timestamps
 
     def _get_client_id(self) -> str:
         """Get a unique identifier for the client."""
@@ -29,10 +49,9 @@ class RateLimiter:
     def _cleanup_old_requests(self, client_id: str, current_time: float):
         """Remove requests older than the window size."""
         cutoff = current_time - self.window_size
-        self.requests[client_id] = [
-            timestamp for timestamp in self.requests[client_id]
-            if timestamp > cutoff
-        ]
+        timestamps = self._timestamps(client_id)
+        while timestamps and timestamps[0] <= cutoff:
+            timestamps.popleft()
 
     def is_rate_limited(self) -> bool:
         """
@@ -44,14 +63,32 @@ class RateLimiter:
         client_id = self._get_client_id()
         current_time = time.time()
 
-        with self.lock:
+        with self._lock_for(client_id):
             self._cleanup_old_requests(client_id, current_time)
 
-            if len(self.requests[client_id]) >= self.requests_per_minute:
+            timestamps = self._timestamps(client_id)
+            if len(timestamps) >= self.requests_per_minute:
                 return True
 
-            self.requests[client_id].append(current_time)
-            return False
+            timestamps.append(current_time)
+
+        self._ops += 1
+        if self._ops & (self.SWEEP_EVERY - 1) == 0:
+            self._sweep(current_time)
+        return False
+
+    def _sweep(self, current_time: float):
+        """Drop clients with no requests inside the window.
+
+        Without this, every distinct client ID (including spoofed
+        X-Forwarded-For values) would keep an entry forever.
+        """
+        cutoff = current_time - self.window_size
+        for client_id, timestamps in list(self.requests.items()):
+            with self._lock_for(client_id):
+                if not timestamps or timestamps[-1] <= cutoff:
+                    if self.requests.get(client_id) is timestamps:
+                        del self.requests[client_id]
 
     def get_remaining_requests(self) -> int:
         """
@@ -63,9 +100,9 @@ class RateLimiter:
         client_id = self._get_client_id()
         current_time = time.time()
 
-        with self.lock:
+        with self._lock_for(client_id):
             self._cleanup_old_requests(client_id, current_time)
-            return max(0, self.requests_per_minute - len(self.requests[client_id]))
+            return max(0, self.requests_per_minute - len(self._timestamps(client_id)))
 
     def get_reset_time(self) -> int:
         """
@@ -76,11 +113,12 @@ class RateLimiter:
         """
         client_id = self._get_client_id()
 
-        with self.lock:
-            if not self.requests[client_id]:
+        with self._lock_for(client_id):
+            timestamps = self.requests.get(client_id)
+            if not timestamps:
                 return 0
 
-            oldest_request = min(self.requests[client_id])
+            oldest_request = timestamps[0]
             reset_time = oldest_request + self.window_size - time.time()
             return max(0, int(reset_time))
 
@@ -106,7 +144,7 @@ def rate_limit(limiter: RateLimiter = None):
         def decorated_function(*args, **kwargs):
             if limiter.is_rate_limited():
                 reset_time = limiter.get_reset_time()
-                return jsonify({
+                return ojsonify({
                     'success': False,
                     'error': 'Too many requests. Please try again later.',
                     'code': 'RATE_LIMITED',
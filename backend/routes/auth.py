@@ -1,7 +1,7 @@
 """Authentication routes for JustInsurance Student Dashboard."""
 
-from flask import Blueprint, request, jsonify, session
-from datetime import datetime, timedelta
+from flask import Blueprint, request, session, g
+from datetime import datetime, timedelta, timezone
 import sys
 import os
 
@@ -12,6 +12,7 @@ from absorb_api import AbsorbAPIClient, AbsorbAPIError
 from middleware import rate_limit, login_required, get_current_user
 from utils import validate_login_input, sanitize_string
 from utils.credential_store import encrypt_password
+from utils.json_response import ojsonify
 from config import Config
 
 auth_bp = Blueprint('auth', __name__)
@@ -37,7 +38,7 @@ def login():
         data = request.get_json()
 
         if not data:
-            return jsonify({
+            return ojsonify({
                 'success': False,
                 'error': 'Request body is required'
             }), 400
@@ -50,7 +51,7 @@ def login():
         # Validate inputs
         is_valid, error = validate_login_input(username, password, department_id)
         if not is_valid:
-            return jsonify({
+            return ojsonify({
                 'success': False,
                 'error': error
             }), 400
@@ -63,7 +64,7 @@ def login():
             auth_result = client.authenticate_user(username, password)
         except AbsorbAPIError as e:
             if e.status_code == 401:
-                return jsonify({
+                return ojsonify({
                     'success': False,
                     'error': 'Invalid username or password'
                 }), 401
@@ -72,7 +73,7 @@ def login():
         # Check allowlist before proceeding
         from snapshot_db import is_user_allowed
         if not is_user_allowed(username):
-            return jsonify({
+            return ojsonify({
                 'success': False,
                 'error': 'Account not authorized. Please contact your administrator for access.'
             }), 403
@@ -92,7 +93,9 @@ def login():
         print(f"[LOGIN] Department: {dept_name}")
 
         # Step 4: Create session
-        token_expires_at = datetime.utcnow() + timedelta(hours=4)
+        now = datetime.utcnow()
+        token_expires_at = now + timedelta(hours=4)
+        expires_iso = token_expires_at.isoformat()
 
         # Encrypt the user's password into their session so sync/multi
         # endpoints can transparently re-auth with Absorb when the ~4-hour
@@ -102,17 +105,20 @@ def login():
         # token belongs to the user themselves — tenant isolation preserved.
         enc_pwd = encrypt_password(password, Config.SECRET_KEY)
 
+        first_name = username.split('@', 1)[0].title()
         session['user'] = {
             'id': username,
             'username': username,
             'email': username,
-            'firstName': username.split('@')[0].title(),
+            'firstName': first_name,
             'lastName': '',
             'departmentId': department_id,
             'departmentName': dept_name,
             'token': auth_result['token'],
-            'tokenExpiresAt': token_expires_at.isoformat(),
-            'loginTime': datetime.utcnow().isoformat(),
+            'tokenExpiresAt': expires_iso,
+            # Epoch seconds for login_required's per-request expiry check
+            'tokenExpiresAtEpoch': token_expires_at.replace(tzinfo=timezone.utc).timestamp(),
+            'loginTime': now.isoformat(),
             # Encrypted password blob — decrypted only inside
             # dashboard._refresh_user_absorb_token when a 401 is hit.
             'absorbPasswordEnc': enc_pwd,
@@ -120,30 +126,30 @@ def login():
 
         session.permanent = True
 
-        return jsonify({
+        return ojsonify({
             'success': True,
             'user': {
                 'id': username,
-                'name': username.split('@')[0].title(),
+                'name': first_name,
                 'email': username,
-                'firstName': username.split('@')[0].title(),
+                'firstName': first_name,
                 'lastName': ''
             },
             'department': {
                 'id': department_id,
                 'name': dept_name
             },
-            'expiresAt': token_expires_at.isoformat()
+            'expiresAt': expires_iso
         })
 
     except AbsorbAPIError as e:
-        return jsonify({
+        return ojsonify({
             'success': False,
             'error': str(e.message)
         }), e.status_code or 500
 
     except Exception as e:
-        return jsonify({
+        return ojsonify({
             'success': False,
             'error': 'An unexpected error occurred'
         }), 500
@@ -158,7 +164,8 @@ def logout():
         JSON response confirming logout
     """
     session.clear()
-    return jsonify({
+    g.pop('user', None)
+    return ojsonify({
         'success': True,
         'message': 'Logged out successfully'
     })
@@ -176,12 +183,12 @@ def get_session():
     user = get_current_user()
 
     if not user:
-        return jsonify({
+        return ojsonify({
             'success': False,
             'error': 'Not authenticated'
         }), 401
 
-    return jsonify({
+    return ojsonify({
         'success': True,
         'user': {
             'id': user.get('id'),
@@ -230,7 +237,7 @@ def heartbeat():
         pass
 
     user = get_current_user()
-    return jsonify({
+    return ojsonify({
         'success': True,
         'status': 'alive',
         'expiresAt': user.get('tokenExpiresAt') if user else None
@@ -1,15 +1,22 @@
 """Dashboard routes for JustInsurance Student Dashboard."""
 
-from flask import Blueprint, jsonify, g, request
+from flask import Blueprint, g, request, make_response, Response, has_request_context
 from functools import wraps
 import re
 import sys
 import os
 import tempfile
+import traceback
+import csv
+from io import StringIO
 import threading
+import time
+import atexit
 import hashlib
+import heapq
+from itertools import count, repeat
 import requests as _requests
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Add parent directory to path for imports
@@ -20,8 +27,11 @@ from absorb_api import AbsorbAPIClient, AbsorbAPIError
 from middleware import login_required
 from utils import format_student_for_response, get_status_from_last_login
 from utils.credential_store import decrypt_password
+from utils.cache_utils import set_bounded
+from utils.json_response import ojsonify
+from utils.shared_cache import shared_cache_enabled, shared_get, shared_set, shared_delete, shared_lock_acquire, shared_lock_release
 from config import Config
-from routes.exam import invalidate_exam_absorb_cache, get_department_name
+from routes.exam import invalidate_exam_absorb_cache, get_department_names
 from snapshot_db import get_user_dept_prefs, save_user_dept_prefs, get_user_hidden_students, save_user_hidden_students, get_user_ghl_settings, get_user_ghl_settings_masked, save_user_ghl_settings, get_user_bitrix_settings, get_user_bitrix_settings_masked, save_user_bitrix_settings, get_user_sheet_settings, get_user_sheet_settings_masked, save_user_sheet_settings
 from demo_data import (
     is_demo_dept, DEMO_DEPT_ID, DEMO_DEPT_NAME,
@@ -46,63 +56,597 @@ except ImportError:
 dashboard_bp = Blueprint('dashboard', __name__)
 
 # Simple in-memory cache for student data (per department)
-# Structure: {department_id: {'data': [...], 'timestamp': datetime, 'formatted': [...]}}
+# Structure: {department_id: {'data': [...], 'timestamp': datetime, 'formatted': [...], 'sort_keys': [...], 'summary': {...}, 'tally': (...)}}
+# The KPI summary is computed once when the entry is filled so /summary
+# doesn't recount the whole student list on every hit.
+# Capped at STUDENT_CACHE_MAX_DEPTS entries (oldest fill evicted first) so
+# departments looked up once don't stay resident for the worker's lifetime.
 _student_cache = {}
 CACHE_TTL_MINUTES = 5  # Cache data for 5 minutes
+STUDENT_CACHE_MAX_DEPTS = 256
+
+# Per-hit cache logging is noisy and every print takes the stdout lock on
+# the hottest path; only log hits in debug. Misses, refreshes and
+# invalidations are rare and always logged.
+_LOG_CACHE_HITS = Config.DEBUG
+
+# Basic (no enrollments) student lists from /students/quick and
+# /summary/quick. Separate from _student_cache so a quick load can never be
+# returned by the full endpoints.
+# Structure: {department_id: {'formatted': [...], 'summary': {...}, 'timestamp': datetime}}
+_quick_student_cache = {}
+
+# Formatted demo students: {'formatted': [...], 'summary': {...}, 'tally': (...), 'timestamp': datetime}
+_demo_cache = None
+# Entries up to STALE_TTL_MULTIPLIER x the TTL old are still served while a
+# background refresh runs; older ones are fetched in the foreground.
+STALE_TTL_MULTIPLIER = 2
+# When Absorb errors out on a foreground refresh, the last good entry is
+# served instead for up to MAX_STALE_HOURS (flagged with X-Cache-Stale).
+# Waiters on the same department skip re-fetching for
+# UPSTREAM_FAILURE_BACKOFF_SECONDS after a failure.
+MAX_STALE_HOURS = 24
+UPSTREAM_FAILURE_BACKOFF_SECONDS = 30
+_upstream_failed_at = {}  # department_id -> datetime of last failed fetch
+
+# A dashboard load fires /summary and /students (and often /exam) at
+# once; each checked the Redis fill timestamp for the same entry. A
+# confirmed match is trusted for SHARED_TS_RECHECK_SECONDS, so a sync on
+# another worker shows up here at most that much later.
+SHARED_TS_RECHECK_SECONDS = 2
+
+# Cross-worker single-flight for cold fetches (Redis only). The lock
+# expires on its own if the fetching worker dies mid-fetch.
+SHARED_FETCH_LOCK_SECONDS = 180
+SHARED_FETCH_POLL_SECONDS = 0.5
+_shared_ts_confirmed = {}  # department_id -> (monotonic time, timestamp iso)
+
+# Per-department fetch locks and the set of departments with a background
+# refresh queued or running. Locks are bounded like the caches (full and
+# quick keys per department); evicting one that is still held only lets a
+# second fetch for that department start, it can't deadlock.
+_dept_fetch_locks = {}
+_dept_fetch_locks_guard = threading.Lock()
+DEPT_FETCH_LOCKS_MAX = STUDENT_CACHE_MAX_DEPTS * 2
+_refresh_inflight = set()
+_refresh_inflight_lock = threading.Lock()
+
+
+def _tally_students(formatted_students):
+    """Count KPI statuses and sum progress in one pass over a student list.
+
+    Returns (total, complete, active, warning, reengage, total_progress).
+    Tallies are additive, so per-department tallies stored in the cache
+    can be combined for the multi-department summary without re-walking
+    the merged list.
+    """
+    complete = active = warning = reengage = 0
+    total_progress = 0
+
+    # Single pass: read each student's status once instead of walking the
+    # list four times. Other statuses are deliberately not counted.
+    for s in formatted_students:
+        status = s['status']['status']
+        total_progress += s['progress']['value']
+        if status == 'ACTIVE':
+            active += 1
+        elif status == 'WARNING':
+            warning += 1
+        elif status == 'RE-ENGAGE':
+            reengage += 1
+        elif status == 'COMPLETE':
+            complete += 1
+
+    return (len(formatted_students), complete, active, warning, reengage, total_progress)
+
+
+def _summary_from_tally(tally):
+    """Build the KPI summary dict from a _tally_students tuple."""
+    total, complete, active, warning, reengage, total_progress = tally
+    avg_progress = round(total_progress / total, 1) if total > 0 else 0
+
+    return {
+        'totalStudents': total,
+        'completeCount': complete,
+        'activeCount': active,
+        'warningCount': warning,
+        'reengageCount': reengage,
+        'averageProgress': avg_progress,
+    }
+
+
+def _compute_summary(formatted_students):
+    """Calculate KPI summary dict from a list of formatted students."""
+    return _summary_from_tally(_tally_students(formatted_students))
+
+
+def _merged_summary(dept_lists):
+    """KPI summary for several departments' student lists combined.
+
+    Uses the tally stored with each list's cache entry when there is one
+    and only walks lists that aren't cached.
+    """
+    cached_tallies = {
+        id(entry['formatted']): entry['tally']
+        for entry in list(_student_cache.values())
+        if 'tally' in entry
+    }
+    totals = [0, 0, 0, 0, 0, 0]
+    for students in dept_lists:
+        tally = cached_tallies.get(id(students))
+        if tally is None:
+            tally = _tally_students(students)
+        for i, value in enumerate(tally):
+            totals[i] += value
+    return _summary_from_tally(totals)
+
+
+def student_sort_key(student):
+    """Sort key for formatted students: status priority (re-engage first),
+    then progress descending. Shared by every sort and merge of student
+    lists so they all agree on the order."""
+    return (student['status']['priority'], -student['progress']['value'])
+
+
+# One AbsorbAPIClient per thread (request threads and the dept fan-out
+# pool alike). The HTTP session underneath is already process-wide; this
+# just avoids rebuilding the client and re-setting the token per helper.
+_client_local = threading.local()
+
+
+def _get_absorb_client(token):
+    """Return this thread's AbsorbAPIClient, pointed at token."""
+    client = getattr(_client_local, 'client', None)
+    if client is None:
+        client = AbsorbAPIClient()
+        _client_local.client = client
+    if client._token != token:
+        client.set_token(token)
+    return client
+
+
+def _get_demo_formatted():
+    """Formatted, sorted demo students plus their summary.
+
+    The demo snapshot is static, so the format + sort runs once per TTL
+    (relative login times still age) instead of on every demo request.
+    """
+    global _demo_cache
+    now = datetime.utcnow()
+    demo = _demo_cache
+    if demo is None or now - demo['timestamp'] >= timedelta(minutes=CACHE_TTL_MINUTES):
+        formatted = [format_student_for_response(s) for s in get_cached_demo_students()]
+        formatted.sort(key=student_sort_key)
+        tally = _tally_students(formatted)
+        # Rebound, not mutated, so concurrent readers never see a partial entry
+        demo = _demo_cache = {
+            'formatted': formatted,
+            'summary': _summary_from_tally(tally),
+            'tally': tally,
+            'timestamp': now,
+        }
+    return demo
 
 
 def get_cached_students(department_id, token):
     """Get students from cache or fetch fresh data."""
     # Demo mode — serve static anonymized data (zero API calls)
     if is_demo_dept(department_id):
-        cached = get_cached_demo_students()
-        formatted = [format_student_for_response(s) for s in cached]
-        formatted.sort(key=lambda s: (s['status']['priority'], -s['progress']['value']))
-        return cached, formatted
+        return get_cached_demo_students(), _get_demo_formatted()['formatted']
 
     now = datetime.utcnow()
+    ttl = timedelta(minutes=CACHE_TTL_MINUTES)
 
     # Check if we have valid cached data
-    if department_id in _student_cache:
-        cache_entry = _student_cache[department_id]
+    cache_entry = _student_cache.get(department_id)
+    if cache_entry and _local_entry_current(department_id, cache_entry):
         cache_age = now - cache_entry['timestamp']
 
-        if cache_age < timedelta(minutes=CACHE_TTL_MINUTES):
-            print(f"[CACHE] Using cached data for {department_id} (age: {cache_age.seconds}s)")
+        if cache_age < ttl:
+            if _LOG_CACHE_HITS:
+                print(f"[CACHE] Using cached data for {department_id} (age: {cache_age.seconds}s)")
             return cache_entry['data'], cache_entry['formatted']
 
-    # Fetch fresh data
-    print(f"[CACHE] Fetching fresh data for {department_id}")
-    client = AbsorbAPIClient()
-    client.set_token(token)
-    students = client.get_students_with_progress(department_id)
+        # Stale-while-revalidate: serve the slightly old entry now and
+        # refresh it in the background instead of blocking this request
+        if cache_age < ttl * STALE_TTL_MULTIPLIER:
+            if _schedule_student_refresh(department_id, token):
+                print(f"[CACHE] Serving stale data for {department_id} (age: {cache_age.seconds}s), refreshing")
+            return cache_entry['data'], cache_entry['formatted']
 
-    # Format students
+    # Another worker may already have fetched this department
+    cache_entry = _load_shared_entry(department_id, now)
+    if cache_entry:
+        print(f"[CACHE] Using shared cache for {department_id}")
+        return cache_entry['data'], cache_entry['formatted']
+
+    # Only one thread per department fetches on a miss; the rest wait for
+    # it and then read the entry it stored.
+    with _dept_fetch_lock(department_id):
+        cache_entry = _student_cache.get(department_id)
+        now = datetime.utcnow()
+        if cache_entry and now - cache_entry['timestamp'] < ttl:
+            return cache_entry['data'], cache_entry['formatted']
+        failed_at = _upstream_failed_at.get(department_id)
+        if (cache_entry and failed_at
+                and (now - failed_at).total_seconds() < UPSTREAM_FAILURE_BACKOFF_SECONDS
+                and _within_max_stale(cache_entry, now)):
+            # The thread holding the lock before us just failed; share its fallback
+            _note_stale_served()
+            return cache_entry['data'], cache_entry['formatted']
+        try:
+            cache_entry = _fetch_student_entry(department_id, token)
+        except AbsorbAPIError as e:
+            # 401 must reach the caller so it can refresh the token
+            if e.status_code == 401 or not cache_entry or not _within_max_stale(cache_entry, now):
+                raise
+            set_bounded(_upstream_failed_at, department_id, now, STUDENT_CACHE_MAX_DEPTS)
+            age_min = int((now - cache_entry['timestamp']).total_seconds() // 60)
+            print(f"[CACHE] Absorb fetch failed for {department_id} ({e}), serving stale data (age: {age_min}m)")
+            _note_stale_served()
+            return cache_entry['data'], cache_entry['formatted']
+        _upstream_failed_at.pop(department_id, None)
+    return cache_entry['data'], cache_entry['formatted']
+
+
+def _within_max_stale(cache_entry, now):
+    return now - cache_entry['timestamp'] < timedelta(hours=MAX_STALE_HOURS)
+
+
+def _note_stale_served():
+    """Flag the current response as served from a stale cache entry.
+
+    A no-op outside a request (pool threads); _fetch_depts_collect carries
+    the flag back through dept_meta instead.
+    """
+    if has_request_context():
+        g.student_cache_stale = True
+
+
+@dashboard_bp.after_request
+def _add_stale_header(response):
+    if g.get('student_cache_stale'):
+        response.headers['X-Cache-Stale'] = 'true'
+    return response
+
+
+def _fetch_student_entry(department_id, token):
+    """Fetch a department from Absorb and store it in the cache.
+
+    With Redis enabled, only one worker fetches a department at a time;
+    the others wait for its entry to land in the shared cache instead of
+    repeating the same Absorb fan-out.
+    """
+    lock_key = _shared_keys(department_id)[0] + ':fetching'
+    lock_token = os.urandom(8).hex()
+    if not shared_lock_acquire(lock_key, lock_token, SHARED_FETCH_LOCK_SECONDS):
+        cache_entry = _wait_for_shared_fill(department_id, lock_key)
+        if cache_entry:
+            return cache_entry
+    try:
+        print(f"[CACHE] Fetching fresh data for {department_id}")
+        now = datetime.utcnow()
+        client = _get_absorb_client(token)
+        students = client.get_students_with_progress(department_id)
+        return _store_student_entry(department_id, students, now)
+    finally:
+        shared_lock_release(lock_key, lock_token)
+
+
+def _wait_for_shared_fill(department_id, lock_key):
+    """Poll the shared cache while another worker fetches a department.
+
+    Returns the entry once it appears, or None if the other worker gives
+    up (lock released or expired without an entry) so the caller fetches.
+    """
+    print(f"[CACHE] Another worker is fetching {department_id}, waiting")
+    deadline = time.monotonic() + SHARED_FETCH_LOCK_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(SHARED_FETCH_POLL_SECONDS)
+        cache_entry = _load_shared_entry(department_id, datetime.utcnow())
+        if cache_entry:
+            return cache_entry
+        if shared_get(lock_key) is None:
+            return None
+    return None
+
+
+def _store_student_entry(department_id, students, now):
+    """Format a department's raw students and store them in the cache."""
+    # Format students. The department name never changes for a given
+    # entry, so it is stamped on once here rather than on every request.
     formatted_students = [format_student_for_response(student) for student in students]
+    dept_name = _record_dept_name(students)
+    for s in formatted_students:
+        s['departmentName'] = dept_name
 
     # Sort by status priority (re-engage first), then by progress
-    formatted_students.sort(
-        key=lambda s: (s['status']['priority'], -s['progress']['value']),
-        reverse=False
-    )
+    formatted_students.sort(key=student_sort_key)
 
     # Store in cache
-    _student_cache[department_id] = {
+    tally = _tally_students(formatted_students)
+    cache_entry = {
         'data': students,
         'formatted': formatted_students,
+        'sort_keys': [student_sort_key(s) for s in formatted_students],
+        'summary': _summary_from_tally(tally),
+        'tally': tally,
         'timestamp': now
     }
+    set_bounded(_student_cache, department_id, cache_entry, STUDENT_CACHE_MAX_DEPTS)
+    _store_shared_entry(department_id, cache_entry)
+    return cache_entry
 
-    return students, formatted_students
+
+def _dept_fetch_lock(department_id):
+    """Per-department lock serializing upstream fetches on a cache miss.
+
+    Keyed by department_id for full fetches and ('quick', department_id)
+    for basic ones.
+    """
+    lock = _dept_fetch_locks.get(department_id)
+    if lock is None:
+        with _dept_fetch_locks_guard:
+            lock = _dept_fetch_locks.get(department_id)
+            if lock is None:
+                lock = threading.Lock()
+                set_bounded(_dept_fetch_locks, department_id, lock, DEPT_FETCH_LOCKS_MAX)
+    return lock
+
+
+def _schedule_student_refresh(department_id, token):
+    """Queue a background refresh of a stale entry (at most one per dept).
+
+    Returns True if this call queued the refresh.
+    """
+    with _refresh_inflight_lock:
+        if department_id in _refresh_inflight:
+            return False
+        _refresh_inflight.add(department_id)
+    try:
+        # Never block the caller for a background refresh; if the pool is
+        # saturated the stale entry is served and a later request retries.
+        if _submit_dept_task(_refresh_student_entry, department_id, token, blocking=False):
+            return True
+    except RuntimeError:
+        # Pool shut down (interpreter exiting)
+        pass
+    with _refresh_inflight_lock:
+        _refresh_inflight.discard(department_id)
+    return False
+
+
+def _refresh_student_entry(department_id, token):
+    """Background stale-while-revalidate refresh for one department."""
+    try:
+        with _dept_fetch_lock(department_id):
+            _fetch_student_entry(department_id, token)
+    except Exception as e:
+        # Keep serving the stale entry; the next request past the stale
+        # window will fetch in the foreground and surface the error.
+        print(f"[CACHE] Background refresh failed for {department_id}: {e}")
+    finally:
+        with _refresh_inflight_lock:
+            _refresh_inflight.discard(department_id)
+
+
+def get_cached_summary(department_id, formatted_students):
+    """Return the precomputed KPI summary for a department's cache entry.
+
+    Falls back to computing it from formatted_students when there is no
+    cache entry.
+    """
+    for cache in (_student_cache, _quick_student_cache):
+        cache_entry = cache.get(department_id)
+        if cache_entry and cache_entry['formatted'] is formatted_students:
+            return cache_entry['summary']
+    demo = _demo_cache
+    if demo is not None and demo['formatted'] is formatted_students:
+        return demo['summary']
+    return _compute_summary(formatted_students)
+
+
+def _shared_keys(department_id):
+    """Redis keys for a department's full entry and its fill timestamp."""
+    return (f"student_cache:{department_id}:full", f"student_cache:{department_id}:ts")
+
+
+def _local_entry_current(department_id, cache_entry):
+    """Check the local entry against the shared fill timestamp.
+
+    With Redis enabled, a sync on another worker replaces the shared entry;
+    comparing the small timestamp key lets this worker drop its now-stale
+    copy without pulling the whole payload. Always True without Redis.
+    """
+    if not shared_cache_enabled():
+        return True
+    timestamp = cache_entry['timestamp'].isoformat()
+    confirmed = _shared_ts_confirmed.get(department_id)
+    if (confirmed and confirmed[1] == timestamp
+            and time.monotonic() - confirmed[0] < SHARED_TS_RECHECK_SECONDS):
+        return True
+    if shared_get(_shared_keys(department_id)[1]) != timestamp:
+        return False
+    set_bounded(_shared_ts_confirmed, department_id, (time.monotonic(), timestamp), STUDENT_CACHE_MAX_DEPTS)
+    return True
+
+
+def _load_shared_entry(department_id, now):
+    """Pull a department's entry from Redis into the local cache, if fresh."""
+    if not shared_cache_enabled():
+        return None
+    payload = shared_get(_shared_keys(department_id)[0])
+    if not payload:
+        return None
+    try:
+        timestamp = datetime.fromisoformat(payload['timestamp'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if now - timestamp >= timedelta(minutes=CACHE_TTL_MINUTES):
+        return None
+    cache_entry = {
+        'data': payload.get('data') or [],
+        'formatted': payload.get('formatted') or [],
+        'timestamp': timestamp,
+    }
+    cache_entry['tally'] = _tally_students(cache_entry['formatted'])
+    # Sorted by the filling worker; the keys are only needed for merging
+    cache_entry['sort_keys'] = [student_sort_key(s) for s in cache_entry['formatted']]
+    cache_entry['summary'] = payload.get('summary') or _summary_from_tally(cache_entry['tally'])
+    set_bounded(_student_cache, department_id, cache_entry, STUDENT_CACHE_MAX_DEPTS)
+    return cache_entry
+
+
+def _store_shared_entry(department_id, cache_entry):
+    """Mirror a freshly filled entry to Redis for the other workers."""
+    if not shared_cache_enabled():
+        return
+    # Kept for the whole stale-while-revalidate window: workers compare
+    # against the ts key to keep serving their stale copy, and
+    # _load_shared_entry checks the payload timestamp for freshness itself.
+    ttl = CACHE_TTL_MINUTES * 60 * STALE_TTL_MULTIPLIER
+    full_key, ts_key = _shared_keys(department_id)
+    timestamp = cache_entry['timestamp'].isoformat()
+    shared_set(full_key, {
+        'data': cache_entry['data'],
+        'formatted': cache_entry['formatted'],
+        'summary': cache_entry['summary'],
+        'timestamp': timestamp,
+    }, ttl)
+    shared_set(ts_key, timestamp, ttl)
+
+
+def _build_email_maps(raw_students, formatted_students):
+    """Index a department's students by lowercased email.
+
+    Returns (raw_email_map, formatted_email_map). Raw records are keyed by
+    _realEmail when present (demo students) so they match sheet emails;
+    formatted records are bridged to the same email through the student id.
+    """
+    fmt_by_id = {s.get('id'): s for s in formatted_students if s.get('id')}
+    raw_email_map = {}
+    formatted_email_map = {}
+    for s in raw_students:
+        email = (s.get('_realEmail') or s.get('emailAddress') or '').lower().strip()
+        if not email:
+            continue
+        raw_email_map[email] = s
+        sid = s.get('id') or s.get('Id')
+        fmt = fmt_by_id.get(sid) if sid else None
+        if fmt is not None:
+            formatted_email_map[email] = fmt
+        else:
+            # A later duplicate without a formatted match replaces the raw
+            # record, so drop any bridge left by an earlier one
+            formatted_email_map.pop(email, None)
+    return raw_email_map, formatted_email_map
+
+
+def get_student_email_maps(department_id, raw_students, formatted_students):
+    """Email maps for a department's students, built once per cache entry.
+
+    Returns the maps stored on the matching _student_cache entry (built on
+    first use) so the exam route doesn't re-index the department on every
+    request. Callers must copy the dicts before modifying them.
+    """
+    cache_entry = _student_cache.get(department_id)
+    if cache_entry is None or cache_entry['data'] is not raw_students:
+        return _build_email_maps(raw_students, formatted_students)
+    maps = cache_entry.get('email_maps')
+    if maps is None:
+        maps = cache_entry['email_maps'] = _build_email_maps(raw_students, formatted_students)
+    return maps
 
 
 def invalidate_cache(department_id):
     """Clear cache for a department."""
-    if department_id in _student_cache:
-        del _student_cache[department_id]
+    shared_delete(*_shared_keys(department_id))
+    _quick_student_cache.pop(department_id, None)
+    _upstream_failed_at.pop(department_id, None)
+    if _student_cache.pop(department_id, None) is not None:
         print(f"[CACHE] Invalidated cache for {department_id}")
 
 
+def _student_cache_etag(dept_ids):
+    """Build an ETag from the cache entries backing a student response.
+
+    Derived from each department's cache fill timestamp (not object ids)
+    so it is stable for the lifetime of the entry. Returns None if any
+    department has no fresh cache entry — the response is then served
+    without an ETag.
+    """
+    now = datetime.utcnow()
+    parts = [request.path, request.query_string.decode('utf-8', 'replace')]
+    for dept_id in dept_ids:
+        cache_entry = _student_cache.get(dept_id)
+        if not cache_entry or now - cache_entry['timestamp'] >= timedelta(minutes=CACHE_TTL_MINUTES):
+            return None
+        parts.append(f"{dept_id}:{cache_entry['timestamp'].isoformat()}:{len(cache_entry['formatted'])}")
+    return hashlib.md5('|'.join(parts).encode('utf-8')).hexdigest()
+
+
+def _etag_dept_ids():
+    """Department IDs whose cache entries back the current request."""
+    extra_param = request.args.get('departments', '')
+    valid_ids, _ = split_extra_dept_ids(extra_param.split(',') if extra_param else [])
+    return [g.department_id] + valid_ids
+
+
+def student_etag(f):
+    """Answer conditional GETs with 304 while the student cache is unchanged.
+
+    Must sit below @login_required (needs g.department_id). Successful
+    responses get an ETag plus Cache-Control: no-cache so the browser
+    always revalidates instead of serving a stale copy.
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        etag = _student_cache_etag(_etag_dept_ids())
+        if etag and request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            response.cache_control.no_cache = True
+            return response
+
+        response = make_response(f(*args, **kwargs))
+        if response.status_code == 200:
+            # Entry may have just been filled by this request
+            etag = _student_cache_etag(_etag_dept_ids())
+            if etag:
+                response.set_etag(etag)
+                response.cache_control.no_cache = True
+        return response
+    return decorated
+
+
+@dashboard_bp.errorhandler(AbsorbAPIError)
+def _absorb_error(e):
+    """Absorb failures from any dashboard route, with Absorb's status code."""
+    return ojsonify({'success': False, 'error': str(e.message)}), e.status_code or 500
+
+
+def json_errors(message, detail=False):
+    """Turn unexpected route exceptions into the standard JSON error body.
+
+    AbsorbAPIError passes through to _absorb_error. With detail=True the
+    exception text is appended to message, as the frontend shows it.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            try:
+                return f(*args, **kwargs)
+            except AbsorbAPIError:
+                raise
+            except Exception as e:
+                print(f"[ERROR] {message}: {e}")
+                traceback.print_exc()
+                error = f'{message}: {str(e)}' if detail else message
+                return ojsonify({'success': False, 'error': error}), 500
+        return decorated
+    return decorator
+
+
 # Per-process threading lock that serializes re-auth within a single
 # gunicorn worker. Guards against same-process double-refresh races.
 _refresh_lock = threading.Lock()
@@ -229,8 +773,10 @@ def _refresh_user_absorb_token():
             new_expiry = datetime.utcnow() + timedelta(hours=4)
             current_user_data['token'] = new_token
             current_user_data['tokenExpiresAt'] = new_expiry.isoformat()
+            current_user_data['tokenExpiresAtEpoch'] = new_expiry.replace(tzinfo=timezone.utc).timestamp()
             session['user'] = current_user_data
             session.modified = True
+            g.user = current_user_data
             g.absorb_token = new_token
             print(f'[TOKEN REFRESH] Refreshed Absorb token for {username} (locked)')
             return True
@@ -243,8 +789,41 @@ def _refresh_user_absorb_token():
                     pass
 
 
+# Shared worker pool for multi-department fetches (/students/multi, /sync).
+# Reused across requests instead of spinning up a fresh executor each time.
+# Absorb's own per-department fan-out runs in separate pools inside
+# absorb_api, so tasks here never wait on this pool.
+_DEPT_EXEC = ThreadPoolExecutor(max_workers=Config.DEPT_FETCH_WORKERS, thread_name_prefix='dept')
+atexit.register(_DEPT_EXEC.shutdown, wait=False)
+
+# Caps queued + running tasks on _DEPT_EXEC. A burst of multi-dept requests
+# waits for a slot here instead of piling unbounded futures onto the queue.
+_DEPT_SLOTS = threading.BoundedSemaphore(Config.DEPT_FETCH_WORKERS * 2)
+
+
+def _submit_dept_task(fn, *args, blocking=True):
+    """Submit fn(*args) to _DEPT_EXEC once a slot is free.
+
+    With blocking=False, returns None instead of waiting when all slots
+    are taken. Raises RuntimeError if the pool has been shut down.
+    """
+    if not _DEPT_SLOTS.acquire(blocking=blocking):
+        return None
+    try:
+        future = _DEPT_EXEC.submit(fn, *args)
+    except BaseException:
+        _DEPT_SLOTS.release()
+        raise
+    future.add_done_callback(lambda _f: _DEPT_SLOTS.release())
+    return future
+
+
 def _fetch_depts_collect(dept_ids, token, sequential=False):
-    """Fetch several departments and collect (all_formatted, dept_meta).
+    """Fetch several departments and collect (dept_lists, dept_meta).
+
+    dept_lists holds one formatted student list per department that
+    fetched successfully, each already sorted by student_sort_key (see
+    _merge_dept_lists).
 
     Per-dept exceptions are swallowed into dept_meta entries with
     status='error' so callers can scan for specific failures (e.g. an
@@ -258,10 +837,10 @@ def _fetch_depts_collect(dept_ids, token, sequential=False):
     hit stale nodes and 401. Sequential retry lets each dept complete
     fully before the next starts.
     """
-    all_formatted = []
+    dept_lists = []
     dept_meta = []
     if not dept_ids:
-        return all_formatted, dept_meta
+        return dept_lists, dept_meta
 
     # Sequential mode OR single dept — same simple loop
     if sequential or len(dept_ids) == 1:
@@ -269,33 +848,107 @@ def _fetch_depts_collect(dept_ids, token, sequential=False):
             try:
                 meta, students = _fetch_dept_students(dept_id, token)
                 dept_meta.append(meta)
-                all_formatted.extend(students)
+                dept_lists.append(students)
             except Exception as e:
                 print(f"[FETCH] Error fetching {dept_id}: {e}")
                 dept_meta.append({
                     'id': dept_id, 'name': None, 'studentCount': 0,
                     'status': 'error', 'error': str(e),
                 })
-        return all_formatted, dept_meta
+        _apply_dept_names(dept_lists, dept_meta, token)
+        return dept_lists, dept_meta
 
-    with ThreadPoolExecutor(max_workers=min(10, len(dept_ids))) as executor:
-        future_to_dept = {
-            executor.submit(_fetch_dept_students, dept_id, token): dept_id
-            for dept_id in dept_ids
-        }
-        for future in as_completed(future_to_dept):
-            dept_id = future_to_dept[future]
-            try:
-                meta, students = future.result()
-                dept_meta.append(meta)
-                all_formatted.extend(students)
-            except Exception as e:
-                print(f"[FETCH] Error fetching {dept_id}: {e}")
-                dept_meta.append({
-                    'id': dept_id, 'name': None, 'studentCount': 0,
-                    'status': 'error', 'error': str(e),
-                })
-    return all_formatted, dept_meta
+    _prefetch_student_entries(dept_ids, token)
+    future_to_dept = {
+        _submit_dept_task(_fetch_dept_students, dept_id, token): dept_id
+        for dept_id in dept_ids
+    }
+    for future in as_completed(future_to_dept):
+        dept_id = future_to_dept[future]
+        try:
+            meta, students = future.result()
+            dept_meta.append(meta)
+            dept_lists.append(students)
+        except Exception as e:
+            print(f"[FETCH] Error fetching {dept_id}: {e}")
+            dept_meta.append({
+                'id': dept_id, 'name': None, 'studentCount': 0,
+                'status': 'error', 'error': str(e),
+            })
+    _apply_dept_names(dept_lists, dept_meta, token)
+    if any(m.get('stale') for m in dept_meta):
+        _note_stale_served()
+    return dept_lists, dept_meta
+
+
+def _prefetch_student_entries(dept_ids, token):
+    """Fill cache misses for several departments from one batched fetch.
+
+    Uses one /users query for all the departments that need fetching,
+    instead of one per department. Any department this doesn't fill
+    (batch unavailable, too many users for one page, errors) is fetched
+    by the usual per-department path afterwards.
+    """
+    now = datetime.utcnow()
+    ttl = timedelta(minutes=CACHE_TTL_MINUTES)
+    missing = []
+    for dept_id in dept_ids:
+        if is_demo_dept(dept_id):
+            continue
+        entry = _student_cache.get(dept_id)
+        if not entry or now - entry['timestamp'] >= ttl:
+            missing.append(dept_id)
+    if len(missing) < 2:
+        return
+
+    try:
+        students_by_dept = _get_absorb_client(token).get_students_with_progress_multi(missing)
+    except Exception as e:
+        print(f"[FETCH] Batched fetch failed, fetching per department: {e}")
+        return
+    if students_by_dept is None:
+        return
+
+    for dept_id, students in students_by_dept.items():
+        with _dept_fetch_lock(dept_id):
+            entry = _student_cache.get(dept_id)
+            if entry and entry['timestamp'] >= now:
+                continue  # Filled by another request meanwhile
+            _store_student_entry(dept_id, students, now)
+            _upstream_failed_at.pop(dept_id, None)
+    print(f"[CACHE] Batched fetch filled {len(students_by_dept)} departments")
+
+
+def _merge_dept_lists(dept_lists):
+    """Merge per-department student lists into one sorted list.
+
+    Each list comes from the student cache already sorted by
+    student_sort_key, so a k-way heapq.merge replaces re-sorting the
+    concatenation. Ties keep dept_lists order, like the stable sort did.
+
+    The merge runs over (sort_key, list_index, position, student) tuples
+    using the keys stored with each cache entry, so no student_sort_key
+    call (two nested dict lookups each) happens per request. Tuples
+    compare natively in C and never reach the student dict.
+    """
+    if not dept_lists:
+        return []
+    if len(dept_lists) == 1:
+        # Single department (the common case): already sorted, nothing to
+        # merge. Callers only read the result, so no copy is needed.
+        return dept_lists[0]
+    cached_keys = {
+        id(entry['formatted']): entry['sort_keys']
+        for entry in list(_student_cache.values())
+        if 'sort_keys' in entry
+    }
+    decorated = []
+    for i, students in enumerate(dept_lists):
+        keys = cached_keys.get(id(students))
+        if keys is None:
+            keys = map(student_sort_key, students)
+        decorated.append(zip(keys, repeat(i), count(), students))
+    return [item[3] for item in heapq.merge(*decorated)]
 
 
 def _expired_dept_ids(dept_meta):
@@ -335,56 +988,67 @@ def _get_cached_students_with_retry(dept_id):
 
 def get_quick_students(department_id, token):
     """Get basic student data quickly without enrollments."""
-    # Check cache first
-    if department_id in _student_cache:
-        cache_entry = _student_cache[department_id]
-        cache_age = datetime.utcnow() - cache_entry['timestamp']
-        if cache_age < timedelta(minutes=CACHE_TTL_MINUTES):
-            return cache_entry['formatted']
-
-    # Get basic data only (fast)
-    client = AbsorbAPIClient()
-    client.set_token(token)
-    students = client.get_students_basic(department_id)
-
-    # Format students
-    formatted = [format_student_for_response(student) for student in students]
-    formatted.sort(key=lambda s: (s['status']['priority'], -s['progress']['value']), reverse=False)
+    now = datetime.utcnow()
+    ttl = timedelta(minutes=CACHE_TTL_MINUTES)
+
+    # A fresh full entry is a superset of the basic data, so prefer it
+    cache_entry = _student_cache.get(department_id)
+    if cache_entry and now - cache_entry['timestamp'] < ttl:
+        return cache_entry['formatted']
+
+    quick_entry = _quick_student_cache.get(department_id)
+    if quick_entry and now - quick_entry['timestamp'] < ttl:
+        return quick_entry['formatted']
+
+    # Single-flight like get_cached_students, on a separate lock so a quick
+    # load never queues behind a slow full fetch for the same department
+    with _dept_fetch_lock(('quick', department_id)):
+        now = datetime.utcnow()
+        for cache in (_student_cache, _quick_student_cache):
+            entry = cache.get(department_id)
+            if entry and now - entry['timestamp'] < ttl:
+                return entry['formatted']
+
+        # Get basic data only (fast)
+        client = _get_absorb_client(token)
+        students = client.get_students_basic(department_id)
+
+        # Format students
+        formatted = [format_student_for_response(student) for student in students]
+        formatted.sort(key=student_sort_key)
+
+        # Kept apart from _student_cache so basic data is never served as full
+        set_bounded(_quick_student_cache, department_id, {
+            'formatted': formatted,
+            'summary': _compute_summary(formatted),
+            'timestamp': now,
+        }, STUDENT_CACHE_MAX_DEPTS)
     return formatted
 
 
 @dashboard_bp.route('/summary/quick', methods=['GET'])
 @login_required
+@student_etag
+@json_errors('Failed to fetch dashboard summary', detail=True)
 def get_summary_quick():
     """
     Get quick summary (just student count and status from basic data).
     """
-    try:
-        formatted_students = get_quick_students(g.department_id, g.absorb_token)
-        total = len(formatted_students)
-        complete = sum(1 for s in formatted_students if s['status']['status'] == 'COMPLETE')
-        active = sum(1 for s in formatted_students if s['status']['status'] == 'ACTIVE')
-        warning = sum(1 for s in formatted_students if s['status']['status'] == 'WARNING')
-        reengage = sum(1 for s in formatted_students if s['status']['status'] == 'RE-ENGAGE')
-
-        return jsonify({
-            'success': True,
-            'summary': {
-                'totalStudents': total,
-                'completeCount': complete,
-                'activeCount': active,
-                'warningCount': warning,
-                'reengageCount': reengage,
-                'averageProgress': 0  # Will be updated with full load
-            },
-            'quick': True
-        })
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+    formatted_students = get_quick_students(g.department_id, g.absorb_token)
+    summary = dict(get_cached_summary(g.department_id, formatted_students))
+    summary['averageProgress'] = 0  # Will be updated with full load
+
+    return ojsonify({
+        'success': True,
+        'summary': summary,
+        'quick': True
+    })
 
 
 @dashboard_bp.route('/summary', methods=['GET'])
 @login_required
+@student_etag
+@json_errors('Failed to fetch dashboard summary')
 def get_summary():
     """
     Get dashboard summary with KPI data (uses cache).
@@ -392,73 +1056,38 @@ def get_summary():
     Returns:
         JSON response with summary statistics
     """
-    try:
-        # Get students from cache (formatted students have correct COMPLETE status)
-        students, formatted_students = _get_cached_students_with_retry(g.department_id)
-
-        # Calculate KPIs from formatted students (which have progress-aware status)
-        total_students = len(formatted_students)
-        complete_count = sum(1 for s in formatted_students if s['status']['status'] == 'COMPLETE')
-        active_count = sum(1 for s in formatted_students if s['status']['status'] == 'ACTIVE')
-        warning_count = sum(1 for s in formatted_students if s['status']['status'] == 'WARNING')
-        reengage_count = sum(1 for s in formatted_students if s['status']['status'] == 'RE-ENGAGE')
-        total_progress = sum(s['progress']['value'] for s in formatted_students)
-
-        avg_progress = round(total_progress / total_students, 1) if total_students > 0 else 0
-
-        return jsonify({
-            'success': True,
-            'summary': {
-                'totalStudents': total_students,
-                'completeCount': complete_count,
-                'activeCount': active_count,
-                'warningCount': warning_count,
-                'reengageCount': reengage_count,
-                'averageProgress': avg_progress
-            }
-        })
-
-    except AbsorbAPIError as e:
-        return jsonify({
-            'success': False,
-            'error': str(e.message)
-        }), e.status_code or 500
+    # Get students from cache (formatted students have correct COMPLETE status)
+    _, formatted_students = _get_cached_students_with_retry(g.department_id)
 
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': 'Failed to fetch dashboard summary'
-        }), 500
+    # KPIs were computed from the formatted students (which have
+    # progress-aware status) when the cache entry was filled
+    return ojsonify({
+        'success': True,
+        'summary': get_cached_summary(g.department_id, formatted_students)
+    })
 
 
 @dashboard_bp.route('/students/quick', methods=['GET'])
 @login_required
+@student_etag
+@json_errors('Failed to fetch students', detail=True)
 def get_students_quick():
     """
     Get students quickly without enrollment data (fast initial load).
     """
-    try:
-        formatted_students = get_quick_students(g.department_id, g.absorb_token)
-        return jsonify({
-            'success': True,
-            'students': formatted_students,
-            'count': len(formatted_students),
-            'quick': True
-        })
-    except AbsorbAPIError as e:
-        return jsonify({
-            'success': False,
-            'error': str(e.message)
-        }), e.status_code or 500
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': f'Failed to fetch students: {str(e)}'
-        }), 500
+    formatted_students = get_quick_students(g.department_id, g.absorb_token)
+    return ojsonify({
+        'success': True,
+        'students': formatted_students,
+        'count': len(formatted_students),
+        'quick': True
+    })
 
 
 @dashboard_bp.route('/students', methods=['GET'])
 @login_required
+@student_etag
+@json_errors('Failed to fetch students', detail=True)
 def get_students():
     """
     Get all students in the department with progress data (uses cache).
@@ -466,305 +1095,333 @@ def get_students():
     Returns:
         JSON response with formatted student list
     """
-    try:
-        # Get students from cache
-        _, formatted_students = _get_cached_students_with_retry(g.department_id)
+    # Get students from cache
+    _, formatted_students = _get_cached_students_with_retry(g.department_id)
 
-        return jsonify({
-            'success': True,
-            'students': formatted_students,
-            'count': len(formatted_students)
-        })
+    return ojsonify({
+        'success': True,
+        'students': formatted_students,
+        'count': len(formatted_students)
+    })
 
-    except AbsorbAPIError as e:
-        return jsonify({
-            'success': False,
-            'error': str(e.message)
-        }), e.status_code or 500
 
-    except Exception as e:
-        import traceback
-        print(f"[ERROR] Students fetch failed: {e}")
-        traceback.print_exc()
-        return jsonify({
-            'success': False,
-            'error': f'Failed to fetch students: {str(e)}'
-        }), 500
-
-
-GUID_RE = re.compile(r'^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$')
+# Matched with fullmatch(): '$' would also accept a trailing newline.
+GUID_RE = re.compile(r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}')
 MAX_EXTRA_DEPTS = 30
 
 
-def _compute_summary(formatted_students):
-    """Calculate KPI summary dict from a list of formatted students."""
-    total = len(formatted_students)
-    complete = sum(1 for s in formatted_students if s['status']['status'] == 'COMPLETE')
-    active = sum(1 for s in formatted_students if s['status']['status'] == 'ACTIVE')
-    warning = sum(1 for s in formatted_students if s['status']['status'] == 'WARNING')
-    reengage = sum(1 for s in formatted_students if s['status']['status'] == 'RE-ENGAGE')
-    total_progress = sum(s['progress']['value'] for s in formatted_students)
-    avg_progress = round(total_progress / total, 1) if total > 0 else 0
-
-    return {
-        'totalStudents': total,
-        'completeCount': complete,
-        'activeCount': active,
-        'warningCount': warning,
-        'reengageCount': reengage,
-        'averageProgress': avg_progress,
-    }
+def split_extra_dept_ids(candidates):
+    """Validate extra department IDs against the user's own department.
 
+    Caps at MAX_EXTRA_DEPTS and returns (valid_ids, invalid_ids). GUIDs are
+    compared case-insensitively, so the user's own department and repeats
+    of the same GUID in different case are dropped instead of being fetched
+    (and merged) twice. Valid IDs keep the caller's original spelling.
+    """
+    seen = {(g.department_id or '').lower()}
+    valid_ids = []
+    invalid_ids = []
+    for d in candidates[:MAX_EXTRA_DEPTS]:
+        if not isinstance(d, str):
+            continue
+        d = d.strip()
+        if not d:
+            continue
+        if not GUID_RE.fullmatch(d):
+            invalid_ids.append(d)
+            continue
+        key = d.lower()
+        if key not in seen:
+            seen.add(key)
+            valid_ids.append(d)
+    return valid_ids, invalid_ids
 
-def _fetch_dept_students(dept_id, token):
-    """Fetch and annotate students for a single department. Returns (dept_meta, formatted_list)."""
-    client = AbsorbAPIClient()
-    client.set_token(token)
 
-    raw, formatted = get_cached_students(dept_id, token)
+def _record_dept_name(raw):
+    """Department name carried on the raw Absorb user records, or ''.
 
-    # Prefer the departmentName already present on the raw Absorb user records
-    # (the /Departments/{id} endpoint is unreliable for depts the current token
-    # has limited access to, but the OData /users filter returns departmentName
-    # on each user). Falls back to the legacy endpoint only if no student carried
-    # a name.
-    dept_name = ''
+    Preferred over the /Departments/{id} endpoint, which is unreliable for
+    depts the current token has limited access to; the OData /users filter
+    returns departmentName on each user.
+    """
     for u in raw or []:
         n = (u.get('departmentName') or '').strip()
         if n:
-            dept_name = n
-            break
-    if not dept_name:
-        dept_name = get_department_name(client, dept_id)
+            return n
+    return ''
 
-    # Inject departmentName into each student
-    for s in formatted:
-        s['departmentName'] = dept_name
 
-    return {
+def _fill_missing_dept_names(dept_ids, token):
+    """Resolve names for departments whose records carried none.
+
+    Goes through get_department_names so several misses cost one bulk
+    Absorb call rather than one request per department.
+    """
+    if not dept_ids:
+        return {}
+    return get_department_names(_get_absorb_client(token), dept_ids)
+
+
+def _fetch_dept_students(dept_id, token):
+    """Fetch students for a single department. Returns (dept_meta, formatted_list).
+
+    dept_meta['name'] comes from the student records and is '' when none
+    carried one; _fetch_depts_collect fills those in a single batch.
+    """
+    raw, formatted = get_cached_students(dept_id, token)
+
+    meta = {
         'id': dept_id,
-        'name': dept_name,
+        'name': _record_dept_name(raw),
         'studentCount': len(formatted),
         'status': 'ok',
-    }, formatted
+    }
+    entry = _student_cache.get(dept_id)
+    if entry and entry['formatted'] is formatted:
+        stale_after = timedelta(minutes=CACHE_TTL_MINUTES * STALE_TTL_MULTIPLIER)
+        if datetime.utcnow() - entry['timestamp'] >= stale_after:
+            meta['stale'] = True
+    return meta, formatted
+
+
+def _apply_dept_names(dept_lists, dept_meta, token):
+    """Fill in department names that the student records didn't carry."""
+    fetched = [m for m in dept_meta if m.get('status') == 'ok']
+    missing = [m['id'] for m in fetched if not m.get('name')]
+    names = _fill_missing_dept_names(missing, token)
+    for meta, students in zip(fetched, dept_lists):
+        if meta.get('name'):
+            # Already stamped on the cached students at fill time
+            continue
+        meta['name'] = dept_name = names.get(meta['id'], 'Unknown')
+        # Records carried no name: stamp the looked-up one onto the cached
+        # list once (the value is the same for every request on this entry)
+        if students and students[0].get('departmentName') != dept_name:
+            for s in students:
+                s['departmentName'] = dept_name
 
 
 @dashboard_bp.route('/students/multi', methods=['GET'])
 @login_required
+@student_etag
+@json_errors('Failed to fetch students', detail=True)
 def get_students_multi():
     """Get students from multiple departments, merged into one list."""
-    try:
-        extra_param = request.args.get('departments', '')
-        extra_ids = [d.strip() for d in extra_param.split(',') if d.strip()] if extra_param else []
-
-        # Validate GUIDs and cap at MAX_EXTRA_DEPTS
-        valid_ids = []
-        dept_meta = []
-        for d in extra_ids[:MAX_EXTRA_DEPTS]:
-            if GUID_RE.match(d):
-                if d.lower() != (g.department_id or '').lower():
-                    valid_ids.append(d)
-            else:
-                dept_meta.append({'id': d, 'name': None, 'studentCount': 0, 'status': 'error', 'error': 'Invalid GUID format'})
-
-        # Always include user's own department
-        all_dept_ids = [g.department_id] + valid_ids
-
-        # Fetch all departments in parallel. The refresh path inside
-        # _fetch_depts_collect is now guarded by an in-process threading
-        # lock + cross-process fcntl file lock (see _refresh_user_absorb_token)
-        # so concurrent re-auths from parallel requests can't clobber each
-        # other's tokens. The previous warmup-probe approach was removed —
-        # it was a second refresh source that caused the clobber race.
-        all_formatted, fetched_meta = _fetch_depts_collect(all_dept_ids, g.absorb_token)
-        dept_meta.extend(fetched_meta)
-
-        expired_ids = _expired_dept_ids(dept_meta)
-        if expired_ids and _refresh_user_absorb_token():
-            print(f"[MULTI-DEPT] Retrying {len(expired_ids)} dept(s) after token refresh")
-            for dept_id in expired_ids:
-                invalidate_cache(dept_id)
-            dept_meta = [m for m in dept_meta if m.get('id') not in expired_ids]
-            retry_formatted, retry_meta = _fetch_depts_collect(expired_ids, g.absorb_token, sequential=True)
-            all_formatted.extend(retry_formatted)
-            dept_meta.extend(retry_meta)
-
-        # Sort merged list
-        all_formatted.sort(
-            key=lambda s: (s['status']['priority'], -s['progress']['value']),
-            reverse=False
-        )
-
-        return jsonify({
-            'success': True,
-            'students': all_formatted,
-            'count': len(all_formatted),
-            'summary': _compute_summary(all_formatted),
-            'departments': dept_meta,
-        })
+    extra_param = request.args.get('departments', '')
+    extra_ids = [d.strip() for d in extra_param.split(',') if d.strip()] if extra_param else []
+
+    # Validate GUIDs and cap at MAX_EXTRA_DEPTS
+    valid_ids, invalid_ids = split_extra_dept_ids(extra_ids)
+    dept_meta = [
+        {'id': d, 'name': None, 'studentCount': 0, 'status': 'error', 'error': 'Invalid GUID format'}
+        for d in invalid_ids
+    ]
+
+    # Always include user's own department
+    all_dept_ids = [g.department_id] + valid_ids
+
+    # Fetch all departments in parallel. The refresh path inside
+    # _fetch_depts_collect is now guarded by an in-process threading
+    # lock + cross-process fcntl file lock (see _refresh_user_absorb_token)
+    # so concurrent re-auths from parallel requests can't clobber each
+    # other's tokens. The previous warmup-probe approach was removed —
+    # it was a second refresh source that caused the clobber race.
+    dept_lists, fetched_meta = _fetch_depts_collect(all_dept_ids, g.absorb_token)
+    dept_meta.extend(fetched_meta)
+
+    expired_ids = _expired_dept_ids(dept_meta)
+    if expired_ids and _refresh_user_absorb_token():
+        print(f"[MULTI-DEPT] Retrying {len(expired_ids)} dept(s) after token refresh")
+        for dept_id in expired_ids:
+            invalidate_cache(dept_id)
+        dept_meta = [m for m in dept_meta if m.get('id') not in expired_ids]
+        retry_lists, retry_meta = _fetch_depts_collect(expired_ids, g.absorb_token, sequential=True)
+        dept_lists.extend(retry_lists)
+        dept_meta.extend(retry_meta)
 
-    except AbsorbAPIError as e:
-        return jsonify({'success': False, 'error': str(e.message)}), e.status_code or 500
-    except Exception as e:
-        import traceback
-        print(f"[ERROR] Multi-dept fetch failed: {e}")
-        traceback.print_exc()
-        return jsonify({'success': False, 'error': f'Failed to fetch students: {str(e)}'}), 500
+    # Merge the per-dept lists (each already sorted)
+    all_formatted = _merge_dept_lists(dept_lists)
+
+    return ojsonify({
+        'success': True,
+        'students': all_formatted,
+        'count': len(all_formatted),
+        'summary': _merged_summary(dept_lists),
+        'departments': dept_meta,
+    })
 
 
 @dashboard_bp.route('/sync', methods=['POST'])
 @login_required
+@json_errors('Failed to sync data', detail=True)
 def sync_data():
     """
     Force sync/refresh data from Absorb LMS (clears cache).
     Accepts optional extraDepartments list in JSON body for multi-dept sync.
     """
-    try:
-        # Demo mode: static data, no sync needed
-        if is_demo_dept(g.department_id):
-            cached = get_cached_demo_students()
-            formatted = [format_student_for_response(s) for s in cached]
-            formatted.sort(key=lambda s: (s['status']['priority'], -s['progress']['value']))
-            return jsonify({
-                'success': True,
-                'message': 'Demo mode - data is static',
-                'summary': _compute_summary(formatted),
-                'students': formatted,
-                'departments': [{'id': DEMO_DEPT_ID, 'name': DEMO_DEPT_NAME,
-                                 'studentCount': len(formatted), 'status': 'ok'}],
-                'syncedAt': datetime.utcnow().isoformat()
-            })
+    # Demo mode: static data, no sync needed
+    if is_demo_dept(g.department_id):
+        demo = _get_demo_formatted()
+        formatted = demo['formatted']
+        return ojsonify({
+            'success': True,
+            'message': 'Demo mode - data is static',
+            'summary': demo['summary'],
+            'students': formatted,
+            'departments': [{'id': DEMO_DEPT_ID, 'name': DEMO_DEPT_NAME,
+                             'studentCount': len(formatted), 'status': 'ok'}],
+            'syncedAt': datetime.utcnow().isoformat()
+        })
 
-        data = request.get_json(silent=True) or {}
-        extra_dept_ids = data.get('extraDepartments', [])
+    # Body is read once here; no need for Flask to keep the parsed copy
+    data = request.get_json(silent=True, cache=False) or {}
+    extra_dept_ids = data.get('extraDepartments', [])
 
-        # Build list of all dept IDs to sync
-        all_dept_ids = [g.department_id]
-        for d in extra_dept_ids[:MAX_EXTRA_DEPTS]:
-            if isinstance(d, str) and GUID_RE.match(d) and d.lower() != (g.department_id or '').lower():
-                all_dept_ids.append(d)
+    # Build list of all dept IDs to sync
+    valid_ids, _ = split_extra_dept_ids(extra_dept_ids)
+    all_dept_ids = [g.department_id] + valid_ids
 
-        dept_name = g.user.get('departmentName', 'Unknown')
-        print(f"[SYNC] Starting sync for {len(all_dept_ids)} department(s): {dept_name} ({g.department_id})")
+    dept_name = g.user.get('departmentName', 'Unknown')
+    print(f"[SYNC] Starting sync for {len(all_dept_ids)} department(s): {dept_name} ({g.department_id})")
 
-        # Invalidate student caches (not exam cache - that's separate data)
-        for dept_id in all_dept_ids:
+    # Invalidate student caches (not exam cache - that's separate data)
+    for dept_id in all_dept_ids:
+        invalidate_cache(dept_id)
+
+    # Fetch all departments (parallel if multiple). Uses a helper so we
+    # can cheaply retry only the departments that hit an Absorb 401
+    # after transparently refreshing the user's token.
+    dept_lists, dept_meta = _fetch_depts_collect(all_dept_ids, g.absorb_token)
+
+    expired_ids = _expired_dept_ids(dept_meta)
+    if expired_ids and _refresh_user_absorb_token():
+        print(f"[SYNC] Retrying {len(expired_ids)} dept(s) after token refresh")
+        # Invalidate any caches touched by the failed attempts
+        for dept_id in expired_ids:
             invalidate_cache(dept_id)
+        # Drop the expired error entries, keep successful ones
+        dept_meta = [m for m in dept_meta if m.get('id') not in expired_ids]
+        retry_lists, retry_meta = _fetch_depts_collect(expired_ids, g.absorb_token, sequential=True)
+        dept_lists.extend(retry_lists)
+        dept_meta.extend(retry_meta)
 
-        # Fetch all departments (parallel if multiple). Uses a helper so we
-        # can cheaply retry only the departments that hit an Absorb 401
-        # after transparently refreshing the user's token.
-        all_formatted, dept_meta = _fetch_depts_collect(all_dept_ids, g.absorb_token)
-
-        expired_ids = _expired_dept_ids(dept_meta)
-        if expired_ids and _refresh_user_absorb_token():
-            print(f"[SYNC] Retrying {len(expired_ids)} dept(s) after token refresh")
-            # Invalidate any caches touched by the failed attempts
-            for dept_id in expired_ids:
-                invalidate_cache(dept_id)
-            # Drop the expired error entries, keep successful ones
-            dept_meta = [m for m in dept_meta if m.get('id') not in expired_ids]
-            retry_formatted, retry_meta = _fetch_depts_collect(expired_ids, g.absorb_token, sequential=True)
-            all_formatted.extend(retry_formatted)
-            dept_meta.extend(retry_meta)
-
-        # Sort
-        all_formatted.sort(
-            key=lambda s: (s['status']['priority'], -s['progress']['value']),
-            reverse=False
-        )
-
-        print(f"[SYNC] Got {len(all_formatted)} students across {len(all_dept_ids)} departments")
-
-        return jsonify({
-            'success': True,
-            'message': 'Data synced successfully',
-            'summary': _compute_summary(all_formatted),
-            'students': all_formatted,
-            'departments': dept_meta,
-            'syncedAt': g.user.get('loginTime')
-        })
+    # Merge the per-dept lists (each already sorted)
+    all_formatted = _merge_dept_lists(dept_lists)
 
-    except AbsorbAPIError as e:
-        return jsonify({'success': False, 'error': str(e.message)}), e.status_code or 500
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        return jsonify({'success': False, 'error': f'Failed to sync data: {str(e)}'}), 500
+    print(f"[SYNC] Got {len(all_formatted)} students across {len(all_dept_ids)} departments")
+
+    return ojsonify({
+        'success': True,
+        'message': 'Data synced successfully',
+        'summary': _merged_summary(dept_lists),
+        'students': all_formatted,
+        'departments': dept_meta,
+        'syncedAt': g.user.get('loginTime')
+    })
+
+
+# CSV export rows written per streamed chunk
+EXPORT_ROWS_PER_CHUNK = 500
+
+# Formatted statuses that override the login-recency status
+_NON_LOGIN_STATUSES = frozenset(('COMPLETE', 'COURSE EXPIRED'))
 
 
 @dashboard_bp.route('/export', methods=['GET'])
 @login_required
+@json_errors('Failed to export data')
 def export_data():
     """
     Export student data as CSV.
     Accepts optional departments query param for multi-dept export.
     """
-    from flask import Response
-    import csv
-    from io import StringIO
+    extra_param = request.args.get('departments', '')
+    # split_extra_dept_ids strips, validates and dedupes in one pass
+    valid_ids, _ = split_extra_dept_ids(extra_param.split(',')) if extra_param else ([], [])
+    multi_dept = len(valid_ids) > 0
+
+    # Build dept list
+    all_dept_ids = [g.department_id] + valid_ids
+    if multi_dept:
+        _prefetch_student_entries(all_dept_ids, g.absorb_token)
+
+    # Gather all students. The export's Status column is login-recency
+    # only; the cached formatted status already holds that for everyone
+    # except COMPLETE / COURSE EXPIRED students, so reuse it by id
+    # rather than re-parsing every lastLoginDate.
+    login_status_by_id = {}
+    dept_raws = []
+    for dept_id in all_dept_ids:
+        raw, formatted = get_cached_students(dept_id, g.absorb_token)
+        for s in formatted:
+            status = s['status']['status']
+            if s.get('id') and status not in _NON_LOGIN_STATUSES:
+                login_status_by_id[s['id']] = status
+        dept_raws.append((dept_id, raw))
+
+    dept_names = {}
+    if multi_dept:
+        dept_names = {dept_id: _record_dept_name(raw) for dept_id, raw in dept_raws}
+        missing = [dept_id for dept_id, name in dept_names.items() if not name]
+        dept_names.update(_fill_missing_dept_names(missing, g.absorb_token))
+
+    headers = ['First Name', 'Last Name', 'Email', 'Status', 'Last Login', 'Course', 'Progress (%)', 'Time Spent (minutes)']
+    if multi_dept:
+        headers.insert(0, 'Department')
+
+    def generate():
+        # Stream the CSV through a small reused buffer instead of
+        # building the whole file in memory first. Rows are flushed in
+        # batches of EXPORT_ROWS_PER_CHUNK so the response isn't split
+        # into one tiny chunk per student. The cached raw records are
+        # read department by department and never modified.
+        buf = StringIO()
+        writer = csv.writer(buf)
+
+        def flush():
+            line = buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+            return line
 
-    try:
-        extra_param = request.args.get('departments', '')
-        extra_ids = [d.strip() for d in extra_param.split(',') if d.strip() and GUID_RE.match(d.strip())] if extra_param else []
-        multi_dept = len(extra_ids) > 0
-
-        # Build dept list
-        all_dept_ids = [g.department_id]
-        for d in extra_ids[:MAX_EXTRA_DEPTS]:
-            if d.lower() != (g.department_id or '').lower():
-                all_dept_ids.append(d)
-
-        client = AbsorbAPIClient()
-        client.set_token(g.absorb_token)
-
-        # Gather all students
-        all_students = []
-        for dept_id in all_dept_ids:
-            raw, _ = get_cached_students(dept_id, g.absorb_token)
-            dept_name = get_department_name(client, dept_id) if multi_dept else ''
-            for student in raw:
-                student['_dept_name'] = dept_name
-            all_students.extend(raw)
-
-        # Create CSV
-        output = StringIO()
-        writer = csv.writer(output)
-
-        headers = ['First Name', 'Last Name', 'Email', 'Status', 'Last Login', 'Course', 'Progress (%)', 'Time Spent (minutes)']
-        if multi_dept:
-            headers.insert(0, 'Department')
         writer.writerow(headers)
+        yield flush()
 
-        for student in all_students:
-            status = get_status_from_last_login(student.get('lastLoginDate'))
-            row = [
-                student.get('firstName', ''),
-                student.get('lastName', ''),
-                student.get('emailAddress', ''),
-                status['status'],
-                student.get('lastLoginDate', 'Never'),
-                student.get('courseName', 'No Course'),
-                round(student.get('progress', 0), 1),
-                student.get('timeSpent', 0)
-            ]
-            if multi_dept:
-                row.insert(0, student.get('_dept_name', ''))
-            writer.writerow(row)
-
-        output.seek(0)
-        return Response(
-            output.getvalue(),
-            mimetype='text/csv',
-            headers={
-                'Content-Disposition': f'attachment; filename=students_export_{g.department_id[:8]}.csv'
-            }
-        )
-
-    except AbsorbAPIError as e:
-        return jsonify({'success': False, 'error': str(e.message)}), e.status_code or 500
-    except Exception as e:
-        return jsonify({'success': False, 'error': 'Failed to export data'}), 500
+        pending = 0
+        for dept_id, raw in dept_raws:
+            dept_name = dept_names.get(dept_id, '')
+            for student in raw:
+                status = login_status_by_id.get(student.get('id'))
+                if status is None:
+                    status = get_status_from_last_login(student.get('lastLoginDate'))['status']
+                row = [
+                    student.get('firstName', ''),
+                    student.get('lastName', ''),
+                    student.get('emailAddress', ''),
+                    status,
+                    student.get('lastLoginDate', 'Never'),
+                    student.get('courseName', 'No Course'),
+                    round(student.get('progress', 0), 1),
+                    student.get('timeSpent', 0)
+                ]
+                if multi_dept:
+                    row.insert(0, dept_name)
+                writer.writerow(row)
+                pending += 1
+                if pending >= EXPORT_ROWS_PER_CHUNK:
+                    pending = 0
+                    yield flush()
+
+        if pending:
+            yield flush()
+
+    return Response(
+        generate(),
+        mimetype='text/csv',
+        headers={
+            'Content-Disposition': f'attachment; filename=students_export_{g.department_id[:8]}.csv'
+        }
+    )
 
 
 # ── User Department Preferences ──────────────────────────────────────
@@ -775,9 +1432,9 @@ def get_dept_prefs():
     """Get the logged-in user's saved extra departments."""
     email = (g.user.get('email') or g.user.get('emailAddress') or '').lower().strip()
     if not email:
-        return jsonify({'success': False, 'error': 'No user email in session'}), 401
+        return ojsonify({'success': False, 'error': 'No user email in session'}), 401
     dept_ids = get_user_dept_prefs(email)
-    return jsonify({'success': True, 'departmentIds': dept_ids})
+    return ojsonify({'success': True, 'departmentIds': dept_ids})
 
 
 @dashboard_bp.route('/dept-prefs', methods=['POST'])
@@ -786,12 +1443,12 @@ def save_dept_prefs():
     """Save the logged-in user's extra departments."""
     email = (g.user.get('email') or g.user.get('emailAddress') or '').lower().strip()
     if not email:
-        return jsonify({'success': False, 'error': 'No user email in session'}), 401
+        return ojsonify({'success': False, 'error': 'No user email in session'}), 401
     data = request.get_json() or {}
     dept_ids = data.get('departmentIds', [])
-    valid = [d for d in dept_ids[:MAX_EXTRA_DEPTS] if isinstance(d, str) and GUID_RE.match(d)]
+    valid = [d for d in dept_ids[:MAX_EXTRA_DEPTS] if isinstance(d, str) and GUID_RE.fullmatch(d)]
     save_user_dept_prefs(email, valid)
-    return jsonify({'success': True, 'departmentIds': valid})
+    return ojsonify({'success': True, 'departmentIds': valid})
 
 
 # ── User Hidden Students ─────────────────────────────────────────────
@@ -802,9 +1459,9 @@ def get_hidden_students():
     """Get the logged-in user's hidden student emails."""
     email = (g.user.get('email') or g.user.get('emailAddress') or '').lower().strip()
     if not email:
-        return jsonify({'success': False, 'error': 'No user email in session'}), 401
+        return ojsonify({'success': False, 'error': 'No user email in session'}), 401
     hidden = get_user_hidden_students(email)
-    return jsonify({'success': True, 'hiddenEmails': hidden})
+    return ojsonify({'success': True, 'hiddenEmails': hidden})
 
 
 @dashboard_bp.route('/hidden-students', methods=['POST'])
@@ -813,12 +1470,12 @@ def save_hidden_students():
     """Save the logged-in user's hidden student emails."""
     email = (g.user.get('email') or g.user.get('emailAddress') or '').lower().strip()
     if not email:
-        return jsonify({'success': False, 'error': 'No user email in session'}), 401
+        return ojsonify({'success': False, 'error': 'No user email in session'}), 401
     data = request.get_json() or {}
     hidden = data.get('hiddenEmails', [])
     valid = [e for e in hidden[:200] if isinstance(e, str) and e.strip()]
     save_user_hidden_students(email, valid)
-    return jsonify({'success': True, 'hiddenEmails': valid})
+    return ojsonify({'success': True, 'hiddenEmails': valid})
 
 
 # ── User GHL Settings ────────────────────────────────────────────────
@@ -829,7 +1486,7 @@ def get_ghl_settings():
     """Get the logged-in user's GHL integration settings (token masked)."""
     email = (g.user.get('email') or g.user.get('emailAddress') or '').lower().strip()
     settings = get_user_ghl_settings_masked(email)
-    return jsonify({'success': True, **settings})
+    return ojsonify({'success': True, **settings})
 
 
 @dashboard_bp.route('/ghl-settings', methods=['POST'])
@@ -861,7 +1518,7 @@ def save_ghl_settings():
     invalidate_ghl_cache(email)
 
     settings = get_user_ghl_settings_masked(email)
-    return jsonify({'success': True, **settings})
+    return ojsonify({'success': True, **settings})
 
 
 @dashboard_bp.route('/ghl-calendars', methods=['GET'])
@@ -873,19 +1530,19 @@ def get_ghl_calendars():
     location_id = request.args.get('location_id', '').strip()
 
     if not token or not location_id:
-        return jsonify({'success': False, 'error': 'Token and Location ID are required'}), 400
+        return ojsonify({'success': False, 'error': 'Token and Location ID are required'}), 400
 
     try:
         from ghl_api import fetch_ghl_calendars
         calendars = fetch_ghl_calendars(token, location_id)
-        return jsonify({'success': True, 'calendars': calendars})
+        return ojsonify({'success': True, 'calendars': calendars})
     except _requests.exceptions.HTTPError as e:
         status = e.response.status_code if e.response is not None else 500
         if status == 401:
-            return jsonify({'success': False, 'error': 'Invalid GHL token'}), 401
-        return jsonify({'success': False, 'error': f'GHL API error ({status})'}), status
+            return ojsonify({'success': False, 'error': 'Invalid GHL token'}), 401
+        return ojsonify({'success': False, 'error': f'GHL API error ({status})'}), status
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return ojsonify({'success': False, 'error': str(e)}), 500
 
 
 # ── User Bitrix24 Settings ──────────────────────────────────────────
@@ -896,7 +1553,7 @@ def get_bitrix_settings():
     """Get the logged-in user's Bitrix24 integration settings (webhook masked)."""
     email = (g.user.get('email') or g.user.get('emailAddress') or '').lower().strip()
     settings = get_user_bitrix_settings_masked(email)
-    return jsonify({'success': True, **settings})
+    return ojsonify({'success': True, **settings})
 
 
 @dashboard_bp.route('/bitrix-settings', methods=['POST'])
@@ -926,7 +1583,7 @@ def save_bitrix_settings():
     invalidate_bitrix_cache(email)
 
     settings = get_user_bitrix_settings_masked(email)
-    return jsonify({'success': True, **settings})
+    return ojsonify({'success': True, **settings})
 
 
 @dashboard_bp.route('/bitrix-validate', methods=['GET'])
@@ -936,15 +1593,15 @@ def validate_bitrix_webhook():
     webhook_url = request.args.get('webhook_url', '').strip()
 
     if not webhook_url:
-        return jsonify({'success': False, 'error': 'Webhook URL is required'}), 400
+        return ojsonify({'success': False, 'error': 'Webhook URL is required'}), 400
 
     from bitrix_api import validate_webhook
     result = validate_webhook(webhook_url)
 
     if result.get('valid'):
-        return jsonify({'success': True, **result})
+        return ojsonify({'success': True, **result})
     else:
-        return jsonify({'success': False, 'error': result.get('error', 'Validation failed')}), 400
+        return ojsonify({'success': False, 'error': result.get('error', 'Validation failed')}), 400
 
 
 # ── User Google Sheet Settings ──────────────────────────────────────
@@ -955,7 +1612,7 @@ def get_sheet_settings():
     """Get the logged-in user's Google Sheet settings."""
     email = (g.user.get('email') or g.user.get('emailAddress') or '').lower().strip()
     settings = get_user_sheet_settings_masked(email)
-    return jsonify({'success': True, **settings})
+    return ojsonify({'success': True, **settings})
 
 
 @dashboard_bp.route('/sheet-settings', methods=['POST'])
@@ -994,7 +1651,7 @@ def save_sheet_settings():
     invalidate_user_sheet_cache(email)
 
     settings = get_user_sheet_settings_masked(email)
-    return jsonify({'success': True, **settings})
+    return ojsonify({'success': True, **settings})
 
 
 @dashboard_bp.route('/sheet-validate', methods=['GET'])
@@ -1003,14 +1660,14 @@ def validate_sheet():
     """Validate a Google Sheet URL by testing fetch and checking columns."""
     sheet_url = request.args.get('sheet_url', '').strip()
     if not sheet_url:
-        return jsonify({'success': False, 'error': 'Sheet URL is required'}), 400
+        return ojsonify({'success': False, 'error': 'Sheet URL is required'}), 400
 
     from google_sheets import parse_sheet_id, validate_user_sheet
     sheet_id = parse_sheet_id(sheet_url)
     if not sheet_id:
-        return jsonify({'success': False, 'error': 'Could not parse a valid Google Sheet ID from that URL'}), 400
+        return ojsonify({'success': False, 'error': 'Could not parse a valid Google Sheet ID from that URL'}), 400
 
     result = validate_user_sheet(sheet_id)
     if result.get('valid'):
-        return jsonify({'success': True, **result})
-    return jsonify({'success': False, 'error': result.get('error', 'Validation failed')}), 400
+        return ojsonify({'success': True, **result})
+    return ojsonify({'success': False, 'error': result.get('error', 'Validation failed')}), 400
@@ -3,17 +3,24 @@
 from flask import Blueprint, jsonify, g, request
 import sys
 import os
+import atexit
+import threading
+import traceback
+import time
+from operator import itemgetter
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from absorb_api import AbsorbAPIClient, AbsorbAPIError
+from config import Config
 from middleware import login_required
 from utils.absorb_retry import absorb_retry_on_401
 from utils import format_student_for_response
-from google_sheets import fetch_exam_sheet, invalidate_sheet_cache, parse_exam_date_for_sort, update_sheet_passfail, update_sheet_exam_date, update_sheet_contact
+from utils.cache_utils import set_bounded
+from google_sheets import fetch_exam_sheet, invalidate_sheet_cache, invalidate_sheet_write_index, parse_exam_date_for_sort, update_sheet_passfail, update_sheet_exam_date, update_sheet_contact
 from utils.readiness import calculate_readiness
 from utils.gap_metrics import calculate_gap_metrics
 from demo_data import is_demo_dept, DEMO_DEPT_NAME, get_demo_email_lookup
@@ -22,35 +29,76 @@ exam_bp = Blueprint('exam', __name__)
 
 ADMIN_PASSWORD = os.environ.get('EXAM_ADMIN_PASSWORD', 'Justinsurance123$')
 
-# Cache for department names (departmentId -> name)
+# Cache for department names (departmentId -> name). Names rarely change,
+# so successes are kept for the life of the worker (bounded); lookup
+# failures are only remembered briefly so a transient Absorb error doesn't
+# pin a department to 'Unknown' until the next deploy.
 _dept_name_cache = {}
+_dept_name_failures = {}  # departmentId -> datetime of failed lookup
+DEPT_NAME_CACHE_MAX = 2048
+DEPT_NAME_FAILURE_TTL = 300  # 5 minutes
+DEPT_NAME_LOOKUP_WORKERS = 20
 
 # Cache for processed exam students (email -> {'raw': ..., 'formatted': ...})
 _exam_absorb_cache = {}
-_exam_absorb_timestamp = None
+_exam_absorb_expires_at = None  # time.monotonic() deadline; None = never filled
 EXAM_ABSORB_CACHE_TTL = 300  # 5 minutes
-
-# Load persistent overrides from SQLite into memory (survives restarts)
+EXAM_ABSORB_CACHE_MAX = 10000  # emails; oldest writes evicted first
+EXAM_USER_FETCH_WINDOW = 50  # Max cross-dept users processed at once
+
+# Process-lifetime pool for cross-dept user and department-name lookups,
+# so requests reuse idle threads instead of spawning a fresh executor each
+# time. Its size also caps lookup concurrency across simultaneous requests.
+_EXAM_LOOKUP_POOL = ThreadPoolExecutor(max_workers=EXAM_USER_FETCH_WINDOW, thread_name_prefix='exam-lookup')
+atexit.register(_EXAM_LOOKUP_POOL.shutdown, wait=False)
+
+# Cross-dept user lookups currently running (email -> [Future, joined]).
+# Concurrent requests that need the same student share one Absorb call;
+# joined counts the other requests waiting on it.
+_exam_lookup_inflight = {}
+_exam_lookup_inflight_lock = threading.Lock()
+
+# Load persistent overrides from SQLite into memory (survives restarts).
+# SQLite is the source of truth; the dicts are a read-through copy that is
+# reloaded whenever another worker has written an override.
 def _load_overrides():
     """Load saved overrides from SQLite into in-memory dicts."""
-    global _passfail_overrides, _exam_date_overrides
+    global _passfail_overrides, _exam_date_overrides, _overrides_version
     try:
-        from snapshot_db import get_all_overrides
-        overrides = get_all_overrides()
-        for email, row in overrides.items():
+        from snapshot_db import get_all_overrides, get_overrides_version
+        version = get_overrides_version()
+        passfail = {}
+        exam_dates = {}
+        for email, row in get_all_overrides().items():
             if row.get('pass_fail'):
-                _passfail_overrides[email] = row['pass_fail']
+                passfail[email] = row['pass_fail']
             if row.get('exam_date'):
-                _exam_date_overrides[email] = {
+                exam_dates[email] = {
                     'date': row['exam_date'],
                     'time': row.get('exam_time', '')
                 }
-        print(f"[EXAM] Loaded {len(_passfail_overrides)} pass/fail and {len(_exam_date_overrides)} date overrides from DB")
+        # Swap whole dicts so readers never see a half-loaded copy
+        _passfail_overrides, _exam_date_overrides = passfail, exam_dates
+        _overrides_version = version
+        print(f"[EXAM] Loaded {len(passfail)} pass/fail and {len(exam_dates)} date overrides from DB")
     except Exception as e:
         print(f"[EXAM] Failed to load overrides from DB: {e}")
 
+
+def _refresh_overrides():
+    """Reload overrides if the DB has changed since they were last loaded."""
+    try:
+        from snapshot_db import get_overrides_version
+        if get_overrides_version() == _overrides_version:
+            return
+    except Exception as e:
+        print(f"[EXAM] Failed to check overrides version: {e}")
+        return
+    _load_overrides()
+
 _passfail_overrides = {}
 _exam_date_overrides = {}
+_overrides_version = None
 _exam_result_snapshots = {}
 _load_overrides()
 
@@ -64,33 +112,169 @@ def get_department_name(client, department_id):
     if is_demo_dept(department_id):
         return DEMO_DEPT_NAME
 
-    if department_id in _dept_name_cache:
-        return _dept_name_cache[department_id]
+    name = _dept_name_cache.get(department_id)
+    if name is not None:
+        return name
+
+    failed_at = _dept_name_failures.get(department_id)
+    if failed_at and (datetime.utcnow() - failed_at).total_seconds() < DEPT_NAME_FAILURE_TTL:
+        return 'Unknown'
 
     try:
         dept = client.get_department(department_id)
         name = dept.get('name') or dept.get('Name') or 'Unknown'
-        _dept_name_cache[department_id] = name
+        set_bounded(_dept_name_cache, department_id, name, DEPT_NAME_CACHE_MAX)
+        _dept_name_failures.pop(department_id, None)
         return name
     except Exception:
-        _dept_name_cache[department_id] = 'Unknown'
+        set_bounded(_dept_name_failures, department_id, datetime.utcnow(), DEPT_NAME_CACHE_MAX)
         return 'Unknown'
 
 
+def get_department_names(client, department_ids):
+    """Resolve several department names, batching the uncached ones.
+
+    Uncached departments are looked up with a single filtered /departments
+    call; any the bulk call doesn't return fall back to get_department_name.
+    Returns {department_id: name}.
+    """
+    names = {}
+    missing = []
+    now = datetime.utcnow()
+    for dept_id in department_ids:
+        if not dept_id or is_demo_dept(dept_id):
+            names[dept_id] = get_department_name(client, dept_id)
+            continue
+        name = _dept_name_cache.get(dept_id)
+        if name is not None:
+            names[dept_id] = name
+            continue
+        failed_at = _dept_name_failures.get(dept_id)
+        if failed_at and (now - failed_at).total_seconds() < DEPT_NAME_FAILURE_TTL:
+            names[dept_id] = 'Unknown'
+            continue
+        missing.append(dept_id)
+
+    fetched = client.get_departments_by_ids(missing) if len(missing) > 1 else {}
+    leftover = []
+    for dept_id in missing:
+        name = fetched.get(dept_id.lower())
+        if name:
+            set_bounded(_dept_name_cache, dept_id, name, DEPT_NAME_CACHE_MAX)
+            _dept_name_failures.pop(dept_id, None)
+            names[dept_id] = name
+        else:
+            leftover.append(dept_id)
+
+    # Per-ID lookups for whatever the bulk call missed, run concurrently
+    if len(leftover) == 1:
+        names[leftover[0]] = get_department_name(client, leftover[0])
+    elif leftover:
+        for start in range(0, len(leftover), DEPT_NAME_LOOKUP_WORKERS):
+            batch = leftover[start:start + DEPT_NAME_LOOKUP_WORKERS]
+            futures = [_EXAM_LOOKUP_POOL.submit(get_department_name, client, d) for d in batch]
+            for dept_id, future in zip(batch, futures):
+                names[dept_id] = future.result()
+    return names
+
+
+def _submit_user_lookup(client, email, user):
+    """Return (future, owned) for email's enrollment lookup.
+
+    Joins a lookup another request already has running for the same email;
+    owned is False in that case so the caller leaves it alone on abort.
+    """
+    with _exam_lookup_inflight_lock:
+        entry = _exam_lookup_inflight.get(email) if email else None
+        if entry is not None:
+            entry[1] += 1
+            return entry[0], False
+        future = _EXAM_LOOKUP_POOL.submit(client._process_single_user, user)
+        if not email:
+            return future, True
+        _exam_lookup_inflight[email] = [future, 0]
+
+    def _done(f):
+        with _exam_lookup_inflight_lock:
+            entry = _exam_lookup_inflight.get(email)
+            if entry is not None and entry[0] is f:
+                del _exam_lookup_inflight[email]
+
+    future.add_done_callback(_done)
+    return future, True
+
+
+def _cancel_user_lookups(owned_lookups):
+    """Cancel the (email, future) lookups a request started, unless joined.
+
+    A lookup another request has joined keeps running for that request.
+    The rest are unregistered first so nobody can join one that is about
+    to be cancelled; cancel() runs the done callback, so it is called
+    outside the lock.
+    """
+    to_cancel = []
+    with _exam_lookup_inflight_lock:
+        for email, future in owned_lookups:
+            entry = _exam_lookup_inflight.get(email) if email else None
+            if entry is None or entry[0] is not future:
+                to_cancel.append(future)  # unregistered or already finished
+            elif entry[1] == 0:
+                del _exam_lookup_inflight[email]
+                to_cancel.append(future)
+    for future in to_cancel:
+        future.cancel()
+
+
+def _resolved_past_emails(sheet_students, emails):
+    """Return the emails whose exam date has passed and already has a result.
+
+    A pass/fail from the sheet or an override counts as a result; a date
+    override replaces the sheet date. Rows without a parseable date are
+    never treated as past.
+    """
+    now = datetime.utcnow()
+    resolved = set()
+    for s in sheet_students:
+        email = s['email']
+        if email not in emails:
+            continue
+        if not ((s.get('passFail') or '').strip() or _passfail_overrides.get(email)):
+            continue
+        override = _exam_date_overrides.get(email)
+        if override:
+            try:
+                dt = datetime.strptime(override['date'], '%Y-%m-%d')
+            except (ValueError, TypeError):
+                continue
+        else:
+            dt = parse_exam_date_for_sort(s.get('examDate', ''))
+        if datetime.min < dt < now:
+            resolved.add(email)
+    return resolved
+
+
 def is_exam_absorb_cache_valid():
     """Check if the exam Absorb cache is still valid."""
-    global _exam_absorb_timestamp
-    if not _exam_absorb_timestamp:
-        return False
-    age = (datetime.utcnow() - _exam_absorb_timestamp).total_seconds()
-    return age < EXAM_ABSORB_CACHE_TTL
+    expires_at = _exam_absorb_expires_at
+    return expires_at is not None and time.monotonic() < expires_at
+
+
+def cache_exam_absorb_entry(email, entry):
+    """Store a cross-dept lookup result (None = not found) under the size cap."""
+    set_bounded(_exam_absorb_cache, email, entry, EXAM_ABSORB_CACHE_MAX)
+
+
+def mark_exam_absorb_cache_fresh():
+    """Start a new TTL window after (re)filling the exam Absorb cache."""
+    global _exam_absorb_expires_at
+    _exam_absorb_expires_at = time.monotonic() + EXAM_ABSORB_CACHE_TTL
 
 
 def invalidate_exam_absorb_cache():
     """Clear the exam Absorb lookup cache."""
-    global _exam_absorb_cache, _exam_absorb_timestamp
+    global _exam_absorb_cache, _exam_absorb_expires_at
     _exam_absorb_cache = {}
-    _exam_absorb_timestamp = None
+    _exam_absorb_expires_at = None
     print("[EXAM] Absorb cache invalidated")
 
 
@@ -115,7 +299,9 @@ def get_exam_students():
         admin_key = request.args.get('adminKey', '')
         is_admin = admin_key == ADMIN_PASSWORD
 
-        # 1. Fetch student data (GHL calendar, Bitrix CRM, User Sheet, or Admin Sheet)
+        # 1. Fetch student data (GHL calendar, Bitrix CRM, User Sheet, or Admin Sheet).
+        # Every source normalizes 'email' (stripped, lowercased) and dedupes
+        # on it, so rows here are used as lookup keys without re-normalizing.
         user_email = (g.user.get('email') or g.user.get('emailAddress') or '').lower().strip()
         from snapshot_db import get_user_ghl_settings, get_user_bitrix_settings, get_user_sheet_settings
         ghl_settings = get_user_ghl_settings(user_email)
@@ -150,71 +336,64 @@ def get_exam_students():
                 'count': 0
             })
 
+        # Pick up overrides saved by other workers since our last load
+        _refresh_overrides()
+
         # 2. Get cached Absorb students from current department (fast match)
-        from routes.dashboard import get_cached_students
+        from routes.dashboard import get_cached_students, get_student_email_maps
         raw_students, formatted_students = get_cached_students(
             g.department_id, g.absorb_token
         )
 
-        # 3. Build email maps from current department cache
-        # Use _realEmail for demo students so they match against sheet emails
-        raw_email_map = {}
-        for s in raw_students:
-            email = (s.get('_realEmail') or s.get('emailAddress') or '').lower().strip()
-            if email:
-                raw_email_map[email] = s
-
-        # Build formatted map by bridging raw (real email) → formatted (by ID)
-        _fmt_by_id = {s.get('id'): s for s in formatted_students if s.get('id')}
-        formatted_email_map = {}
-        for email, raw_s in raw_email_map.items():
-            sid = raw_s.get('id') or raw_s.get('Id')
-            if sid and sid in _fmt_by_id:
-                formatted_email_map[email] = _fmt_by_id[sid]
+        # 3. Email maps from current department cache (indexed once per
+        # cache entry; copied because extra departments merge into them).
+        # Uses _realEmail for demo students so they match against sheet emails.
+        raw_email_map, formatted_email_map = get_student_email_maps(
+            g.department_id, raw_students, formatted_students
+        )
+        raw_email_map = dict(raw_email_map)
+        formatted_email_map = dict(formatted_email_map)
 
         # 2b. Also merge students from extra departments (multi-dept mode)
         extra_param = request.args.get('departments', '')
         print(f"[EXAM] Extra departments param: '{extra_param}'")
         print(f"[EXAM] Primary dept email map size: {len(formatted_email_map)}")
         if extra_param:
-            from routes.dashboard import GUID_RE
+            from routes.dashboard import split_extra_dept_ids
             extra_ids = [d.strip() for d in extra_param.split(',') if d.strip()]
-            print(f"[EXAM] Processing {len(extra_ids)} extra department IDs")
-            for dept_id in extra_ids[:10]:
-                guid_ok = bool(GUID_RE.match(dept_id))
-                not_primary = dept_id.lower() != (g.department_id or '').lower()
-                print(f"[EXAM] Dept {dept_id[:8]}: GUID valid={guid_ok}, not_primary={not_primary}")
-                if guid_ok and not_primary:
-                    try:
-                        extra_raw, extra_formatted = get_cached_students(dept_id, g.absorb_token)
-                        merged_raw = 0
-                        merged_fmt = 0
-                        # Build formatted-by-ID for this extra dept
-                        extra_fmt_by_id = {s.get('id'): s for s in extra_formatted if s.get('id')}
-                        for s in extra_raw:
-                            email = (s.get('_realEmail') or s.get('emailAddress') or '').lower().strip()
-                            if email and email not in raw_email_map:
-                                raw_email_map[email] = s
-                                merged_raw += 1
-                                # Bridge to formatted
-                                sid = s.get('id') or s.get('Id')
-                                if sid and sid in extra_fmt_by_id and email not in formatted_email_map:
-                                    formatted_email_map[email] = extra_fmt_by_id[sid]
-                                    merged_fmt += 1
-                        print(f"[EXAM] Merged {merged_fmt} new students from extra dept {dept_id[:8]} (total dept had {len(extra_formatted)})")
-                    except Exception as e:
-                        import traceback
-                        print(f"[EXAM] Error loading extra dept {dept_id[:8]}: {e}")
-                        traceback.print_exc()
+            valid_ids, invalid_ids = split_extra_dept_ids(extra_ids[:10])
+            print(f"[EXAM] Processing {len(valid_ids)} extra department IDs ({len(invalid_ids)} invalid)")
+            for dept_id in valid_ids:
+                try:
+                    extra_raw, extra_formatted = get_cached_students(dept_id, g.absorb_token)
+                    # Reuse the extra dept's cached email index and add only
+                    # the emails the earlier departments don't already have
+                    extra_raw_map, extra_fmt_map = get_student_email_maps(dept_id, extra_raw, extra_formatted)
+                    new_emails = extra_raw_map.keys() - raw_email_map.keys()
+                    raw_email_map.update({e: extra_raw_map[e] for e in new_emails})
+                    new_fmt = {e: extra_fmt_map[e] for e in new_emails
+                               if e in extra_fmt_map and e not in formatted_email_map}
+                    formatted_email_map.update(new_fmt)
+                    merged_fmt = len(new_fmt)
+                    print(f"[EXAM] Merged {merged_fmt} new students from extra dept {dept_id[:8]} (total dept had {len(extra_formatted)})")
+                except Exception as e:
+                    print(f"[EXAM] Error loading extra dept {dept_id[:8]}: {e}")
+                    traceback.print_exc()
         print(f"[EXAM] Total email map size after merge: {len(formatted_email_map)}")
 
-        # 4. Find emails that need cross-department lookup
-        sheet_emails = set(s['email'] for s in sheet_students)
-        matched_emails = sheet_emails & set(formatted_email_map.keys())
-        unmatched_emails = sheet_emails - matched_emails
+        # 4. Find emails that need cross-department lookup (one pass; the
+        # email maps can be far larger than the sheet, so don't copy them)
+        sheet_emails = set()
+        unmatched_emails = set()
+        for sheet_student in sheet_students:
+            email = sheet_student['email']
+            sheet_emails.add(email)
+            if email not in formatted_email_map:
+                unmatched_emails.add(email)
+        matched_count = len(sheet_emails) - len(unmatched_emails)
 
         print(f"[EXAM] Current department ID: {g.department_id}")
-        print(f"[EXAM] Total sheet emails: {len(sheet_emails)}, Matched in dept: {len(matched_emails)}, Unmatched: {len(unmatched_emails)}")
+        print(f"[EXAM] Total sheet emails: {len(sheet_emails)}, Matched in dept: {matched_count}, Unmatched: {len(unmatched_emails)}")
         if len(unmatched_emails) > 0 and len(unmatched_emails) <= 5:
             print(f"[EXAM] Unmatched emails sample: {list(unmatched_emails)[:5]}")
 
@@ -224,8 +403,13 @@ def get_exam_students():
 
         # 5. For admin/GHL/Bitrix mode: fetch specific students by email (cross-department)
         # External calendars may contain contacts from multiple departments
+        if (is_admin or is_ghl or is_bitrix or is_user_sheet) and unmatched_emails and Config.EXAM_LOOKUP_SKIP_RESOLVED:
+            resolved = _resolved_past_emails(sheet_students, unmatched_emails)
+            if resolved:
+                unmatched_emails -= resolved
+                print(f"[EXAM] Skipping lookup for {len(resolved)} past exams that already have a result")
+
         if (is_admin or is_ghl or is_bitrix or is_user_sheet) and unmatched_emails:
-            global _exam_absorb_timestamp
 
             # Skip emails already in cache WITH DATA (not None failures)
             if is_exam_absorb_cache_valid():
@@ -240,74 +424,99 @@ def get_exam_students():
             # Fetch users by searching all departments (admin token allows this)
             found_users = client.get_users_by_emails_batch(truly_unmatched) if truly_unmatched else []
             print(f"[EXAM] Found {len(found_users)} users, processing enrollments...")
+            lookup_started = time.monotonic()
 
             # Process found users in parallel to get enrollment data
             found = 0
+            no_enrollments = 0
 
             if len(found_users) > 0:
-                max_workers = min(50, len(found_users))
-                with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                    # Submit enrollment processing for each found user (using admin token)
-                    future_to_user = {
-                        executor.submit(client._process_single_user, user): user
-                        for user in found_users
-                    }
-
-                    completed = 0
-                    for future in as_completed(future_to_user):
-                        completed += 1
-                        user = future_to_user[future]
+                # Sliding window: keep at most EXAM_USER_FETCH_WINDOW users in
+                # flight and submit the next as each finishes, rather than
+                # queueing a future for every found user up front.
+                window = min(EXAM_USER_FETCH_WINDOW, len(found_users))
+                users_iter = iter(found_users)
+                in_flight = {}  # future -> (email, owned)
+
+                def _submit_next():
+                    user = next(users_iter, None)
+                    if user is not None:
                         email = (user.get('emailAddress') or user.get('EmailAddress') or '').lower().strip()
+                        future, owned = _submit_user_lookup(client, email, user)
+                        in_flight[future] = (email, owned)
+
+                for _ in range(window):
+                    _submit_next()
+
+                while in_flight:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        email, owned = in_flight.pop(future)
                         try:
                             result = future.result()
                             if result:
                                 formatted = format_student_for_response(result)
-                                _exam_absorb_cache[email] = {
+                                cache_exam_absorb_entry(email, {
                                     'raw': result,
                                     'formatted': formatted
-                                }
+                                })
                                 found += 1
                             else:
-                                print(f"[EXAM] No enrollment data for {email}")
+                                no_enrollments += 1
                         except AbsorbAPIError as e:
-                            if e.status_code == 401:
-                                executor.shutdown(wait=False, cancel_futures=True)
+                            # A 401 from a joined lookup was another request's token
+                            if e.status_code == 401 and owned:
+                                _cancel_user_lookups([(pending_email, pending)
+                                                      for pending, (pending_email, pending_owned) in in_flight.items()
+                                                      if pending_owned])
                                 raise
                             print(f"[EXAM] Absorb API error for {email}: {e}")
                         except Exception as e:
                             print(f"[EXAM] Error processing {email}: {e}")
+                        _submit_next()
 
-                        if completed % 20 == 0 or completed == len(found_users):
-                            print(f"[EXAM] Processed {completed}/{len(found_users)} enrollments ({found} complete)")
-
-            _exam_absorb_timestamp = datetime.utcnow()
-            print(f"[EXAM] Admin fetch complete: {found}/{len(unmatched_emails)} found across all departments")
+            mark_exam_absorb_cache_fresh()
+            print(f"[EXAM] Admin fetch complete: {found}/{len(unmatched_emails)} found across all departments "
+                  f"({no_enrollments} without enrollment data) in {time.monotonic() - lookup_started:.1f}s")
 
         # 6. Build combined exam student list
         exam_students = []
 
+        # Match every sheet row to its Absorb record once, collecting the
+        # department IDs so their names resolve in one batch
+        use_cross_dept = is_admin or is_ghl or is_bitrix or is_user_sheet
+        own_dept_name = g.user.get('departmentName', 'Unknown')
+        matches = []
+        dept_ids = set()
         for sheet_student in sheet_students:
             email = sheet_student['email']
 
-            # Try department cache first
+            # Try department cache first (login dept + extra depts)
             formatted = formatted_email_map.get(email)
             raw = raw_email_map.get(email)
-
             if formatted and raw:
-                # Found in loaded departments (login dept + extra depts)
+                match = (formatted, raw, own_dept_name)
+            else:
+                # Cross-department lookup (admin only). Read the entry once;
+                # a concurrent eviction could drop the key between a
+                # membership test and the lookup.
+                cached = _exam_absorb_cache.get(email) if use_cross_dept else None
+                match = (cached['formatted'], cached['raw'], 'Unknown') if cached is not None else None
+            if match and match[1].get('departmentId'):
+                dept_ids.add(match[1]['departmentId'])
+            matches.append(match)
+        dept_names = get_department_names(client, dept_ids) if dept_ids else {}
+
+        for sheet_student, match in zip(sheet_students, matches):
+            email = sheet_student['email']
+
+            if match is not None:
+                formatted, raw, no_dept_name = match
                 dept_id = raw.get('departmentId') or ''
-                dept_name = get_department_name(client, dept_id) if dept_id else g.user.get('departmentName', 'Unknown')
+                dept_name = dept_names.get(dept_id, 'Unknown') if dept_id else no_dept_name
                 raw_enrollments = raw.get('enrollments', [])
 
                 exam_entry = _build_exam_entry(formatted, sheet_student, dept_name, True, raw_enrollments)
-            elif (is_admin or is_ghl or is_bitrix or is_user_sheet) and email in _exam_absorb_cache and _exam_absorb_cache[email] is not None:
-                # Found via cross-department lookup (admin only)
-                cached = _exam_absorb_cache[email]
-                dept_id = cached['raw'].get('departmentId') or ''
-                dept_name = get_department_name(client, dept_id) if dept_id else 'Unknown'
-                raw_enrollments = cached['raw'].get('enrollments', [])
-
-                exam_entry = _build_exam_entry(cached['formatted'], sheet_student, dept_name, True, raw_enrollments)
             else:
                 # Not found in Absorb at all
                 exam_entry = _build_unmatched_entry(sheet_student)
@@ -347,8 +556,8 @@ def get_exam_students():
         if has_demo:
             demo_lookup = get_demo_email_lookup()
             for entry in exam_students:
-                real_email = (entry.get('_sheetEmail') or '').lower().strip()
-                if real_email and real_email in demo_lookup:
+                real_email = entry['_sheetEmail']
+                if real_email in demo_lookup:
                     demo = demo_lookup[real_email]
                     entry['fullName'] = demo['fullName']
                     entry['email'] = demo['email']
@@ -369,15 +578,24 @@ def get_exam_students():
         # 7. Sort: upcoming first, then past
         now = datetime.utcnow()
 
-        def sort_key(s):
+        # Parse each exam date once; the sort and the KPI pass share it.
+        # Upcoming exams soonest first, then past ones most recent first
+        # (undated rows parse to datetime.min and so land last). Two plain
+        # date sorts replace a composite key that built a timedelta for
+        # every past row; reverse=True keeps ties in sheet order as before.
+        upcoming = []
+        past = []
+        for s in exam_students:
             dt = parse_exam_date_for_sort(s.get('examDateRaw', ''))
-            is_past = dt < now if dt != datetime.min else True
-            return (is_past, dt if not is_past else datetime.max - dt)
-
-        exam_students.sort(key=sort_key)
+            (past if dt < now else upcoming).append((dt, s))
+        by_date = itemgetter(0)
+        upcoming.sort(key=by_date)
+        past.sort(key=by_date, reverse=True)
+        dated = upcoming + past
+        exam_students = [s for _, s in dated]
 
         # 8. Calculate exam KPIs
-        exam_summary = _calculate_exam_summary(exam_students, now)
+        exam_summary = _calculate_exam_summary(exam_students, now, [dt for dt, _ in dated])
 
         return jsonify({
             'success': True,
@@ -393,7 +611,6 @@ def get_exam_students():
         }), e.status_code or 500
 
     except Exception as e:
-        import traceback
         print(f"[EXAM] Error: {e}")
         traceback.print_exc()
         return jsonify({
@@ -495,80 +712,78 @@ def _build_tracking_data(sheet_student):
     }
 
 
-def _calculate_exam_summary(exam_students, now):
-    """Calculate comprehensive KPI summary for exam students."""
-    total = len(exam_students)
-    passed_students = [s for s in exam_students if (s.get('passFail') or '').upper() == 'PASS']
-    failed_students = [s for s in exam_students if (s.get('passFail') or '').upper() == 'FAIL']
-    passed = len(passed_students)
-    failed = len(failed_students)
+def _calculate_exam_summary(exam_students, now, exam_dates=None):
+    """Calculate comprehensive KPI summary for exam students.
 
+    exam_dates, if given, holds parse_exam_date_for_sort() of each
+    student's examDateRaw in the same order, so they aren't parsed again.
+    """
+    total = len(exam_students)
+    passed = failed = 0
     upcoming = 0
     at_risk = 0  # upcoming exam but low progress
-    for s in exam_students:
-        dt = parse_exam_date_for_sort(s.get('examDateRaw', ''))
-        has_result = bool(s.get('passFail', '').strip())
-        if dt > now and not has_result:
+
+    # Study time analytics (matched students only)
+    matched = matched_passed = matched_failed = 0
+    progress_sum = 0
+    study_sum = study_sum_passed = study_sum_failed = 0
+
+    # Course type breakdown
+    course_types = {}
+
+    # Single pass over the students; each one is only read once
+    for i, s in enumerate(exam_students):
+        pf_raw = s.get('passFail', '')
+        pf = (pf_raw or '').upper()
+        is_matched = bool(s.get('matched'))
+        if pf == 'PASS':
+            passed += 1
+        elif pf == 'FAIL':
+            failed += 1
+
+        # Matched entries are built from format_student_for_response, which
+        # always sets progress/timeSpent/examPrepTime, so read them directly
+        progress = s['progress']['value'] if is_matched else 0
+
+        dt = exam_dates[i] if exam_dates is not None else parse_exam_date_for_sort(s.get('examDateRaw', ''))
+        if dt > now and not pf_raw.strip():
             upcoming += 1
             # At risk: upcoming exam but < 80% progress (matched students only)
-            if s.get('matched') and s.get('progress', {}).get('value', 0) < 80:
+            if is_matched and progress < 80:
                 at_risk += 1
 
+        if is_matched:
+            study = (s['timeSpent']['minutes'] or 0) + (s['examPrepTime']['minutes'] or 0)
+            matched += 1
+            progress_sum += progress
+            study_sum += study
+            if pf == 'PASS':
+                matched_passed += 1
+                study_sum_passed += study
+            elif pf == 'FAIL':
+                matched_failed += 1
+                study_sum_failed += study
+
+        course = (s.get('examCourse') or 'Unknown').strip()
+        counts = course_types.get(course)
+        if counts is None:
+            counts = course_types[course] = {'total': 0, 'passed': 0, 'failed': 0}
+        counts['total'] += 1
+        if pf == 'PASS':
+            counts['passed'] += 1
+        elif pf == 'FAIL':
+            counts['failed'] += 1
+
     no_result = total - passed - failed - upcoming
 
     # Pass rate (of those who have taken the exam)
     completed_exams = passed + failed
     pass_rate = round((passed / completed_exams * 100), 1) if completed_exams > 0 else 0
 
-    # Study time analytics (matched students only)
-    matched_students = [s for s in exam_students if s.get('matched')]
-    matched_passed = [s for s in passed_students if s.get('matched')]
-    matched_failed = [s for s in failed_students if s.get('matched')]
-
-    avg_progress = 0
-    avg_study_time = 0
-    avg_study_passed = 0
-    avg_study_failed = 0
-
-    if matched_students:
-        avg_progress = round(
-            sum(s['progress']['value'] for s in matched_students) / len(matched_students), 1
-        )
-        total_study = sum(
-            (s.get('timeSpent', {}).get('minutes', 0) or 0) +
-            (s.get('examPrepTime', {}).get('minutes', 0) or 0)
-            for s in matched_students
-        )
-        avg_study_time = round(total_study / len(matched_students))
-
-    if matched_passed:
-        total_study_passed = sum(
-            (s.get('timeSpent', {}).get('minutes', 0) or 0) +
-            (s.get('examPrepTime', {}).get('minutes', 0) or 0)
-            for s in matched_passed
-        )
-        avg_study_passed = round(total_study_passed / len(matched_passed))
-
-    if matched_failed:
-        total_study_failed = sum(
-            (s.get('timeSpent', {}).get('minutes', 0) or 0) +
-            (s.get('examPrepTime', {}).get('minutes', 0) or 0)
-            for s in matched_failed
-        )
-        avg_study_failed = round(total_study_failed / len(matched_failed))
-
-    # Course type breakdown
-    course_types = {}
-    for s in exam_students:
-        course = (s.get('examCourse') or 'Unknown').strip()
-        if course not in course_types:
-            course_types[course] = {'total': 0, 'passed': 0, 'failed': 0}
-        course_types[course]['total'] += 1
-        pf = (s.get('passFail') or '').upper()
-        if pf == 'PASS':
-            course_types[course]['passed'] += 1
-        elif pf == 'FAIL':
-            course_types[course]['failed'] += 1
+    avg_progress = round(progress_sum / matched, 1) if matched else 0
+    avg_study_time = round(study_sum / matched) if matched else 0
+    avg_study_passed = round(study_sum_passed / matched_passed) if matched_passed else 0
+    avg_study_failed = round(study_sum_failed / matched_failed) if matched_failed else 0
 
     # Format study times for display
     def format_mins(m):
@@ -1020,9 +1235,11 @@ def sync_exam_data():
         elif sheet_settings['enabled'] and sheet_settings['sheet_id']:
             from google_sheets import invalidate_user_sheet_cache, fetch_user_exam_sheet
             invalidate_user_sheet_cache(user_email)
+            invalidate_sheet_write_index(sheet_settings['sheet_id'])
             sheet_students = fetch_user_exam_sheet(sheet_settings['sheet_id'], user_email)
         else:
             invalidate_sheet_cache()
+            invalidate_sheet_write_index()
             sheet_students = fetch_exam_sheet()
 
         return jsonify({
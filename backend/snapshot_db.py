@@ -5,8 +5,11 @@ This builds a historical record for tracking study patterns over time.
 """
 
 import sqlite3
+import functools
 import json
+import operator
 import os
+import time
 from datetime import datetime, timedelta
 
 from config import Config
@@ -118,23 +121,30 @@ def init_db():
 
 # ── Allowed Users (allowlist) functions ──────────────────────────────
 
+ALLOWLIST_CACHE_SECONDS = 60
+
+
 def is_user_allowed(email):
     """Check if a user is on the allowlist.
-    Returns True if allowlist is empty (not enforcing) or user is active."""
-    email = email.lower().strip()
+    Returns True if allowlist is empty (not enforcing) or user is active.
+
+    Answers are cached in-process for up to ALLOWLIST_CACHE_SECONDS (the
+    allowlist changes rarely); add/remove clear the cache immediately.
+    """
+    return _is_user_allowed_cached(email.lower().strip(), int(time.time() // ALLOWLIST_CACHE_SECONDS))
+
+
+@functools.lru_cache(maxsize=4096)
+def _is_user_allowed_cached(email, _bucket):
+    """Allowlist lookup; _bucket rolls over every ALLOWLIST_CACHE_SECONDS to expire entries."""
     conn = _get_connection()
-    count = conn.execute(
-        'SELECT COUNT(*) FROM allowed_users WHERE active = 1'
-    ).fetchone()[0]
-    if count == 0:
-        conn.close()
-        return True
     row = conn.execute(
-        'SELECT 1 FROM allowed_users WHERE email = ? AND active = 1',
+        '''SELECT NOT EXISTS (SELECT 1 FROM allowed_users WHERE active = 1)
+                  OR EXISTS (SELECT 1 FROM allowed_users WHERE email = ? AND active = 1)''',
         (email,)
     ).fetchone()
     conn.close()
-    return row is not None
+    return bool(row[0])
 
 
 def add_allowed_user(email, name='', added_by=''):
@@ -157,6 +167,7 @@ def add_allowed_user(email, name='', added_by=''):
         )
     conn.commit()
     conn.close()
+    _is_user_allowed_cached.cache_clear()
     return True
 
 
@@ -167,6 +178,7 @@ def remove_allowed_user(email):
     conn.execute('UPDATE allowed_users SET active = 0 WHERE email = ?', (email,))
     conn.commit()
     conn.close()
+    _is_user_allowed_cached.cache_clear()
 
 
 def get_all_allowed_users():
@@ -227,6 +239,26 @@ def save_user_dept_prefs(email, dept_ids):
     conn.close()
 
 
+def get_recent_pref_dept_ids(limit):
+    """Distinct department IDs from saved preferences, most recently saved first."""
+    conn = _get_connection()
+    rows = conn.execute(
+        'SELECT department_ids FROM user_department_prefs ORDER BY updated_at DESC'
+    ).fetchall()
+    conn.close()
+    seen = set()
+    dept_ids = []
+    for row in rows:
+        for dept_id in json.loads(row['department_ids'] or '[]'):
+            key = dept_id.lower()
+            if key not in seen:
+                seen.add(key)
+                dept_ids.append(dept_id)
+                if len(dept_ids) >= limit:
+                    return dept_ids
+    return dept_ids
+
+
 # ── User Hidden Students functions ────────────────────────────────────
 
 MAX_HIDDEN_STUDENTS = 200
@@ -662,6 +694,18 @@ def get_all_overrides():
     return overrides
 
 
+def get_overrides_version():
+    """Return (row count, latest updated_at) for exam_overrides.
+
+    Every set_override call bumps updated_at, so a worker can compare this
+    against the version it last loaded to tell whether its copy is stale.
+    """
+    conn = _get_connection()
+    row = conn.execute('SELECT COUNT(*), MAX(updated_at) FROM exam_overrides').fetchone()
+    conn.close()
+    return (row[0], row[1])
+
+
 # ---------------------------------------------------------------------------
 # Google Sheet persistence (survives Render deploys)
 # ---------------------------------------------------------------------------
@@ -674,23 +718,43 @@ SHEET_HEADERS = [
     'state_law_time', 'state_law_completions'
 ]
 
+# Metric columns (everything after email + snapshot_time) and their defaults,
+# used to serialize a snapshot dict into a sheet row in one itemgetter call
+_SNAPSHOT_METRIC_DEFAULTS = {
+    'total_time_min': 0, 'prelicense_progress': 0, 'exam_prep_progress': 0,
+    'practice_scores': '', 'consecutive_passing': 0, 'readiness': '',
+    'criteria_met': '', 'study_gap_count': 0, 'total_gap_days': 0,
+    'largest_gap_days': 0, 'life_video_time': 0, 'health_video_time': 0,
+    'state_law_time': 0, 'state_law_completions': 0,
+}
+_SNAPSHOT_METRICS_GETTER = operator.itemgetter(*SHEET_HEADERS[2:])
+
+
+def _header_range(headers):
+    """A1 range covering a header row exactly, e.g. 'A1:P1'."""
+    from google_sheets import col_letter
+    return f"A1:{col_letter(len(headers))}1"
+
 
 def _get_snapshot_sheet():
-    """Get the snapshot Google Sheet worksheet. Returns None if not configured."""
-    import json
-    import gspread
-    from google.oauth2.service_account import Credentials
+    """Get the snapshot Google Sheet worksheet. Returns None if not configured.
+
+    Reuses the shared gspread client and cached worksheet handle from
+    google_sheets instead of re-authorizing on every call.
+    """
+    from google_sheets import get_gspread_client, open_worksheet
 
-    creds_json = Config.GOOGLE_SHEETS_CREDENTIALS_JSON
     sheet_id = Config.SNAPSHOT_SHEET_ID
-    if not creds_json or not sheet_id:
+    if not sheet_id:
+        return None
+    gc = get_gspread_client()
+    if not gc:
         return None
+    return open_worksheet(gc, sheet_id)
+
 
-    creds_data = json.loads(creds_json)
-    scopes = ['https://www.googleapis.com/auth/spreadsheets']
-    credentials = Credentials.from_service_account_info(creds_data, scopes=scopes)
-    gc = gspread.authorize(credentials)
-    return gc.open_by_key(sheet_id).sheet1
+# Set once the snapshot sheet's header row has been verified this process
+_snapshot_headers_ok = False
 
 
 def save_snapshots_to_sheet(snapshots):
@@ -707,35 +771,24 @@ def save_snapshots_to_sheet(snapshots):
             print("[SNAPSHOTS] No Google Sheet credentials or SNAPSHOT_SHEET_ID configured, skipping sheet save")
             return
 
-        # Ensure headers exist (first row)
-        existing = ws.row_values(1)
-        if not existing or existing[0] != SHEET_HEADERS[0]:
-            ws.update('A1', [SHEET_HEADERS])
-            print("[SNAPSHOTS] Wrote headers to snapshot sheet")
+        # Ensure headers exist (first row); checked once per process
+        global _snapshot_headers_ok
+        if not _snapshot_headers_ok:
+            existing = ws.row_values(1)
+            if not existing or existing[0] != SHEET_HEADERS[0]:
+                ws.update(range_name=_header_range(SHEET_HEADERS), values=[SHEET_HEADERS], value_input_option='RAW')
+                print("[SNAPSHOTS] Wrote headers to snapshot sheet")
+            _snapshot_headers_ok = True
 
         now = datetime.utcnow().isoformat()
-        rows = []
-        for s in snapshots:
-            rows.append([
-                s.get('email', ''),
-                now,
-                s.get('total_time_min', 0),
-                s.get('prelicense_progress', 0),
-                s.get('exam_prep_progress', 0),
-                s.get('practice_scores', ''),
-                s.get('consecutive_passing', 0),
-                s.get('readiness', ''),
-                s.get('criteria_met', ''),
-                s.get('study_gap_count', 0),
-                s.get('total_gap_days', 0),
-                s.get('largest_gap_days', 0),
-                s.get('life_video_time', 0),
-                s.get('health_video_time', 0),
-                s.get('state_law_time', 0),
-                s.get('state_law_completions', 0),
-            ])
-
-        ws.append_rows(rows, value_input_option='RAW')
+        rows = [[s.get('email', ''), now, *_SNAPSHOT_METRICS_GETTER({**_SNAPSHOT_METRIC_DEFAULTS, **s})]
+                for s in snapshots]
+
+        # Chunk so no single append exceeds the per-request cell budget
+        from google_sheets import sheets_write_with_backoff, SHEETS_MAX_CELLS_PER_WRITE
+        chunk = max(1, SHEETS_MAX_CELLS_PER_WRITE // len(SHEET_HEADERS))
+        for i in range(0, len(rows), chunk):
+            sheets_write_with_backoff(ws.append_rows, rows[i:i + chunk], value_input_option='RAW')
         print(f"[SNAPSHOTS] Appended {len(rows)} rows to Google Sheet")
     except Exception as e:
         print(f"[SNAPSHOTS] Failed to save to Google Sheet (non-fatal): {e}")
@@ -764,9 +817,27 @@ def load_snapshots_from_sheet():
 
         # Get existing snapshot times from SQLite to avoid duplicates
         conn = _get_connection()
-        existing = set()
-        for row in conn.execute('SELECT email, snapshot_time FROM study_snapshots').fetchall():
-            existing.add((row['email'], row['snapshot_time']))
+        existing = {(row['email'], row['snapshot_time'])
+                    for row in conn.execute('SELECT email, snapshot_time FROM study_snapshots')}
+
+        # Resolve header positions once instead of building a dict per row
+        col_idx = {h: i for i, h in enumerate(headers)}
+
+        def cell(row, key):
+            i = col_idx.get(key)
+            return row[i] if i is not None and i < len(row) else ''
+
+        def safe_float(val, default=0):
+            try:
+                return float(val) if val else default
+            except (ValueError, TypeError):
+                return default
+
+        def safe_int(val, default=0):
+            try:
+                return int(float(val)) if val else default
+            except (ValueError, TypeError):
+                return default
 
         # Parse sheet rows and insert missing ones
         new_count = 0
@@ -776,13 +847,9 @@ def load_snapshots_from_sheet():
         for row in data_rows:
             if len(row) < 2:
                 continue
-            # Map by header position
-            row_dict = {}
-            for i, h in enumerate(headers):
-                row_dict[h] = row[i] if i < len(row) else ''
 
-            email = (row_dict.get('email') or '').lower().strip()
-            snap_time = row_dict.get('snapshot_time') or now_iso
+            email = cell(row, 'email').lower().strip()
+            snap_time = cell(row, 'snapshot_time') or now_iso
             if not email:
                 continue
 
@@ -790,34 +857,22 @@ def load_snapshots_from_sheet():
             if (email, snap_time) in existing:
                 continue
 
-            def safe_float(val, default=0):
-                try:
-                    return float(val) if val else default
-                except (ValueError, TypeError):
-                    return default
-
-            def safe_int(val, default=0):
-                try:
-                    return int(float(val)) if val else default
-                except (ValueError, TypeError):
-                    return default
-
             batch.append((
                 email, snap_time,
-                safe_float(row_dict.get('total_time_min')),
-                safe_float(row_dict.get('prelicense_progress')),
-                safe_float(row_dict.get('exam_prep_progress')),
-                row_dict.get('practice_scores', ''),
-                safe_int(row_dict.get('consecutive_passing')),
-                row_dict.get('readiness', ''),
-                row_dict.get('criteria_met', ''),
-                safe_int(row_dict.get('study_gap_count')),
-                safe_int(row_dict.get('total_gap_days')),
-                safe_int(row_dict.get('largest_gap_days')),
-                safe_float(row_dict.get('life_video_time')),
-                safe_float(row_dict.get('health_video_time')),
-                safe_float(row_dict.get('state_law_time')),
-                safe_int(row_dict.get('state_law_completions')),
+                safe_float(cell(row, 'total_time_min')),
+                safe_float(cell(row, 'prelicense_progress')),
+                safe_float(cell(row, 'exam_prep_progress')),
+                cell(row, 'practice_scores'),
+                safe_int(cell(row, 'consecutive_passing')),
+                cell(row, 'readiness'),
+                cell(row, 'criteria_met'),
+                safe_int(cell(row, 'study_gap_count')),
+                safe_int(cell(row, 'total_gap_days')),
+                safe_int(cell(row, 'largest_gap_days')),
+                safe_float(cell(row, 'life_video_time')),
+                safe_float(cell(row, 'health_video_time')),
+                safe_float(cell(row, 'state_law_time')),
+                safe_int(cell(row, 'state_law_completions')),
             ))
             new_count += 1
 
@@ -848,26 +903,21 @@ ALLOWLIST_HEADERS = ['email', 'name', 'added_by', 'added_at', 'active']
 
 def _get_allowlist_sheet():
     """Get the AllowedUsers worksheet (second tab of snapshot sheet)."""
-    import json
     import gspread
-    from google.oauth2.service_account import Credentials
+    from google_sheets import get_gspread_client, open_worksheet
 
-    creds_json = Config.GOOGLE_SHEETS_CREDENTIALS_JSON
     sheet_id = Config.SNAPSHOT_SHEET_ID
-    if not creds_json or not sheet_id:
+    if not sheet_id:
+        return None
+    gc = get_gspread_client()
+    if not gc:
         return None
-
-    creds_data = json.loads(creds_json)
-    scopes = ['https://www.googleapis.com/auth/spreadsheets']
-    credentials = Credentials.from_service_account_info(creds_data, scopes=scopes)
-    gc = gspread.authorize(credentials)
-    spreadsheet = gc.open_by_key(sheet_id)
 
     try:
-        return spreadsheet.worksheet('AllowedUsers')
+        return open_worksheet(gc, sheet_id, 'AllowedUsers')
     except gspread.exceptions.WorksheetNotFound:
-        ws = spreadsheet.add_worksheet(title='AllowedUsers', rows=100, cols=5)
-        ws.update('A1', [ALLOWLIST_HEADERS])
+        ws = gc.open_by_key(sheet_id).add_worksheet(title='AllowedUsers', rows=100, cols=5)
+        ws.update(range_name=_header_range(ALLOWLIST_HEADERS), values=[ALLOWLIST_HEADERS], value_input_option='RAW')
         return ws
 
 
@@ -879,11 +929,11 @@ def save_allowlist_to_sheet():
             print("[ALLOWLIST] No Google Sheet configured, skipping sheet save")
             return
         users = get_all_allowed_users()
+        # Header + all rows as one raw A1 block: a single write request
+        # instead of a header update followed by append_rows
+        rows = [ALLOWLIST_HEADERS] + [[u['email'], u['name'], u['added_by'], u['added_at'], '1'] for u in users]
         ws.clear()
-        ws.update('A1', [ALLOWLIST_HEADERS])
-        if users:
-            rows = [[u['email'], u['name'], u['added_by'], u['added_at'], '1'] for u in users]
-            ws.append_rows(rows, value_input_option='RAW')
+        ws.update(range_name='A1', values=rows, value_input_option='RAW')
         print(f"[ALLOWLIST] Saved {len(users)} allowed users to Google Sheet")
     except Exception as e:
         print(f"[ALLOWLIST] Failed to save to Google Sheet (non-fatal): {e}")
@@ -903,24 +953,35 @@ def load_allowlist_from_sheet():
         headers = all_values[0]
         data_rows = all_values[1:]
         conn = _get_connection()
-        loaded = 0
+        # One query for the known emails instead of a SELECT per sheet row
+        known = {row['email'] for row in conn.execute('SELECT email FROM allowed_users')}
+        col_idx = {h: i for i, h in enumerate(headers)}
+
+        def cell(row, key, default=''):
+            i = col_idx.get(key)
+            if i is None:
+                return default
+            return row[i] if i < len(row) else ''
+
+        new_rows = []
         for row in data_rows:
-            row_dict = {h: row[i] if i < len(row) else '' for i, h in enumerate(headers)}
-            email = (row_dict.get('email') or '').lower().strip()
-            if not email:
+            email = cell(row, 'email').lower().strip()
+            if not email or email in known:
                 continue
-            if row_dict.get('active', '1') != '1':
+            if cell(row, 'active', '1') != '1':
                 continue
-            existing = conn.execute('SELECT 1 FROM allowed_users WHERE email = ?', (email,)).fetchone()
-            if not existing:
-                conn.execute(
-                    'INSERT INTO allowed_users (email, name, added_by, added_at, active) VALUES (?, ?, ?, ?, 1)',
-                    (email, row_dict.get('name', ''), row_dict.get('added_by', ''),
-                     row_dict.get('added_at', datetime.utcnow().isoformat()))
-                )
-                loaded += 1
+            known.add(email)
+            new_rows.append((email, cell(row, 'name'), cell(row, 'added_by'),
+                             cell(row, 'added_at', datetime.utcnow().isoformat())))
+        if new_rows:
+            conn.executemany(
+                'INSERT INTO allowed_users (email, name, added_by, added_at, active) VALUES (?, ?, ?, ?, 1)',
+                new_rows
+            )
+        loaded = len(new_rows)
         conn.commit()
         conn.close()
+        _is_user_allowed_cached.cache_clear()
         print(f"[ALLOWLIST] Loaded {loaded} new allowed users from Google Sheet")
         return loaded
     except Exception as e:
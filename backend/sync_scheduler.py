@@ -8,14 +8,126 @@ Requires env vars:
     SYNC_ABSORB_USERNAME  - Absorb admin account username
     SYNC_ABSORB_PASSWORD  - Absorb admin account password
     SYNC_INTERVAL_HOURS   - How often to sync (default: 6)
+
+The optional cache warmer (CACHE_WARMUP_ENABLED) uses the same account to
+keep the dashboard student cache filled for departments in saved prefs.
 """
 
+import hashlib
+import json
+import os
+import tempfile
 import threading
-from datetime import datetime
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from config import Config
 
+# Cross-process coordination between gunicorn workers (see the fcntl note
+# in routes/dashboard.py). Without fcntl (Windows dev, single worker) the
+# in-process lock is all there is.
+try:
+    import fcntl
+    _HAS_FCNTL = True
+except ImportError:
+    _HAS_FCNTL = False
+
+# One Absorb token for the sync account, shared by the sync scheduler and
+# the cache warmer in every worker. Absorb allows one session per account:
+# authenticating again revokes the previous token, so logins are
+# serialized across processes by a file lock and the token is handed to
+# the other workers through a token file.
+_service_token = None
+_service_token_at = None  # time.time() of the login
+_service_token_lock = threading.Lock()
+SERVICE_TOKEN_MAX_AGE = timedelta(hours=3)  # Absorb tokens last 4h
+
+
+def _service_path(suffix):
+    """Per-account file in the temp dir, named from SECRET_KEY + username."""
+    seed = f"{Config.SECRET_KEY or ''}:{(Config.SYNC_ABSORB_USERNAME or '').lower().strip()}"
+    digest = hashlib.sha256(seed.encode('utf-8')).hexdigest()[:20]
+    return os.path.join(tempfile.gettempdir(), f"absorb_service_{digest}.{suffix}")
+
+
+@contextmanager
+def _service_login_lock():
+    """Hold the cross-process login lock (no-op without fcntl)."""
+    lock_file = None
+    if _HAS_FCNTL:
+        try:
+            lock_file = open(_service_path('lock'), 'w')
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        except OSError as e:
+            print(f"[SYNC SCHEDULER] flock acquire failed ({type(e).__name__}), proceeding without cross-process lock")
+            if lock_file is not None:
+                lock_file.close()
+            lock_file = None
+    try:
+        yield
+    finally:
+        if lock_file is not None:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                lock_file.close()
+            except OSError:
+                pass
+
+
+def _read_shared_service_token():
+    """Return (token, login time) last written by any worker, or (None, None)."""
+    try:
+        with open(_service_path('token')) as f:
+            data = json.load(f)
+        return data['token'], float(data['at'])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None, None
+
+
+def _write_shared_service_token(token, logged_in_at):
+    """Atomically publish the token to the other workers (owner-only file)."""
+    path = _service_path('token')
+    tmp_path = f"{path}.{os.getpid()}"
+    try:
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'token': token, 'at': logged_in_at}, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"[SYNC SCHEDULER] Could not share service token: {type(e).__name__}")
+
+
+def get_service_token(stale_token=None):
+    """Return a valid token for the sync account, authenticating if needed.
+
+    Pass the token that just got a 401 as stale_token to force a new login
+    (skipped if another thread or worker already replaced it).
+    """
+    global _service_token, _service_token_at
+    from absorb_api import AbsorbAPIClient
+
+    max_age = SERVICE_TOKEN_MAX_AGE.total_seconds()
+    with _service_token_lock:
+        if _service_token and _service_token != stale_token:
+            if stale_token or time.time() - _service_token_at < max_age:
+                return _service_token
+
+        with _service_login_lock():
+            # CAS: another worker may have logged in while we waited
+            token, logged_in_at = _read_shared_service_token()
+            if token and token != stale_token and time.time() - logged_in_at < max_age:
+                _service_token, _service_token_at = token, logged_in_at
+                return token
+
+            auth = AbsorbAPIClient().authenticate_user(Config.SYNC_ABSORB_USERNAME, Config.SYNC_ABSORB_PASSWORD)
+            if not auth.get('success'):
+                raise Exception('Absorb authentication failed')
+            _service_token, _service_token_at = auth['token'], time.time()
+            _write_shared_service_token(_service_token, _service_token_at)
+            return _service_token
+
 
 class SyncScheduler:
     """Periodic background sync of Absorb data for exam-scheduled students."""
@@ -96,10 +208,7 @@ class SyncScheduler:
 
         # 2. Authenticate with Absorb using stored admin credentials
         client = AbsorbAPIClient()
-        auth = client.authenticate_user(username, password)
-        if not auth.get('success'):
-            raise Exception('Absorb authentication failed')
-        client.set_token(auth['token'])
+        client.set_token(get_service_token())
 
         # 3. Batch look up students in Absorb
         found_users = client.get_users_by_emails_batch(emails)
@@ -126,16 +235,16 @@ class SyncScheduler:
                         result = future.result()
                         if result:
                             formatted = format_student_for_response(result)
-                            exam_module._exam_absorb_cache[email] = {
+                            exam_module.cache_exam_absorb_entry(email, {
                                 'raw': result,
                                 'formatted': formatted
-                            }
+                            })
                             cached_count += 1
                         else:
-                            exam_module._exam_absorb_cache[email] = None
+                            exam_module.cache_exam_absorb_entry(email, None)
                     except Exception as e:
                         print(f"[SYNC SCHEDULER] Error processing {email}: {e}")
-                        exam_module._exam_absorb_cache[email] = None
+                        exam_module.cache_exam_absorb_entry(email, None)
 
                     if completed % 20 == 0 or completed == len(found_users):
                         print(f"[SYNC SCHEDULER] Processed {completed}/{len(found_users)} ({cached_count} cached)")
@@ -143,10 +252,10 @@ class SyncScheduler:
         # 5. Mark uncached emails as None (not found in Absorb)
         for email in emails:
             if email not in exam_module._exam_absorb_cache:
-                exam_module._exam_absorb_cache[email] = None
+                exam_module.cache_exam_absorb_entry(email, None)
 
-        # Update cache timestamp
-        exam_module._exam_absorb_timestamp = datetime.utcnow()
+        # Start a new cache TTL window
+        exam_module.mark_exam_absorb_cache_fresh()
 
         # 6. Save study snapshots to SQLite + Google Sheet for historical tracking
         try:
@@ -190,8 +299,103 @@ class SyncScheduler:
         }
 
 
+class CacheWarmer:
+    """Keeps the dashboard student cache warm for known departments.
+
+    Departments come from saved dept prefs (most recent first). Each run
+    goes through get_cached_students, so fresh entries are left alone and
+    expiring ones get the normal stale-while-revalidate refresh; the first
+    run after a deploy fills them before any user asks.
+
+    Every gunicorn worker starts one, but only the worker holding the
+    leader flock warms; the rest retry each interval and take over if that
+    worker goes away. With REDIS_URL set its fills reach every worker.
+    """
+
+    def __init__(self, interval_seconds, max_depts):
+        self.interval = interval_seconds
+        self.max_depts = max_depts
+        self._timer = None
+        self._running = False
+        self._leader_file = None
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._schedule_next(delay=10)
+        print(f"[CACHE WARMER] Started - up to {self.max_depts} depts every {self.interval}s")
+
+    def _schedule_next(self, delay=None):
+        if not self._running:
+            return
+        self._timer = threading.Timer(self.interval if delay is None else delay, self._run)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _is_leader(self):
+        """Take (and keep for the process lifetime) the warmer leader flock."""
+        if self._leader_file is not None or not _HAS_FCNTL:
+            return True
+        lock_file = None
+        try:
+            lock_file = open(_service_path('warmer'), 'w')
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            if lock_file is not None:
+                lock_file.close()
+            return False
+        self._leader_file = lock_file
+        print(f"[CACHE WARMER] Worker {os.getpid()} is warming the cache")
+        return True
+
+    def _run(self):
+        try:
+            if self._is_leader():
+                self._warm()
+        except Exception as e:
+            print(f"[CACHE WARMER] Failed: {e}")
+        finally:
+            self._schedule_next()
+
+    def _warm(self):
+        from absorb_api import AbsorbAPIClient, AbsorbAPIError
+        from snapshot_db import get_recent_pref_dept_ids
+        from routes.dashboard import get_cached_students
+        from routes.exam import get_department_names
+
+        dept_ids = get_recent_pref_dept_ids(self.max_depts)
+        if not dept_ids:
+            return
+        token = get_service_token()
+        warmed = 0
+        # One department at a time: this is background work and shouldn't
+        # compete with user requests for Absorb capacity
+        for dept_id in dept_ids:
+            for attempt in range(2):
+                try:
+                    get_cached_students(dept_id, token)
+                    warmed += 1
+                    break
+                except AbsorbAPIError as e:
+                    if e.status_code == 401 and attempt == 0:
+                        token = get_service_token(stale_token=token)
+                        continue
+                    print(f"[CACHE WARMER] {dept_id[:8]}: {e}")
+                    break
+                except Exception as e:
+                    print(f"[CACHE WARMER] {dept_id[:8]}: {e}")
+                    break
+
+        client = AbsorbAPIClient()
+        client.set_token(token)
+        get_department_names(client, dept_ids)
+        print(f"[CACHE WARMER] Warmed {warmed}/{len(dept_ids)} departments")
+
+
 # Module-level instance
 _scheduler = None
+_cache_warmer = None
 
 
 def start_sync_scheduler():
@@ -210,6 +414,22 @@ def start_sync_scheduler():
     _scheduler.start()
 
 
+def start_cache_warmer():
+    """Start the student cache warmer if enabled and the sync account is set."""
+    global _cache_warmer
+
+    if not Config.CACHE_WARMUP_ENABLED:
+        return
+    if not Config.SYNC_ABSORB_USERNAME or not Config.SYNC_ABSORB_PASSWORD:
+        print("[CACHE WARMER] Not started - needs SYNC_ABSORB_USERNAME and SYNC_ABSORB_PASSWORD")
+        return
+
+    from routes.dashboard import CACHE_TTL_MINUTES
+    # Re-run just inside the TTL so entries are refreshed before users see them expire
+    _cache_warmer = CacheWarmer(max(60, CACHE_TTL_MINUTES * 60 - 30), Config.CACHE_WARMUP_MAX_DEPTS)
+    _cache_warmer.start()
+
+
 def get_scheduler_info():
     """Get scheduler status for API endpoint."""
     if _scheduler:
@@ -6,7 +6,8 @@ from .validators import (
     validate_username,
     validate_password,
     validate_login_input,
-    sanitize_string
+    sanitize_string,
+    normalize_email
 )
 
 from .gap_metrics import calculate_gap_metrics
@@ -30,6 +31,7 @@ __all__ = [
     'validate_password',
     'validate_login_input',
     'sanitize_string',
+    'normalize_email',
     'parse_absorb_date',
     'format_relative_time',
     'format_datetime',
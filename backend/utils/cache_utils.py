@@ -0,0 +1,22 @@
+"""Helpers for the module-level dict caches used across the backend.
+
+The caches are plain dicts keyed by user/department/email. Without a cap,
+every key ever seen stays resident for the life of the worker. These helpers
+keep the dicts bounded by evicting the least recently written entries;
+dicts preserve insertion order, so the first key is always the oldest.
+"""
+
+
+def set_bounded(cache, key, value, max_size):
+    """Store cache[key] = value, evicting the oldest entries beyond max_size.
+
+    Re-inserting an existing key moves it to the newest position.
+    """
+    cache.pop(key, None)
+    cache[key] = value
+    while len(cache) > max_size:
+        try:
+            cache.pop(next(iter(cache)), None)
+        except (StopIteration, RuntimeError):
+            # Emptied or resized by another thread mid-eviction; good enough
+            break
@@ -4,6 +4,17 @@ from datetime import datetime, timezone
 from typing import Optional, Dict, Any
 
 
+# Status badges. Every student with the same status shares one dict instead
+# of carrying its own copy in the cached student lists; treat them as
+# read-only.
+_STATUS_COMPLETE = {'status': 'COMPLETE', 'class': 'blue', 'emoji': '\u2705', 'priority': 0}
+_STATUS_ACTIVE = {'status': 'ACTIVE', 'class': 'green', 'emoji': '🟢', 'priority': 1}
+_STATUS_WARNING = {'status': 'WARNING', 'class': 'orange', 'emoji': '🟡', 'priority': 2}
+_STATUS_REENGAGE = {'status': 'RE-ENGAGE', 'class': 'red', 'emoji': '🔴', 'priority': 3}
+_STATUS_ABANDONED = {'status': 'ABANDONED', 'class': 'gray', 'emoji': '⚫', 'priority': 4}
+_STATUS_EXPIRED = {'status': 'COURSE EXPIRED', 'class': 'expired', 'emoji': '⏰', 'priority': 5}
+
+
 def parse_absorb_date(date_string: Optional[str]) -> Optional[datetime]:
     """
     Parse a date string from Absorb API.
@@ -96,56 +107,28 @@ def get_status_from_last_login(last_login: Optional[str]) -> Dict[str, Any]:
         3-7 days: RE-ENGAGE (red)
         7+ days: ABANDONED (dark gray)
         No login: ABANDONED
+
+    The returned dict is shared between students; don't modify it.
     """
     if not last_login:
-        return {
-            'status': 'ABANDONED',
-            'class': 'gray',
-            'emoji': '⚫',
-            'priority': 4
-        }
+        return _STATUS_ABANDONED
 
     last_login_dt = parse_absorb_date(last_login)
 
     if not last_login_dt:
-        return {
-            'status': 'ABANDONED',
-            'class': 'gray',
-            'emoji': '⚫',
-            'priority': 4
-        }
+        return _STATUS_ABANDONED
 
     now = datetime.now(timezone.utc) if last_login_dt.tzinfo else datetime.now()
     days_diff = (now - last_login_dt).total_seconds() / 86400
 
     if days_diff <= 1:
-        return {
-            'status': 'ACTIVE',
-            'class': 'green',
-            'emoji': '🟢',
-            'priority': 1
-        }
+        return _STATUS_ACTIVE
     elif days_diff <= 3:
-        return {
-            'status': 'WARNING',
-            'class': 'orange',
-            'emoji': '🟡',
-            'priority': 2
-        }
+        return _STATUS_WARNING
     elif days_diff <= 7:
-        return {
-            'status': 'RE-ENGAGE',
-            'class': 'red',
-            'emoji': '🔴',
-            'priority': 3
-        }
+        return _STATUS_REENGAGE
     else:
-        return {
-            'status': 'ABANDONED',
-            'class': 'gray',
-            'emoji': '⚫',
-            'priority': 4
-        }
+        return _STATUS_ABANDONED
 
 
 def parse_time_spent_to_minutes(time_value) -> int:
@@ -289,23 +272,14 @@ def format_student_for_response(student: Dict[str, Any]) -> Dict[str, Any]:
         3. ACTIVE / WARNING / RE-ENGAGE / ABANDONED - based on login recency
     """
     last_login = student.get('lastLoginDate')
+    last_login_dt = parse_absorb_date(last_login)
     progress_info = format_progress(student.get('progress', 0))
 
     # If student completed the course (100% progress), mark as COMPLETE
     if progress_info['value'] >= 100:
-        status_info = {
-            'status': 'COMPLETE',
-            'class': 'blue',
-            'emoji': '\u2705',
-            'priority': 0
-        }
+        status_info = _STATUS_COMPLETE
     elif _is_enrollment_expired(student):
-        status_info = {
-            'status': 'COURSE EXPIRED',
-            'class': 'expired',
-            'emoji': '⏰',
-            'priority': 5
-        }
+        status_info = _STATUS_EXPIRED
     else:
         status_info = get_status_from_last_login(last_login)
 
@@ -319,8 +293,8 @@ def format_student_for_response(student: Dict[str, Any]) -> Dict[str, Any]:
         'username': student.get('username', ''),
         'lastLogin': {
             'raw': last_login,
-            'formatted': format_datetime(parse_absorb_date(last_login)),
-            'relative': format_relative_time(parse_absorb_date(last_login))
+            'formatted': format_datetime(last_login_dt),
+            'relative': format_relative_time(last_login_dt)
         },
         'status': status_info,
         'courseName': student.get('courseName', 'No Course'),
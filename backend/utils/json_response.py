@@ -0,0 +1,70 @@
+"""Fast JSON responses backed by orjson.
+
+ojsonify() is a drop-in for flask.jsonify on hot endpoints. It serializes
+with orjson when installed and falls back to jsonify otherwise, so the app
+still runs on an environment without the extra wheel. Anything orjson
+refuses to serialize also falls back to jsonify.
+
+ORJSONProvider does the same for every plain jsonify() call in the app
+(exam, students and auth routes) once installed as app.json.
+"""
+
+from flask import Response, jsonify
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+    _HAS_ORJSON = True
+except ImportError:
+    orjson = None
+    _HAS_ORJSON = False
+
+# Non-string dict keys are stringified, matching the stdlib encoder
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS if _HAS_ORJSON else 0
+
+
+def ojsonify(obj, status=200):
+    """Serialize obj to a JSON Response (orjson if available, else jsonify)."""
+    if _HAS_ORJSON:
+        try:
+            return Response(orjson.dumps(obj, option=_ORJSON_OPTIONS),
+                            status=status, mimetype='application/json')
+        except TypeError:
+            pass
+    response = jsonify(obj)
+    response.status_code = status
+    return response
+
+
+class ORJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes with orjson.
+
+    Output matches the default provider: keys sorted when sort_keys is on,
+    and dates/decimals/dataclasses go through the default provider's
+    converter. Calls with other options (e.g. indent for debug
+    pretty-printing) use the stdlib encoder.
+    """
+
+    def dumps(self, obj, **kwargs):
+        # response() always passes compact separators, which is orjson's format
+        if not kwargs or kwargs == {'separators': (',', ':')}:
+            option = (_ORJSON_OPTIONS | orjson.OPT_PASSTHROUGH_DATETIME
+                      | orjson.OPT_PASSTHROUGH_DATACLASS)
+            if self.sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            try:
+                return orjson.dumps(obj, default=self.default, option=option).decode('utf-8')
+            except TypeError:
+                pass
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+
+def install_json_provider(app):
+    """Use ORJSONProvider for app's jsonify() when orjson is installed."""
+    if _HAS_ORJSON:
+        app.json = ORJSONProvider(app)
@@ -0,0 +1,185 @@
+"""Optional Redis-backed cache shared by all gunicorn workers.
+
+The module-level dict caches are per process, so with several workers each
+one fetches and caches the same upstream data on its own. When REDIS_URL is
+configured, callers can mirror entries here so one worker's fetch serves
+the rest. Without REDIS_URL (or without the redis package) every helper is
+a no-op and callers keep using their local dicts.
+
+Values are JSON-encoded (orjson when installed) rather than pickled.
+
+Redis calls use short socket timeouts, and after a few consecutive
+failures the shared cache is bypassed for a while, so an unreachable
+Redis slows requests by at most a few timeouts instead of hanging them.
+"""
+
+import json
+import threading
+import time
+
+from config import Config
+
+try:
+    import orjson
+    _HAS_ORJSON = True
+except ImportError:
+    orjson = None
+    _HAS_ORJSON = False
+
+_client = None
+_client_lock = threading.Lock()
+_disabled = not Config.REDIS_URL
+
+REDIS_SOCKET_TIMEOUT = 0.5  # seconds, for connect and for each command
+REDIS_MAX_FAILURES = 3  # consecutive errors before bypassing Redis
+REDIS_BYPASS_SECONDS = 30
+_consecutive_failures = 0
+_bypass_until = 0.0  # time.monotonic() until which Redis is skipped
+
+
+def _get_client():
+    """Return the shared Redis client, or None if Redis is unavailable."""
+    global _client, _disabled
+    if _disabled:
+        return None
+    if _client is None:
+        with _client_lock:
+            if _client is None and not _disabled:
+                try:
+                    import redis
+                    _client = redis.Redis.from_url(
+                        Config.REDIS_URL,
+                        socket_timeout=REDIS_SOCKET_TIMEOUT,
+                        socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+                    )
+                    print("[CACHE] Using Redis shared cache")
+                except ImportError:
+                    print("[CACHE] redis package not installed, shared cache disabled")
+                    _disabled = True
+    return _client
+
+
+def _usable_client():
+    """The Redis client, or None if unavailable or bypassed after failures."""
+    if _bypass_until and time.monotonic() < _bypass_until:
+        return None
+    return _get_client()
+
+
+def _record_failure(message):
+    """Log a Redis error; after REDIS_MAX_FAILURES in a row, bypass Redis."""
+    global _consecutive_failures, _bypass_until
+    print(message)
+    _consecutive_failures += 1
+    if _consecutive_failures >= REDIS_MAX_FAILURES:
+        _consecutive_failures = 0
+        _bypass_until = time.monotonic() + REDIS_BYPASS_SECONDS
+        print(f"[CACHE] Redis keeps failing, bypassing shared cache for {REDIS_BYPASS_SECONDS}s")
+
+
+def _record_success():
+    global _consecutive_failures
+    if _consecutive_failures:
+        _consecutive_failures = 0
+
+
+def shared_cache_enabled():
+    """True when a Redis client is configured and not currently bypassed."""
+    return _usable_client() is not None
+
+
+def _dumps(value):
+    if _HAS_ORJSON:
+        try:
+            return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass
+    return json.dumps(value, default=str).encode('utf-8')
+
+
+def _loads(raw):
+    if _HAS_ORJSON:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def shared_get(key):
+    """Return the decoded value stored at key, or None on miss/error."""
+    client = _usable_client()
+    if client is None:
+        return None
+    try:
+        raw = client.get(key)
+    except Exception as e:
+        _record_failure(f"[CACHE] Redis get failed for {key}: {type(e).__name__}")
+        return None
+    _record_success()
+    try:
+        return _loads(raw) if raw is not None else None
+    except ValueError as e:
+        print(f"[CACHE] Undecodable value for {key}: {type(e).__name__}")
+        return None
+
+
+def shared_set(key, value, ttl_seconds):
+    """Store value at key with an expiry. Errors are logged and ignored."""
+    client = _usable_client()
+    if client is None:
+        return
+    try:
+        client.setex(key, int(ttl_seconds), _dumps(value))
+        _record_success()
+    except Exception as e:
+        _record_failure(f"[CACHE] Redis set failed for {key}: {type(e).__name__}")
+
+
+def shared_delete(*keys):
+    """Delete keys from the shared cache. Errors are logged and ignored."""
+    client = _usable_client()
+    if client is None or not keys:
+        return
+    try:
+        client.delete(*keys)
+        _record_success()
+    except Exception as e:
+        _record_failure(f"[CACHE] Redis delete failed: {type(e).__name__}")
+
+
+def shared_lock_acquire(key, token, ttl_seconds):
+    """Try to take a cross-worker lock (SET NX with expiry).
+
+    Returns True if this caller now holds the lock, or if there is no
+    shared cache to coordinate through (callers then just proceed).
+    """
+    client = _usable_client()
+    if client is None:
+        return True
+    try:
+        acquired = bool(client.set(key, _dumps(token), nx=True, ex=int(ttl_seconds)))
+    except Exception as e:
+        _record_failure(f"[CACHE] Redis lock failed for {key}: {type(e).__name__}")
+        return True
+    _record_success()
+    return acquired
+
+
+# Compare-and-delete in one round trip: a lock that expired and was taken
+# by another worker between a separate GET and DEL must not be deleted
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def shared_lock_release(key, token):
+    """Release a lock taken with shared_lock_acquire, if still ours."""
+    client = _usable_client()
+    if client is None:
+        return
+    try:
+        client.eval(_RELEASE_LOCK_SCRIPT, 1, key, _dumps(token))
+        _record_success()
+    except Exception as e:
+        _record_failure(f"[CACHE] Redis unlock failed for {key}: {type(e).__name__}")
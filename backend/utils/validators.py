@@ -1,6 +1,7 @@
 """Input validation utilities."""
 
 import re
+from functools import lru_cache
 from typing import Tuple, Optional
 
 # UUID/GUID pattern for department IDs
@@ -161,3 +162,22 @@ def sanitize_string(value: str) -> str:
     value = value.replace('\x00', '')
 
     return value
+
+
+@lru_cache(maxsize=8192)
+def normalize_email(email: str) -> str:
+    """
+    Normalize an email for use as a lookup key (stripped, lowercased).
+
+    Cached: the same addresses are normalized over and over across sheet
+    rows, cache keys and write-backs.
+
+    Args:
+        email: The raw email (may be None or empty)
+
+    Returns:
+        Normalized email, or '' if empty
+    """
+    if not email:
+        return ""
+    return email.strip().lower()
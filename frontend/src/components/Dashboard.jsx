@@ -1047,10 +1047,14 @@ function Dashboard({ user, department, onLogout, initialData }) {
     students.map(s => (s.courseName || '').trim()).filter(c => c && c !== 'No Course')
   )].sort()
 
+  // Hidden emails are saved lowercased/trimmed; a Set keeps the per-student
+  // check O(1) instead of scanning the whole hidden list for every student
+  const hiddenSet = new Set(hiddenStudents)
+
   // Filter students (works for both tabs)
   const filteredStudents = students.filter(student => {
     // Hidden student filter
-    const isHidden = hiddenStudents.includes((student.email || '').toLowerCase().trim())
+    const isHidden = hiddenSet.has((student.email || '').toLowerCase().trim())
     if (showHidden) return isHidden
     if (isHidden) return false
 
@@ -1126,7 +1130,7 @@ function Dashboard({ user, department, onLogout, initialData }) {
 
   const filteredExamStudents = examStudents.filter(student => {
     // Hidden student filter
-    const isHidden = hiddenStudents.includes((student.email || '').toLowerCase().trim())
+    const isHidden = hiddenSet.has((student.email || '').toLowerCase().trim())
     if (showHidden) return isHidden
     if (isHidden) return false
 